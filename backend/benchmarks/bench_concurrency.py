@@ -0,0 +1,191 @@
+# backend/benchmarks/bench_concurrency.py
+# Benchmark de concurrencia para los endpoints de lectura de la API (tickets y FAQs).
+#
+# Mide peticiones por segundo y latencias con 1, 10 y 100 clientes concurrentes
+# comparando el acceso a BD bloqueante (consultas en el event loop) contra el executor acotado.
+#
+# Uso (desde la carpeta backend):
+#   Contra una API real ya levantada (repetir arrancando uvicorn con DB_EXECUTOR_WORKERS=0 para el "antes"):
+#     python -m benchmarks.bench_concurrency --url http://127.0.0.1:8000/api/cul/v1
+#   En proceso, sin MySQL, con un driver simulado que tarda --latency-ms por consulta:
+#     python -m benchmarks.bench_concurrency --simulate --latency-ms 5
+
+import argparse
+import asyncio
+import statistics
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from typing import List, Dict, Any
+
+import httpx
+
+ENDPOINTS = ["/tickets/", "/faqs/"]
+CONCURRENCY_LEVELS = [1, 10, 100]
+
+
+# --- Driver simulado (solo para --simulate) ---
+
+class _FakeCursor:
+    """Cursor que imita a DictCursor de PyMySQL bloqueando el hilo durante la 'consulta'."""
+
+    def __init__(self, latency_s: float, rows: int):
+        self._latency_s = latency_s
+        self._rows = rows
+        self._result: List[Dict[str, Any]] = []
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+    def execute(self, sql, args=None):
+        time.sleep(self._latency_s) # Bloqueante, igual que un round trip real de PyMySQL
+        now = datetime.now()
+        if "FROM faqs" in sql:
+            self._result = [
+                {"id": f"FAQ-{i:04d}", "question": f"¿Pregunta frecuente {i}?", "answer": f"Respuesta de ejemplo número {i}.",
+                 "category": "General", "created_at": now, "updated_at": now}
+                for i in range(self._rows)
+            ]
+        elif "FROM faq_keywords" in sql:
+            self._result = [{"faq_id": faq_id, "keyword": keyword} for faq_id in (args or ()) for keyword in ("uno", "dos")]
+        else:
+            self._result = [
+                {"id": str(uuid.uuid4()), "user_id_telegram": "123", "user_name_telegram": "Bench",
+                 "user_email": None, "problem_description": "Descripción de prueba para el benchmark.",
+                 "category": "General", "priority": "Media", "source": "Benchmark", "status": "Abierto",
+                 "created_at": now, "updated_at": now}
+                for _ in range(self._rows)
+            ]
+        return len(self._result)
+
+    def fetchall(self):
+        return self._result
+
+    def fetchone(self):
+        return self._result[0] if self._result else None
+
+    def fetchmany(self, size=1):
+        batch, self._result = self._result[:size], self._result[size:]
+        return batch
+
+    def close(self):
+        pass
+
+
+class _FakeConnection:
+    def __init__(self, latency_s: float, rows: int):
+        self._latency_s = latency_s
+        self._rows = rows
+
+    def cursor(self, *args):
+        return _FakeCursor(self._latency_s, self._rows)
+
+    def ping(self, reconnect=False):
+        pass
+
+    def commit(self):
+        pass
+
+    def rollback(self):
+        pass
+
+    def close(self):
+        pass
+
+
+# --- Medición ---
+
+async def _run_level(client: httpx.AsyncClient, path: str, concurrency: int, requests_per_client: int) -> Dict[str, Any]:
+    latencies: List[float] = []
+
+    async def worker():
+        for _ in range(requests_per_client):
+            start = time.perf_counter()
+            response = await client.get(path)
+            latencies.append(time.perf_counter() - start)
+            response.raise_for_status()
+
+    start = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    elapsed = time.perf_counter() - start
+
+    latencies.sort()
+    return {
+        "endpoint": path,
+        "concurrency": concurrency,
+        "requests": len(latencies),
+        "rps": round(len(latencies) / elapsed, 1),
+        "p50_ms": round(statistics.median(latencies) * 1000, 2),
+        "p95_ms": round(latencies[int(len(latencies) * 0.95) - 1] * 1000, 2),
+    }
+
+
+async def _run_suite(client: httpx.AsyncClient, requests_per_client: int) -> List[Dict[str, Any]]:
+    results = []
+    for path in ENDPOINTS:
+        for concurrency in CONCURRENCY_LEVELS:
+            # Con pocos clientes se hacen más peticiones por cliente para que la medición sea estable.
+            per_client = max(requests_per_client, 200 // concurrency)
+            results.append(await _run_level(client, path, concurrency, per_client))
+    return results
+
+
+def _print_table(title: str, results: List[Dict[str, Any]]) -> None:
+    print(f"\n== {title} ==")
+    print(f"{'endpoint':<12}{'clientes':>10}{'peticiones':>12}{'req/s':>10}{'p50 ms':>10}{'p95 ms':>10}")
+    for r in results:
+        print(f"{r['endpoint']:<12}{r['concurrency']:>10}{r['requests']:>12}{r['rps']:>10}{r['p50_ms']:>10}{r['p95_ms']:>10}")
+
+
+async def _bench_url(base_url: str, requests_per_client: int) -> None:
+    limits = httpx.Limits(max_connections=max(CONCURRENCY_LEVELS), max_keepalive_connections=max(CONCURRENCY_LEVELS))
+    async with httpx.AsyncClient(base_url=base_url.rstrip("/"), limits=limits, timeout=60.0) as client:
+        _print_table(f"API en {base_url}", await _run_suite(client, requests_per_client))
+
+
+async def _bench_simulated(latency_ms: float, rows: int, requests_per_client: int) -> None:
+    # Importar la app aquí para que --url no necesite las dependencias del backend.
+    from core import database
+    from crud import crud
+    from main import app
+
+    # Este benchmark mide el acceso concurrente a la BD: sin caché de FAQs, cada petición llega al driver.
+    crud.faq_list_cache.max_entries = crud.faq_item_cache.max_entries = 0
+    latency_s = latency_ms / 1000
+    transport = httpx.ASGITransport(app=app)
+
+    for label, workers in (("ANTES: consultas bloqueando el event loop", 0),
+                           (f"DESPUÉS: executor acotado ({database.DB_EXECUTOR_WORKERS} hilos)", database.DB_EXECUTOR_WORKERS)):
+        database.db_pool = database.ConnectionPool(connect_fn=lambda: _FakeConnection(latency_s, rows))
+        database.DB_EXECUTOR_WORKERS = workers
+        database.db_executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="db-worker") if workers else None
+        try:
+            async with httpx.AsyncClient(transport=transport, base_url="http://bench/api/cul/v1") as client:
+                _print_table(f"{label} | latencia simulada {latency_ms} ms, {rows} filas", await _run_suite(client, requests_per_client))
+        finally:
+            database.close_db_pool()
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Benchmark de concurrencia de la API del Chatbot CUL.")
+    parser.add_argument("--url", help="URL base de una API en ejecución (ej: http://127.0.0.1:8000/api/cul/v1)")
+    parser.add_argument("--simulate", action="store_true", help="Ejecutar en proceso con un driver MySQL simulado")
+    parser.add_argument("--latency-ms", type=float, default=5.0, help="Latencia simulada por consulta (solo --simulate)")
+    parser.add_argument("--rows", type=int, default=20, help="Filas devueltas por consulta simulada (solo --simulate)")
+    parser.add_argument("--requests-per-client", type=int, default=5, help="Peticiones mínimas por cliente y nivel")
+    args = parser.parse_args()
+
+    if args.simulate:
+        asyncio.run(_bench_simulated(args.latency_ms, args.rows, args.requests_per_client))
+    elif args.url:
+        asyncio.run(_bench_url(args.url, args.requests_per_client))
+    else:
+        parser.error("Indica --url o --simulate.")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,85 @@
+# backend/benchmarks/bench_fuzzy_match.py
+# Benchmark del emparejamiento difuso de FAQs (TF-IDF de n-gramas de caracteres).
+#
+# Genera un corpus sintético de FAQs en español, mide el tiempo de construcción de la matriz,
+# el de una actualización incremental y la latencia por consulta con errores de escritura.
+#
+# Uso (desde la carpeta backend):
+#   python -m benchmarks.bench_fuzzy_match --faqs 10000 --queries 2000
+
+import argparse
+import random
+import statistics
+import time
+
+from search.ngram_matcher import CharNgramMatcher
+
+TOPICS = ["matrícula", "inscripción", "biblioteca", "horario", "correo institucional", "certificado", "beca",
+          "homologación", "pago", "plataforma virtual", "moodle", "wifi", "bienestar", "admisiones", "grado",
+          "semestre", "laboratorio", "cafetería", "calendario académico", "contraseña", "carnet", "parqueadero"]
+QUESTION_TEMPLATES = ["¿Cuál es el {t} de {u}?", "¿Cómo solicito {t} para {u}?", "¿Dónde consulto {t} en {u}?",
+                      "No puedo acceder a {t} de {u}, ¿qué hago?", "¿Qué requisitos tiene {t} en {u}?"]
+UNITS = ["pregrado", "posgrado", "la sede norte", "la sede centro", "ingeniería", "derecho", "psicología",
+         "administración", "contaduría", "enfermería", "educación virtual"]
+TYPO_QUERIES = ["inscricion pregrado", "horaio biblioteca", "corre institucional", "matricla posgrado",
+                "certificao de notas", "contrasena moodle", "calendaro academico", "homologacion derecho"]
+
+
+def build_corpus(n_faqs: int, seed: int = 7):
+    rng = random.Random(seed)
+    corpus = []
+    for i in range(n_faqs):
+        topic, unit = rng.choice(TOPICS), rng.choice(UNITS)
+        question = rng.choice(QUESTION_TEMPLATES).format(t=topic, u=unit)
+        keywords = " ".join(rng.sample(TOPICS, 3))
+        corpus.append((f"FAQ-{i:06d}", question, keywords))
+    return corpus
+
+
+def percentile(sorted_values, pct):
+    return sorted_values[min(len(sorted_values) - 1, int(len(sorted_values) * pct))]
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Benchmark del emparejamiento difuso de FAQs.")
+    parser.add_argument("--faqs", type=int, default=10000, help="Número de FAQs sintéticas")
+    parser.add_argument("--queries", type=int, default=2000, help="Número de consultas a medir")
+    parser.add_argument("--top-k", type=int, default=5)
+    args = parser.parse_args()
+
+    corpus = build_corpus(args.faqs)
+    matcher = CharNgramMatcher()
+    for faq_id, question, keywords in corpus:
+        matcher.upsert(faq_id, [question, keywords])
+
+    start = time.perf_counter()
+    matcher.search("warmup")
+    build_ms = (time.perf_counter() - start) * 1000
+
+    # Actualización incremental de una FAQ + reensamblado en la siguiente búsqueda
+    start = time.perf_counter()
+    matcher.upsert(corpus[0][0], ["¿Cuál es el horario de la biblioteca central?", "biblioteca horario"])
+    matcher.search("warmup")
+    update_ms = (time.perf_counter() - start) * 1000
+
+    latencies = []
+    for i in range(args.queries):
+        query = TYPO_QUERIES[i % len(TYPO_QUERIES)]
+        start = time.perf_counter()
+        matcher.search(query, top_k=args.top_k)
+        latencies.append((time.perf_counter() - start) * 1000)
+    latencies.sort()
+
+    print(f"FAQs: {args.faqs} | n-gramas distintos: {len(matcher._vocab)} | entradas no nulas: {len(matcher._weights)}")
+    print(f"Construcción de la matriz: {build_ms:.1f} ms | actualización incremental + reensamblado: {update_ms:.1f} ms")
+    print(f"Consulta ({args.queries} consultas): media {statistics.mean(latencies):.3f} ms | "
+          f"p50 {percentile(latencies, 0.50):.3f} ms | p95 {percentile(latencies, 0.95):.3f} ms | "
+          f"p99 {percentile(latencies, 0.99):.3f} ms")
+    for query in TYPO_QUERIES[:4]:
+        best_id, best_score = matcher.search(query, top_k=1)[0]
+        question = next(q for faq_id, q, _ in corpus if faq_id == best_id) if best_id != corpus[0][0] else "(actualizada)"
+        print(f"  '{query}' -> {best_id} ({best_score:.2f}): {question}")
+
+
+if __name__ == "__main__":
+    main()
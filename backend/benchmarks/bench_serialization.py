@@ -0,0 +1,107 @@
+# backend/benchmarks/bench_serialization.py
+# Micro-benchmark de la serialización de respuestas con listas grandes (10k filas por defecto).
+#
+# Compara, con la misma app FastAPI en proceso y las mismas filas:
+#   - ANTES: crear un modelo por fila y devolver la lista; FastAPI la valida otra vez contra
+#     `response_model` y la codifica con jsonable_encoder + json.dumps.
+#   - DESPUÉS: validar la lista de filas una sola vez con TypeAdapter y devolver los bytes
+#     generados por pydantic-core (el camino que usan ahora GET /tickets/ y GET /faqs/).
+#
+# Uso (desde la carpeta backend):
+#   python -m benchmarks.bench_serialization --rows 10000 --repeat 10
+
+import argparse
+import asyncio
+import json
+import statistics
+import time
+import uuid
+from datetime import datetime, timedelta
+from typing import List, Dict, Any
+
+import httpx
+from fastapi import FastAPI, Response
+
+from models import models
+
+
+def ticket_rows(n: int) -> List[Dict[str, Any]]:
+    now = datetime(2025, 6, 1, 12, 0, 0)
+    return [
+        {"id": str(uuid.UUID(int=i)), "user_id_telegram": str(100000 + i), "user_name_telegram": f"Usuario {i}",
+         "user_email": f"usuario{i}@cul.edu.co", "problem_description": f"No puedo acceder a Moodle desde el campus ({i}).",
+         "category": "Soporte Técnico", "priority": "Media", "source": "Chatbot CUL Telegram", "status": "Abierto",
+         "created_at": now - timedelta(minutes=i), "updated_at": now - timedelta(minutes=i)}
+        for i in range(n)
+    ]
+
+
+def faq_rows(n: int) -> List[Dict[str, Any]]:
+    now = datetime(2025, 6, 1, 12, 0, 0)
+    return [
+        {"id": f"FAQ-{i:06d}", "question": f"¿Cuál es el horario de la biblioteca de la sede {i}?",
+         "answer": "El horario de la biblioteca principal es de Lunes a Viernes de 7:00 AM a 9:00 PM.",
+         "category": "Servicios", "keywords": ["biblioteca", "horario", "atención"],
+         "created_at": now, "updated_at": now}
+        for i in range(n)
+    ]
+
+
+def build_app(tickets: List[Dict[str, Any]], faqs: List[Dict[str, Any]]) -> FastAPI:
+    app = FastAPI()
+
+    @app.get("/before/tickets", response_model=List[models.TicketResponse])
+    async def tickets_before():
+        return [models.TicketResponse(**row) for row in tickets]
+
+    @app.get("/after/tickets", response_model=List[models.TicketResponse])
+    async def tickets_after():
+        validated = models.TicketListAdapter.validate_python(tickets)
+        return Response(content=models.TicketListAdapter.dump_json(validated), media_type="application/json")
+
+    @app.get("/before/faqs", response_model=List[models.FAQResponse])
+    async def faqs_before():
+        return [models.FAQResponse(**row) for row in faqs]
+
+    @app.get("/after/faqs", response_model=List[models.FAQResponse])
+    async def faqs_after():
+        validated = models.FAQListAdapter.validate_python(faqs)
+        return Response(content=models.FAQListAdapter.dump_json(validated), media_type="application/json")
+
+    return app
+
+
+async def measure(client: httpx.AsyncClient, path: str, repeat: int) -> Dict[str, Any]:
+    await client.get(path) # Calentamiento
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        response = await client.get(path)
+        timings.append((time.perf_counter() - start) * 1000)
+        response.raise_for_status()
+    return {"path": path, "median_ms": statistics.median(timings), "min_ms": min(timings), "bytes": len(response.content),
+            "body": response.content}
+
+
+async def run(rows: int, repeat: int) -> None:
+    app = build_app(ticket_rows(rows), faq_rows(rows))
+    async with httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://bench") as client:
+        print(f"{'endpoint':<12}{'filas':>8}{'antes ms':>12}{'después ms':>12}{'mejora':>9}{'bytes':>12}  mismo JSON")
+        for resource in ("tickets", "faqs"):
+            before = await measure(client, f"/before/{resource}", repeat)
+            after = await measure(client, f"/after/{resource}", repeat)
+            same = json.loads(before["body"]) == json.loads(after["body"])
+            print(f"{resource:<12}{rows:>8}{before['median_ms']:>12.1f}{after['median_ms']:>12.1f}"
+                  f"{before['median_ms'] / after['median_ms']:>8.1f}x{after['bytes']:>12}  {'sí' if same else 'NO'}")
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Micro-benchmark de serialización de listas grandes.")
+    parser.add_argument("--rows", type=int, default=10000, help="Filas por respuesta")
+    parser.add_argument("--repeat", type=int, default=10, help="Peticiones medidas por endpoint (se reporta la mediana)")
+    args = parser.parse_args()
+    asyncio.run(run(args.rows, args.repeat))
+
+
+if __name__ == "__main__":
+    main()
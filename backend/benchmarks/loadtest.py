@@ -0,0 +1,461 @@
+# backend/benchmarks/loadtest.py
+# Prueba de carga repetible de la API contra una base de datos local.
+#
+# 1. Crea (si no existe) una BD de benchmark aparte, con el esquema de bd_asistente.sql y las migraciones.
+# 2. La llena con tickets y FAQs sintéticos deterministas (misma --seed => mismos datos) a la escala
+#    pedida (10k, 100k, 1m...). Si ya tiene esos datos, no vuelve a sembrar.
+# 3. Levanta la API con uvicorn en un subproceso apuntando a esa BD (o usa --url).
+# 4. Lanza los escenarios con cada nivel de concurrencia (clientes en bucle cerrado durante --duration s)
+#    y escribe un JSON con req/s, percentiles de latencia, errores y los metadatos de la ejecución
+#    (commit, escala, máquina) para comparar ejecuciones entre commits.
+#
+# Uso (desde la carpeta backend, con MySQL/MariaDB local y las variables DB_* del .env):
+#   python -m benchmarks.loadtest run --tickets 100k --faqs 1k --concurrency 1,10,50 --output base.json
+#   python -m benchmarks.loadtest run --fake-db --output smoke.json   # Sin MySQL: driver simulado en proceso
+#   python -m benchmarks.loadtest compare base.json nuevo.json --threshold 10
+#
+# --fake-db sólo sirve como prueba de humo del propio benchmark y del coste de la capa HTTP/CRUD:
+# sus números no son comparables con los de una BD real.
+
+import argparse
+import asyncio
+import json
+import os
+import platform
+import random
+import re
+import socket
+import subprocess
+import sys
+import time
+import uuid
+from datetime import datetime, timedelta, timezone
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+import httpx
+
+API_PREFIX = "/api/cul/v1"
+BENCH_DB_NAME = "cul_chatbot_bench"
+SEED_BATCH_SIZE = 5000
+BASE_SCHEMA_FILE = os.path.join(os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))), "bd_asistente.sql")
+
+TICKET_CATEGORIES = ["Soporte Técnico", "Admisiones", "Académico", "Pagos", "Bienestar", "General"]
+TICKET_STATUSES = ["Abierto", "En Proceso", "Resuelto", "Cerrado"]
+TICKET_PRIORITIES = ["Alta", "Media", "Baja"]
+FAQ_CATEGORIES = ["Matrículas", "Servicios", "Académico", "Pagos", "Soporte Técnico", "Bienestar", "General CUL"]
+FAQ_TOPICS = ["biblioteca", "horario", "matrícula", "inscripción", "certificado", "moodle", "correo", "wifi",
+              "beca", "pago", "pse", "homologación", "grado", "calendario", "cafetería", "psicología",
+              "deportes", "admisiones", "contraseña", "notas", "laboratorio", "posgrado", "pregrado", "icfes"]
+# Consultas de GET /faqs/?query= (incluye alguna con error de tipeo para ejercitar el fallback difuso)
+FAQ_QUERIES = ["horario de la biblioteca", "cómo pago la matrícula por pse", "certificado de estudios",
+               "no puedo entrar a moodle", "requisitos inscripcion pregrado", "becas para posgrado",
+               "cambiar contraseña del correo", "calendario de exámenes", "homologacion de materias", "bibloteca"]
+
+SCENARIOS = ["create_ticket", "list_tickets_filtered", "get_ticket", "search_faqs"]
+
+
+# --- Escala y datos sintéticos ---
+
+def parse_count(value: str) -> int:
+    """'10k' -> 10000, '1m' -> 1000000, '2500' -> 2500."""
+    match = re.fullmatch(r"\s*(\d+(?:\.\d+)?)\s*([kKmM]?)\s*", value)
+    if not match:
+        raise argparse.ArgumentTypeError(f"Cantidad no válida: {value!r} (usa 10000, 10k, 1m...)")
+    number, suffix = float(match.group(1)), match.group(2).lower()
+    return int(number * {"": 1, "k": 1_000, "m": 1_000_000}[suffix])
+
+
+def ticket_id(seed: int, index: int) -> str:
+    """ID determinista del ticket sembrado número `index` (los escenarios lo reconstruyen sin consultar la BD)."""
+    return str(uuid.UUID(int=(seed << 96) | index))
+
+
+def faq_id(index: int) -> str:
+    return f"FAQ-BENCH-{index:07d}"
+
+
+def synthetic_tickets(seed: int, count: int, start: int = 0):
+    rng = random.Random(seed * 1_000_003 + start)
+    base = datetime(2025, 1, 1)
+    for i in range(start, start + count):
+        created = base + timedelta(seconds=i * 17)
+        category = rng.choice(TICKET_CATEGORIES)
+        yield (ticket_id(seed, i), str(100000 + rng.randrange(50000)), f"Usuario {i}", f"usuario{i}@cul.edu.co",
+               f"Solicitud de {category.lower()} número {i}: {rng.choice(FAQ_TOPICS)} no funciona como esperaba.",
+               category, rng.choice(TICKET_PRIORITIES), rng.choice(TICKET_STATUSES), "Benchmark", created, created)
+
+
+def synthetic_faqs(seed: int, count: int, start: int = 0):
+    rng = random.Random(seed * 7_919 + start)
+    now = datetime(2025, 1, 1)
+    for i in range(start, start + count):
+        topics = rng.sample(FAQ_TOPICS, 3)
+        question = f"¿Cómo funciona {topics[0]} y {topics[1]} en la sede {i % 40}?"
+        answer = (f"Para {topics[0]} debes revisar la sección de {topics[1]} en el portal. "
+                  f"Si tienes dudas sobre {topics[2]}, acércate a la oficina correspondiente (ref. {i}).")
+        yield faq_id(i), question, answer, rng.choice(FAQ_CATEGORIES), ",".join(topics), now, now
+
+
+# --- Preparación de la BD ---
+
+def _base_schema_statements() -> List[str]:
+    """Sentencias CREATE TABLE del esquema base (sin CREATE DATABASE/USE ni datos de ejemplo)."""
+    with open(BASE_SCHEMA_FILE, encoding="utf-8") as schema_file:
+        return re.findall(r"CREATE TABLE IF NOT EXISTS .*?;", schema_file.read(), flags=re.S)
+
+
+def _insert_batches(cursor, conn, sql: str, rows, label: str, total: int) -> None:
+    batch, done = [], 0
+    for row in rows:
+        batch.append(row)
+        if len(batch) >= SEED_BATCH_SIZE:
+            cursor.executemany(sql, batch) # PyMySQL lo convierte en un INSERT de varias filas
+            conn.commit()
+            done += len(batch)
+            batch = []
+            print(f"  {label}: {done}/{total}", end="\r", file=sys.stderr)
+    if batch:
+        cursor.executemany(sql, batch)
+        conn.commit()
+    print(f"  {label}: {total}/{total}", file=sys.stderr)
+
+
+def prepare_database(db_name: str, tickets: int, faqs: int, seed: int, reseed: bool) -> None:
+    """Crea la BD de benchmark, aplica esquema y migraciones y siembra los datos si hace falta."""
+    import pymysql
+    from core import database, migrations
+    from search.text import normalize_keyword
+
+    server = pymysql.connect(host=database.DB_HOST, user=database.DB_USER, password=database.DB_PASSWORD,
+                             port=database.DB_PORT, charset="utf8mb4")
+    try:
+        with server.cursor() as cursor:
+            cursor.execute(f"CREATE DATABASE IF NOT EXISTS `{db_name}` "
+                           "DEFAULT CHARACTER SET utf8mb4 COLLATE utf8mb4_general_ci")
+            cursor.execute(f"USE `{db_name}`")
+            for statement in _base_schema_statements():
+                cursor.execute(statement)
+        server.commit()
+    finally:
+        server.close()
+
+    applied = migrations.upgrade()
+    if applied:
+        print(f"Migraciones aplicadas en {db_name}: {', '.join(applied)}", file=sys.stderr)
+
+    conn = database.get_db_connection()
+    try:
+        with conn.cursor() as cursor:
+            cursor.execute("CREATE TABLE IF NOT EXISTS bench_seed (id TINYINT PRIMARY KEY, seed INT NOT NULL, "
+                           "tickets INT NOT NULL, faqs INT NOT NULL, seeded_at TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP)")
+            cursor.execute("SELECT seed, tickets, faqs FROM bench_seed WHERE id = 1")
+            current = cursor.fetchone()
+            if not reseed and current == {"seed": seed, "tickets": tickets, "faqs": faqs}:
+                print(f"{db_name} ya tiene {tickets} tickets y {faqs} FAQs (seed={seed}); no se vuelve a sembrar.",
+                      file=sys.stderr)
+                return
+
+            print(f"Sembrando {db_name}: {tickets} tickets, {faqs} FAQs (seed={seed})...", file=sys.stderr)
+            for table in ("bench_seed", "faq_keywords", "faq_deletions", "faqs", "tickets"):
+                cursor.execute(f"DELETE FROM {table}")
+            conn.commit()
+            _insert_batches(cursor, conn,
+                            "INSERT INTO tickets (id, user_id_telegram, user_name_telegram, user_email, problem_description, "
+                            "category, priority, status, source, created_at, updated_at) "
+                            "VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s)",
+                            synthetic_tickets(seed, tickets), "tickets", tickets)
+            _insert_batches(cursor, conn,
+                            "INSERT INTO faqs (id, question, answer, category, keywords, created_at, updated_at) "
+                            "VALUES (%s, %s, %s, %s, %s, %s, %s)",
+                            synthetic_faqs(seed, faqs), "faqs", faqs)
+            keyword_rows = ((row[0], normalize_keyword(keyword), keyword, position)
+                            for row in synthetic_faqs(seed, faqs)
+                            for position, keyword in enumerate(row[4].split(",")))
+            _insert_batches(cursor, conn,
+                            "INSERT INTO faq_keywords (faq_id, keyword_norm, keyword, position) VALUES (%s, %s, %s, %s)",
+                            keyword_rows, "faq_keywords", faqs * 3)
+            cursor.execute("ANALYZE TABLE tickets, faqs, faq_keywords")
+            cursor.fetchall()
+            cursor.execute("INSERT INTO bench_seed (id, seed, tickets, faqs) VALUES (1, %s, %s, %s)", (seed, tickets, faqs))
+            conn.commit()
+    finally:
+        conn.close()
+
+
+# --- API bajo prueba ---
+
+def _free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def start_server(db_name: str, workers: int, startup_timeout: float = 60.0) -> Tuple[subprocess.Popen, str]:
+    """Arranca `uvicorn main:app` contra la BD de benchmark y espera a que responda."""
+    port = _free_port()
+    env = dict(os.environ, DB_NAME=db_name, LOG_LEVEL=os.getenv("BENCH_LOG_LEVEL", "WARNING"))
+    backend_dir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    process = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "main:app", "--host", "127.0.0.1", "--port", str(port),
+         "--workers", str(workers), "--no-access-log"],
+        cwd=backend_dir, env=env)
+    base_url = f"http://127.0.0.1:{port}{API_PREFIX}"
+    deadline = time.monotonic() + startup_timeout
+    while time.monotonic() < deadline:
+        if process.poll() is not None:
+            raise RuntimeError(f"uvicorn terminó al arrancar (código {process.returncode}).")
+        try:
+            if httpx.get(base_url + "/", timeout=1.0).status_code == 200:
+                return process, base_url
+        except httpx.HTTPError:
+            pass
+        time.sleep(0.2)
+    process.terminate()
+    raise RuntimeError(f"La API no respondió en {startup_timeout}s.")
+
+
+def stop_server(process: subprocess.Popen) -> None:
+    process.terminate()
+    try:
+        process.wait(timeout=15)
+    except subprocess.TimeoutExpired:
+        process.kill()
+
+
+# --- Escenarios ---
+
+RequestFactory = Callable[[random.Random], Tuple[str, str, Optional[Dict[str, Any]]]]
+
+
+def build_scenarios(seed: int, tickets: int) -> Dict[str, RequestFactory]:
+    """Cada escenario devuelve (método, ruta, cuerpo JSON) para la siguiente petición."""
+
+    def create_ticket(rng: random.Random):
+        category = rng.choice(TICKET_CATEGORIES)
+        return "POST", "/tickets/", {
+            "user_id_telegram": str(200000 + rng.randrange(50000)), "user_name_telegram": "Carga",
+            "user_email": "carga@cul.edu.co", "category": category, "priority": rng.choice(TICKET_PRIORITIES),
+            "problem_description": f"Ticket de prueba de carga sobre {rng.choice(FAQ_TOPICS)} ({category}).",
+            "source": "Benchmark",
+        }
+
+    def list_tickets_filtered(rng: random.Random):
+        return "GET", f"/tickets/?status={rng.choice(TICKET_STATUSES)}&category={rng.choice(TICKET_CATEGORIES)}&limit=50", None
+
+    def get_ticket(rng: random.Random):
+        return "GET", f"/tickets/{ticket_id(seed, rng.randrange(max(tickets, 1)))}", None
+
+    def search_faqs(rng: random.Random):
+        return "GET", f"/faqs/?query={rng.choice(FAQ_QUERIES)}", None
+
+    return {"create_ticket": create_ticket, "list_tickets_filtered": list_tickets_filtered,
+            "get_ticket": get_ticket, "search_faqs": search_faqs}
+
+
+def percentile(sorted_values: List[float], pct: float) -> float:
+    """Percentil por rango más cercano (el mismo en todas las ejecuciones, para poder compararlas)."""
+    if not sorted_values:
+        return 0.0
+    index = max(0, min(len(sorted_values) - 1, -(-len(sorted_values) * pct // 100) - 1))
+    return sorted_values[int(index)]
+
+
+async def run_scenario(client: httpx.AsyncClient, name: str, factory: RequestFactory, concurrency: int,
+                       duration: float, warmup: float, seed: int) -> Dict[str, Any]:
+    latencies: List[float] = []
+    status_codes: Dict[str, int] = {}
+    errors = 0
+    measuring = False
+    stop_at = 0.0
+
+    async def worker(worker_index: int):
+        nonlocal errors
+        rng = random.Random(f"{seed}-{name}-{concurrency}-{worker_index}")
+        while time.perf_counter() < stop_at:
+            method, path, body = factory(rng)
+            start = time.perf_counter()
+            try:
+                response = await client.request(method, path, json=body)
+                status = str(response.status_code)
+                failed = response.status_code >= 400
+            except httpx.HTTPError as e:
+                status, failed = type(e).__name__, True
+            elapsed = time.perf_counter() - start
+            if measuring:
+                latencies.append(elapsed)
+                status_codes[status] = status_codes.get(status, 0) + 1
+                errors += failed
+
+    if warmup > 0:
+        stop_at = time.perf_counter() + warmup
+        await asyncio.gather(*(worker(i) for i in range(concurrency)))
+    measuring = True
+    started = time.perf_counter()
+    stop_at = started + duration
+    await asyncio.gather(*(worker(i) for i in range(concurrency)))
+    elapsed = time.perf_counter() - started
+
+    latencies.sort()
+    to_ms = lambda seconds: round(seconds * 1000, 3)
+    return {
+        "scenario": name,
+        "concurrency": concurrency,
+        "requests": len(latencies),
+        "errors": errors,
+        "status_codes": status_codes,
+        "duration_s": round(elapsed, 3),
+        "rps": round(len(latencies) / elapsed, 2) if elapsed else 0.0,
+        "latency_ms": {
+            "mean": to_ms(sum(latencies) / len(latencies)) if latencies else 0.0,
+            "p50": to_ms(percentile(latencies, 50)), "p90": to_ms(percentile(latencies, 90)),
+            "p95": to_ms(percentile(latencies, 95)), "p99": to_ms(percentile(latencies, 99)),
+            "max": to_ms(latencies[-1]) if latencies else 0.0,
+        },
+    }
+
+
+async def run_suite(client: httpx.AsyncClient, scenarios: List[str], concurrency_levels: List[int],
+                    duration: float, warmup: float, seed: int, tickets: int) -> List[Dict[str, Any]]:
+    factories = build_scenarios(seed, tickets)
+    results = []
+    for name in scenarios:
+        for concurrency in concurrency_levels:
+            result = await run_scenario(client, name, factories[name], concurrency, duration, warmup, seed)
+            print(f"{name:<24}{concurrency:>6} clientes{result['rps']:>12.1f} req/s"
+                  f"{result['latency_ms']['p50']:>10.2f} p50 ms{result['latency_ms']['p99']:>10.2f} p99 ms"
+                  f"{result['errors']:>8} errores", file=sys.stderr)
+            results.append(result)
+    return results
+
+
+def _git_metadata() -> Dict[str, Any]:
+    def git(*args: str) -> Optional[str]:
+        try:
+            return subprocess.run(["git", *args], capture_output=True, text=True, check=True,
+                                  cwd=os.path.dirname(os.path.abspath(__file__))).stdout.strip()
+        except (OSError, subprocess.CalledProcessError):
+            return None
+    status = git("status", "--porcelain")
+    return {"commit": git("rev-parse", "HEAD"), "branch": git("rev-parse", "--abbrev-ref", "HEAD"),
+            "dirty": bool(status) if status is not None else None}
+
+
+async def _run(args: argparse.Namespace) -> Dict[str, Any]:
+    concurrency_levels = [int(level) for level in args.concurrency.split(",")]
+    scenarios = args.scenarios.split(",")
+    unknown = set(scenarios) - set(SCENARIOS)
+    if unknown:
+        raise SystemExit(f"Escenarios desconocidos: {', '.join(sorted(unknown))}. Disponibles: {', '.join(SCENARIOS)}")
+
+    meta = {
+        "started_at": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+        **_git_metadata(),
+        "python": platform.python_version(), "platform": platform.platform(), "cpu_count": os.cpu_count(),
+        "mode": "fake-db" if args.fake_db else ("url" if args.url else "local-db"),
+        "tickets": args.tickets, "faqs": args.faqs, "seed": args.seed,
+        "duration_s": args.duration, "warmup_s": args.warmup, "concurrency": concurrency_levels,
+        "server_workers": None if (args.url or args.fake_db) else args.workers,
+    }
+    limits = httpx.Limits(max_connections=max(concurrency_levels), max_keepalive_connections=max(concurrency_levels))
+
+    if args.fake_db:
+        from benchmarks.bench_concurrency import _FakeConnection
+        from core import database
+        from main import app
+        database.db_pool = database.ConnectionPool(connect_fn=lambda: _FakeConnection(args.fake_latency_ms / 1000, 20))
+        try:
+            async with httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://bench" + API_PREFIX,
+                                         limits=limits, timeout=args.timeout) as client:
+                results = await run_suite(client, scenarios, concurrency_levels, args.duration, args.warmup,
+                                          args.seed, args.tickets)
+        finally:
+            database.close_db_pool()
+        return {"meta": meta, "results": results}
+
+    process = None
+    base_url = args.url
+    if not base_url:
+        prepare_database(args.db_name, args.tickets, args.faqs, args.seed, args.reseed)
+        process, base_url = start_server(args.db_name, args.workers)
+    try:
+        async with httpx.AsyncClient(base_url=base_url.rstrip("/"), limits=limits, timeout=args.timeout) as client:
+            results = await run_suite(client, scenarios, concurrency_levels, args.duration, args.warmup,
+                                      args.seed, args.tickets)
+    finally:
+        if process is not None:
+            stop_server(process)
+    return {"meta": meta, "results": results}
+
+
+# --- Comparación entre ejecuciones ---
+
+def compare(baseline: Dict[str, Any], current: Dict[str, Any], threshold_pct: float) -> int:
+    """Imprime la variación de req/s y p95 por escenario y nivel; devuelve 1 si alguno empeora más del umbral."""
+    for key in ("tickets", "faqs", "seed", "mode", "duration_s"):
+        if baseline["meta"].get(key) != current["meta"].get(key):
+            print(f"AVISO: '{key}' difiere ({baseline['meta'].get(key)} -> {current['meta'].get(key)}); "
+                  "la comparación puede no ser válida.")
+    base_results = {(r["scenario"], r["concurrency"]): r for r in baseline["results"]}
+    regressions = 0
+    print(f"{'escenario':<24}{'clientes':>9}{'req/s base':>12}{'req/s':>10}{'Δ%':>8}{'p95 base':>10}{'p95':>9}{'Δ%':>8}")
+    for result in current["results"]:
+        base = base_results.get((result["scenario"], result["concurrency"]))
+        if base is None:
+            continue
+        rps_delta = (result["rps"] - base["rps"]) / base["rps"] * 100 if base["rps"] else 0.0
+        p95_base, p95 = base["latency_ms"]["p95"], result["latency_ms"]["p95"]
+        p95_delta = (p95 - p95_base) / p95_base * 100 if p95_base else 0.0
+        regressed = rps_delta < -threshold_pct or p95_delta > threshold_pct
+        regressions += regressed
+        print(f"{result['scenario']:<24}{result['concurrency']:>9}{base['rps']:>12.1f}{result['rps']:>10.1f}"
+              f"{rps_delta:>+8.1f}{p95_base:>10.2f}{p95:>9.2f}{p95_delta:>+8.1f}{'  REGRESIÓN' if regressed else ''}")
+    print(f"\n{regressions} regresiones por encima del {threshold_pct}%  "
+          f"(base {str(baseline['meta'].get('commit'))[:10]} -> actual {str(current['meta'].get('commit'))[:10]})")
+    return 1 if regressions else 0
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Prueba de carga de la API del Chatbot CUL contra una BD local.")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    run_parser = subparsers.add_parser("run", help="Preparar la BD, levantar la API y medir")
+    run_parser.add_argument("--tickets", type=parse_count, default=parse_count("10k"), help="Tickets sembrados (10k, 100k, 1m...)")
+    run_parser.add_argument("--faqs", type=parse_count, default=parse_count("1k"), help="FAQs sembradas")
+    run_parser.add_argument("--seed", type=int, default=42, help="Semilla de los datos y de las peticiones")
+    run_parser.add_argument("--reseed", action="store_true", help="Volver a sembrar aunque la BD ya tenga esa escala")
+    run_parser.add_argument("--db-name", default=os.getenv("BENCH_DB_NAME", BENCH_DB_NAME), help="BD de benchmark (se crea si no existe)")
+    run_parser.add_argument("--workers", type=int, default=1, help="Workers de uvicorn")
+    run_parser.add_argument("--url", help="Medir una API ya levantada (no prepara la BD ni arranca uvicorn)")
+    run_parser.add_argument("--fake-db", action="store_true", help="En proceso con el driver simulado de bench_concurrency")
+    run_parser.add_argument("--fake-latency-ms", type=float, default=1.0, help="Latencia por consulta con --fake-db")
+    run_parser.add_argument("--scenarios", default=",".join(SCENARIOS), help=f"Escenarios separados por coma ({', '.join(SCENARIOS)})")
+    run_parser.add_argument("--concurrency", default="1,10,50", help="Niveles de concurrencia separados por coma")
+    run_parser.add_argument("--duration", type=float, default=20.0, help="Segundos medidos por escenario y nivel")
+    run_parser.add_argument("--warmup", type=float, default=3.0, help="Segundos de calentamiento (no medidos) por escenario y nivel")
+    run_parser.add_argument("--timeout", type=float, default=30.0, help="Timeout de cada petición (s)")
+    run_parser.add_argument("--output", help="Archivo JSON de resultados (por defecto, stdout)")
+
+    compare_parser = subparsers.add_parser("compare", help="Comparar dos resultados JSON")
+    compare_parser.add_argument("baseline", help="JSON de la ejecución de referencia")
+    compare_parser.add_argument("current", help="JSON de la ejecución nueva")
+    compare_parser.add_argument("--threshold", type=float, default=10.0, help="Porcentaje a partir del cual se marca regresión")
+
+    args = parser.parse_args()
+    if args.command == "compare":
+        with open(args.baseline, encoding="utf-8") as base_file, open(args.current, encoding="utf-8") as current_file:
+            sys.exit(compare(json.load(base_file), json.load(current_file), args.threshold))
+
+    if not args.fake_db and not args.url:
+        os.environ["DB_NAME"] = args.db_name # Antes de importar core.database (lee DB_NAME al importarse)
+    report = asyncio.run(_run(args))
+    output = json.dumps(report, indent=2, ensure_ascii=False)
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as output_file:
+            output_file.write(output + "\n")
+        print(f"Resultados guardados en {args.output}", file=sys.stderr)
+    else:
+        print(output)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,11 @@
+# backend/core/__init__.py
+# La API se ejecuta desde backend/ (`uvicorn main:app`, `python -m core.migrations`), pero importa
+# el paquete `common` de la raíz del repositorio, compartido con el bot. Todos los módulos de la API
+# pasan por `core` antes de usar `common`, así que basta con añadir la raíz al path aquí.
+
+import os
+import sys
+
+_REPO_ROOT = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+if _REPO_ROOT not in sys.path:
+    sys.path.append(_REPO_ROOT)
@@ -0,0 +1,12 @@
+# backend/core/cache.py
+# Caché LRU con TTL de la API: la implementación está en common/cache.py, compartida con el bot.
+#
+# La usa el CRUD como caché de lectura de datos que cambian poco (FAQs). Cada worker de uvicorn
+# tiene su propia copia: las escrituras invalidan la caché del worker que las hace y el TTL
+# acota cuánto tarda en verse un cambio hecho desde otro worker.
+# Se importa desde aquí (y no directamente de `common`) para que `core` haya añadido antes la
+# raíz del repositorio al path (ver core/__init__.py).
+
+from common.cache import TTLCache
+
+__all__ = ["TTLCache"]
@@ -2,9 +2,19 @@
 
 import pymysql
 import os
+import asyncio
+import functools
+import threading
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from typing import Optional, Dict, Any, Callable, TypeVar
 from dotenv import load_dotenv
 from pymysql.cursors import DictCursor # Para obtener resultados como diccionarios
 
+from core.logging_config import get_logger
+from core.metrics import CallbackGauge, Counter, Histogram
+
 # Cargar variables de entorno desde un archivo .env
 load_dotenv()
 
@@ -14,22 +24,375 @@ DB_PASSWORD = os.getenv("DB_PASSWORD", "") # Cambia según tu configuración
 DB_NAME = os.getenv("DB_NAME", "cul_chatbot_db") # El nombre de tu BD
 DB_PORT = int(os.getenv("DB_PORT", 3306)) # Puerto estándar de MySQL
 
-def get_db_connection():
-    """Establece y devuelve una conexión a la base de datos MySQL."""
+# --- Configuración del pool de conexiones ---
+DB_POOL_SIZE = int(os.getenv("DB_POOL_SIZE", 5)) # Conexiones que se mantienen abiertas en reposo
+DB_POOL_MAX_OVERFLOW = int(os.getenv("DB_POOL_MAX_OVERFLOW", 10)) # Conexiones extra permitidas en picos
+DB_POOL_TIMEOUT = float(os.getenv("DB_POOL_TIMEOUT", 10)) # Segundos máximos esperando una conexión libre
+DB_POOL_RECYCLE = int(os.getenv("DB_POOL_RECYCLE", 1800)) # Segundos de vida antes de reciclar (<= 0 desactiva)
+DB_POOL_PRE_PING = os.getenv("DB_POOL_PRE_PING", "true").lower() in ("1", "true", "yes")
+
+# Hilos dedicados a ejecutar las consultas bloqueantes de PyMySQL fuera del event loop.
+# Por defecto, uno por cada conexión que puede abrir el pool. Con 0 las consultas se ejecutan
+# en el propio event loop (comportamiento anterior, útil solo para comparar en benchmarks).
+DB_EXECUTOR_WORKERS = int(os.getenv("DB_EXECUTOR_WORKERS", DB_POOL_SIZE + DB_POOL_MAX_OVERFLOW))
+
+T = TypeVar("T")
+
+logger = get_logger("db")
+
+# --- Métricas de la BD (expuestas en /api/cul/v1/metrics) ---
+DB_CONNECTION_ACQUIRE = Histogram(
+    "cul_db_connection_acquire_seconds", "Tiempo para obtener una conexión del pool (espera + conexión nueva si hizo falta).",
+    buckets=(0.0001, 0.0005, 0.001, 0.005, 0.01, 0.05, 0.1, 0.5, 1.0, 5.0, 10.0))
+DB_QUERY_DURATION = Histogram(
+    "cul_db_query_duration_seconds", "Duración de cada operación CRUD en el hilo de la BD, por función.", ("function",))
+DB_QUERY_ACQUIRE = Counter(
+    "cul_db_query_connection_acquire_seconds_total", "Tiempo acumulado obteniendo conexiones del pool, por función.",
+    ("function",))
+DB_QUERY_ROWS = Counter(
+    "cul_db_query_rows_total", "Filas devueltas por los SELECT, por función.", ("function",))
+DB_QUERY_ERRORS = Counter(
+    "cul_db_query_errors_total", "Operaciones CRUD que terminaron con una excepción, por función.", ("function",))
+
+# Filas y espera de conexión de la operación instrumentada que se ejecuta en este hilo.
+_query_context = threading.local()
+
+
+class MeteredDictCursor(DictCursor):
+    """DictCursor que suma las filas de cada SELECT a la operación instrumentada en curso."""
+
+    def execute(self, query, args=None):
+        result = super().execute(query, args)
+        if self.description is not None and getattr(_query_context, "rows", None) is not None:
+            _query_context.rows += max(self.rowcount, 0)
+        return result
+
+
+def instrumented_query(func: Callable[..., T]) -> Callable[..., T]:
+    """
+    Decorador para las funciones CRUD síncronas: registra su duración, las filas leídas,
+    el tiempo obteniendo conexiones y los errores bajo el nombre público de la operación
+    (`_get_faqs_from_db` -> `get_faqs_from_db`).
+    """
+    name = func.__name__.lstrip("_")
+    duration = DB_QUERY_DURATION.labels(name)
+    acquire = DB_QUERY_ACQUIRE.labels(name)
+    rows = DB_QUERY_ROWS.labels(name)
+    errors = DB_QUERY_ERRORS.labels(name)
+
+    @functools.wraps(func)
+    def wrapper(*args, **kwargs):
+        outer = (getattr(_query_context, "rows", None), getattr(_query_context, "acquire", 0.0))
+        _query_context.rows, _query_context.acquire = 0, 0.0
+        start = time.perf_counter()
+        try:
+            return func(*args, **kwargs)
+        except Exception:
+            errors.inc()
+            raise
+        finally:
+            duration.observe(time.perf_counter() - start)
+            query_rows, query_acquire = _query_context.rows, _query_context.acquire
+            rows.inc(query_rows)
+            acquire.inc(query_acquire)
+            # Una operación llamada desde otra también cuenta para la exterior.
+            _query_context.rows = None if outer[0] is None else outer[0] + query_rows
+            _query_context.acquire = outer[1] + query_acquire
+
+    return wrapper
+
+
+def _create_raw_connection() -> pymysql.connections.Connection:
+    """Abre una conexión PyMySQL nueva (sin pool)."""
+    return pymysql.connect(
+        host=DB_HOST,
+        user=DB_USER,
+        password=DB_PASSWORD,
+        database=DB_NAME,
+        port=DB_PORT,
+        cursorclass=MeteredDictCursor, # Devuelve filas como diccionarios (y las cuenta para las métricas)
+        charset='utf8mb4'       # Recomendado para soporte completo de Unicode
+    )
+
+
+class PoolTimeoutError(Exception):
+    """Se lanza cuando no hay una conexión libre dentro de DB_POOL_TIMEOUT."""
+
+
+class PooledConnection:
+    """
+    Envoltorio de una conexión del pool.
+    Se comporta como la conexión PyMySQL original, pero `close()` la devuelve al pool
+    en lugar de cerrar el socket, así el código CRUD existente no necesita cambios.
+    """
+
+    def __init__(self, pool: "ConnectionPool", raw_connection, created_at: float):
+        self._pool = pool
+        self._raw = raw_connection
+        self._created_at = created_at
+
+    def __getattr__(self, name):
+        if self._raw is None:
+            raise pymysql.err.InterfaceError("La conexión ya fue devuelta al pool.")
+        return getattr(self._raw, name)
+
+    def close(self) -> None:
+        """Devuelve la conexión al pool (idempotente)."""
+        if self._raw is not None:
+            raw, self._raw = self._raw, None
+            self._pool._release(raw, self._created_at)
+
+    def invalidate(self) -> None:
+        """Cierra la conexión real y libera su hueco en el pool (p. ej. con un resultado a medio leer)."""
+        if self._raw is not None:
+            raw, self._raw = self._raw, None
+            self._pool._release(raw, self._created_at, discard=True)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+
+
+class ConnectionPool:
+    """
+    Pool de conexiones PyMySQL seguro para hilos.
+
+    - `size`: conexiones que se conservan abiertas cuando están libres.
+    - `max_overflow`: conexiones adicionales que se abren en picos y se cierran al devolverse.
+    - `timeout`: segundos que `acquire()` espera por una conexión antes de fallar.
+    - `recycle`: edad máxima (segundos) de una conexión; al superarla se reabre.
+    - `pre_ping`: verifica con `ping()` que la conexión siga viva antes de entregarla.
+    """
+
+    def __init__(self, size: int = DB_POOL_SIZE, max_overflow: int = DB_POOL_MAX_OVERFLOW,
+                 timeout: float = DB_POOL_TIMEOUT, recycle: int = DB_POOL_RECYCLE,
+                 pre_ping: bool = DB_POOL_PRE_PING, connect_fn=_create_raw_connection):
+        self.size = max(1, size)
+        self.max_overflow = max(0, max_overflow)
+        self.timeout = timeout
+        self.recycle = recycle
+        self.pre_ping = pre_ping
+        self._connect_fn = connect_fn
+
+        self._cond = threading.Condition()
+        self._idle = deque() # (conexión, created_at), LIFO para reutilizar las más "calientes"
+        self._open = 0       # Conexiones abiertas (libres + en uso)
+        self._in_use = 0
+        self._waiting = 0
+        self._closed = False
+
+        # Estadísticas acumuladas
+        self._acquisitions = 0
+        self._timeouts = 0
+        self._connects = 0
+        self._recycled = 0
+        self._wait_total = 0.0
+        self._wait_max = 0.0
+
+    def acquire(self) -> PooledConnection:
+        """Obtiene una conexión del pool, abriendo una nueva si hay capacidad."""
+        start = time.monotonic()
+        deadline = start + self.timeout
+        raw, created_at = None, 0.0
+
+        with self._cond:
+            while True:
+                if self._closed:
+                    raise pymysql.err.InterfaceError("El pool de conexiones está cerrado.")
+                if self._idle:
+                    raw, created_at = self._idle.pop()
+                    break
+                if self._open < self.size + self.max_overflow:
+                    self._open += 1 # Reservar el hueco; la conexión se abre fuera del lock
+                    break
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    self._timeouts += 1
+                    raise PoolTimeoutError(
+                        f"No hay conexiones libres tras {self.timeout}s "
+                        f"(size={self.size}, max_overflow={self.max_overflow})."
+                    )
+                self._waiting += 1
+                try:
+                    self._cond.wait(remaining)
+                finally:
+                    self._waiting -= 1
+            self._in_use += 1
+
+        recycled = connected = False
+        try:
+            if raw is not None and not self._is_usable(raw, created_at):
+                self._close_quietly(raw)
+                raw = None
+                recycled = True
+            if raw is None:
+                raw = self._connect_fn()
+                created_at = time.monotonic()
+                connected = True
+        except Exception:
+            with self._cond:
+                self._open -= 1
+                self._in_use -= 1
+                self._cond.notify()
+            raise
+
+        waited = time.monotonic() - start
+        with self._cond:
+            self._acquisitions += 1
+            self._recycled += recycled
+            self._connects += connected
+            self._wait_total += waited
+            self._wait_max = max(self._wait_max, waited)
+        DB_CONNECTION_ACQUIRE.observe(waited)
+        if getattr(_query_context, "rows", None) is not None:
+            _query_context.acquire += waited
+        return PooledConnection(self, raw, created_at)
+
+    def _is_usable(self, raw, created_at: float) -> bool:
+        if self.recycle > 0 and time.monotonic() - created_at > self.recycle:
+            return False
+        if self.pre_ping:
+            try:
+                raw.ping(reconnect=False)
+            except Exception:
+                return False
+        return True
+
+    def _release(self, raw, created_at: float, discard: bool = False) -> None:
+        # Cerrar la transacción implícita para que el siguiente uso no lea una instantánea vieja.
+        reusable = False
+        if not discard:
+            try:
+                raw.rollback()
+                reusable = True
+            except Exception:
+                pass
+
+        with self._cond:
+            self._in_use -= 1
+            if reusable and not self._closed and len(self._idle) < self.size:
+                self._idle.append((raw, created_at))
+                raw = None
+            else:
+                self._open -= 1
+            self._cond.notify()
+
+        if raw is not None: # Conexión de overflow, rota o pool cerrado
+            self._close_quietly(raw)
+
+    @staticmethod
+    def _close_quietly(raw) -> None:
+        try:
+            raw.close()
+        except Exception:
+            pass
+
+    def close(self) -> None:
+        """Cierra todas las conexiones libres; las que estén en uso se cierran al devolverse."""
+        with self._cond:
+            self._closed = True
+            idle = list(self._idle)
+            self._idle.clear()
+            self._open -= len(idle)
+            self._cond.notify_all()
+        for raw, _ in idle:
+            self._close_quietly(raw)
+
+    def stats(self) -> Dict[str, Any]:
+        """Devuelve una instantánea del estado del pool para dimensionarlo."""
+        with self._cond:
+            acquisitions = self._acquisitions
+            return {
+                "size": self.size,
+                "max_overflow": self.max_overflow,
+                "open": self._open,
+                "in_use": self._in_use,
+                "idle": len(self._idle),
+                "waiting": self._waiting,
+                "acquisitions": acquisitions,
+                "connects": self._connects,
+                "recycled": self._recycled,
+                "timeouts": self._timeouts,
+                "wait_time_avg_ms": round(self._wait_total / acquisitions * 1000, 3) if acquisitions else 0.0,
+                "wait_time_max_ms": round(self._wait_max * 1000, 3),
+                "wait_time_total_ms": round(self._wait_total * 1000, 3),
+            }
+
+
+# Pool global de la aplicación (abierto/cerrado desde el lifespan de FastAPI en main.py)
+db_pool: Optional[ConnectionPool] = None
+db_executor: Optional[ThreadPoolExecutor] = None
+_pool_init_lock = threading.Lock()
+
+
+def init_db_pool(executor_workers: int = DB_EXECUTOR_WORKERS) -> ConnectionPool:
+    """Crea el pool global y el executor de consultas si aún no existen. Las conexiones se abren bajo demanda."""
+    global db_pool, db_executor
+    with _pool_init_lock:
+        if db_pool is None:
+            db_pool = ConnectionPool()
+            logger.info("Pool de conexiones a '%s' creado (size=%d, max_overflow=%d, timeout=%ss, recycle=%ss, pre_ping=%s).",
+                        DB_NAME, db_pool.size, db_pool.max_overflow, db_pool.timeout, db_pool.recycle, db_pool.pre_ping)
+        if db_executor is None and executor_workers > 0:
+            db_executor = ThreadPoolExecutor(max_workers=executor_workers, thread_name_prefix="db-worker")
+            logger.info("Executor de consultas creado con %d hilos.", executor_workers)
+    return db_pool
+
+
+def close_db_pool() -> None:
+    """Cierra el executor de consultas, el pool global y todas sus conexiones libres."""
+    global db_pool, db_executor
+    with _pool_init_lock:
+        if db_executor is not None:
+            db_executor.shutdown(wait=True)
+            db_executor = None
+        if db_pool is not None:
+            db_pool.close()
+            logger.info("Pool de conexiones a '%s' cerrado.", DB_NAME)
+            db_pool = None
+
+
+async def run_in_db_executor(func: Callable[..., T], *args, **kwargs) -> T:
+    """
+    Ejecuta una función CRUD síncrona (PyMySQL bloqueante) en el executor acotado de la BD,
+    de modo que el event loop de uvicorn siga atendiendo otras peticiones mientras tanto.
+    """
+    if db_executor is None:
+        if DB_EXECUTOR_WORKERS <= 0:
+            return func(*args, **kwargs) # Modo bloqueante explícito (solo para comparar)
+        init_db_pool()
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(db_executor, functools.partial(func, *args, **kwargs))
+
+
+def get_pool_stats() -> Dict[str, Any]:
+    """Estadísticas del pool global (vacías si no se ha inicializado)."""
+    if db_pool is None:
+        return {}
+    return db_pool.stats()
+
+
+def _pool_gauge_values() -> Dict[tuple, float]:
+    stats = get_pool_stats()
+    return {(state,): stats[state] for state in ("open", "in_use", "idle", "waiting")} if stats else {}
+
+
+CallbackGauge("cul_db_pool_connections", "Conexiones del pool por estado (open = in_use + idle) y peticiones esperando.",
+              ("state",), _pool_gauge_values)
+
+
+def get_db_connection() -> PooledConnection:
+    """
+    Devuelve una conexión del pool de la aplicación.
+    Llamar a `close()` sobre ella la devuelve al pool en lugar de cerrarla.
+    """
+    pool = db_pool or init_db_pool()
     try:
-        connection = pymysql.connect(
-            host=DB_HOST,
-            user=DB_USER,
-            password=DB_PASSWORD,
-            database=DB_NAME,
-            port=DB_PORT,
-            cursorclass=DictCursor, # Devuelve filas como diccionarios
-            charset='utf8mb4'       # Recomendado para soporte completo de Unicode
-        )
-        print(f"Conexión a la base de datos '{DB_NAME}' establecida exitosamente.")
-        return connection
+        return pool.acquire()
     except pymysql.MySQLError as e:
-        print(f"Error al conectar a la base de datos MySQL: {e}")
+        logger.error("Error al conectar a la base de datos MySQL: %s", e)
         # En una aplicación real, podrías querer reintentar o manejar esto de forma más robusta.
         raise  # Re-lanza la excepción para que el llamador la maneje
 
@@ -0,0 +1,25 @@
+# backend/core/logging_config.py
+# Logging estructurado y no bloqueante para la API (implementación en common/logging_setup.py).
+#
+# Los módulos obtienen su logger con `get_logger("crud")` y registran con formato diferido
+# (`logger.info("Ticket %s creado", ticket_id)`): si el nivel está desactivado no se construye el mensaje.
+# Variables de entorno: LOG_LEVEL, LOG_FORMAT, LOG_QUEUE_SIZE y LOG_SAMPLE_RATES (p. ej. "cul.crud=0.1").
+
+import logging
+from typing import Optional
+
+from common import logging_setup
+from common.logging_setup import shutdown_logging
+
+ROOT_LOGGER_NAME = "cul"
+
+
+def get_logger(name: str) -> logging.Logger:
+    """Logger hijo de `cul` (p. ej. get_logger("crud") -> "cul.crud")."""
+    return logging.getLogger(f"{ROOT_LOGGER_NAME}.{name}")
+
+
+def setup_logging(level: Optional[str] = None, log_format: Optional[str] = None,
+                  sample_rates: Optional[str] = None) -> None:
+    """Configura el logger `cul` (ver `common.logging_setup.setup_logging`)."""
+    logging_setup.setup_logging(ROOT_LOGGER_NAME, level, log_format, sample_rates)
@@ -0,0 +1,270 @@
+# backend/core/metrics.py
+# Métricas en memoria con exposición en el formato de texto de Prometheus (versión 0.0.4).
+#
+# Contadores, gauges e histogramas con etiquetas, seguros para hilos (los usan tanto el event loop
+# como los hilos del executor de la BD). Registrar un valor es una búsqueda en un dict más una
+# suma bajo un lock: cuesta del orden de 1 µs, así que las métricas pueden quedar siempre activas.
+# Los valores viven en el proceso: con varios workers de uvicorn, cada uno expone los suyos.
+
+import threading
+import time
+from bisect import bisect_left
+from typing import Callable, Dict, Iterable, List, Optional, Sequence, Tuple
+
+# Buckets por defecto (segundos): de 1 ms a 10 s, pensados para latencias de peticiones y consultas.
+DEFAULT_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+LabelValues = Tuple[str, ...]
+
+
+def _escape_label(value: str) -> str:
+    return value.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _format_labels(names: Sequence[str], values: Sequence[str], extra: str = "") -> str:
+    pairs = [f'{name}="{_escape_label(value)}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+def _format_value(value: float) -> str:
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class Registry:
+    """Conjunto de métricas que se exponen juntas en /metrics."""
+
+    def __init__(self):
+        self._metrics: Dict[str, "_Metric"] = {}
+        self._lock = threading.Lock()
+
+    def register(self, metric: "_Metric") -> None:
+        with self._lock:
+            if metric.name in self._metrics:
+                raise ValueError(f"La métrica '{metric.name}' ya está registrada.")
+            self._metrics[metric.name] = metric
+
+    def render(self) -> str:
+        """Todas las métricas en formato de texto de Prometheus."""
+        with self._lock:
+            metrics = list(self._metrics.values())
+        lines: List[str] = []
+        for metric in metrics:
+            lines.append(f"# HELP {metric.name} {metric.documentation}")
+            lines.append(f"# TYPE {metric.name} {metric.kind}")
+            lines.extend(metric.samples())
+        return "\n".join(lines) + "\n"
+
+
+REGISTRY = Registry()
+
+
+class _Metric:
+    kind = "untyped"
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = (),
+                 registry: Optional[Registry] = REGISTRY):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._children: Dict[LabelValues, object] = {}
+        self._lock = threading.Lock()
+        if registry is not None:
+            registry.register(self)
+
+    def _new_child(self):
+        raise NotImplementedError
+
+    def labels(self, *values: str):
+        """Serie de la métrica para esos valores de etiqueta (se crea la primera vez)."""
+        child = self._children.get(values)
+        if child is None:
+            if len(values) != len(self.labelnames):
+                raise ValueError(f"{self.name} espera las etiquetas {self.labelnames}, se recibieron {values}.")
+            with self._lock:
+                child = self._children.setdefault(tuple(str(value) for value in values), self._new_child())
+        return child
+
+    def _items(self) -> List[Tuple[LabelValues, object]]:
+        with self._lock:
+            return sorted(self._children.items())
+
+    def samples(self) -> Iterable[str]:
+        raise NotImplementedError
+
+
+class _ValueChild:
+    __slots__ = ("_value", "_lock")
+
+    def __init__(self):
+        self._value = 0.0
+        self._lock = threading.Lock()
+
+    def inc(self, amount: float = 1.0) -> None:
+        with self._lock:
+            self._value += amount
+
+    def dec(self, amount: float = 1.0) -> None:
+        with self._lock:
+            self._value -= amount
+
+    def set(self, value: float) -> None:
+        self._value = float(value)
+
+    @property
+    def value(self) -> float:
+        return self._value
+
+
+class Counter(_Metric):
+    """Valor que sólo crece (peticiones, filas, errores). El nombre debe terminar en `_total`."""
+    kind = "counter"
+
+    def _new_child(self) -> _ValueChild:
+        return _ValueChild()
+
+    def inc(self, amount: float = 1.0) -> None:
+        self.labels().inc(amount)
+
+    def samples(self) -> Iterable[str]:
+        for values, child in self._items():
+            yield f"{self.name}{_format_labels(self.labelnames, values)} {_format_value(child.value)}"
+
+
+class Gauge(Counter):
+    """Valor que sube y baja (peticiones en curso, conexiones abiertas)."""
+    kind = "gauge"
+
+    def dec(self, amount: float = 1.0) -> None:
+        self.labels().dec(amount)
+
+    def set(self, value: float) -> None:
+        self.labels().set(value)
+
+
+class _HistogramChild:
+    __slots__ = ("_upper_bounds", "_counts", "_sum", "_lock")
+
+    def __init__(self, upper_bounds: Tuple[float, ...]):
+        self._upper_bounds = upper_bounds
+        self._counts = [0] * (len(upper_bounds) + 1) # El último es el bucket +Inf
+        self._sum = 0.0
+        self._lock = threading.Lock()
+
+    def observe(self, value: float) -> None:
+        index = bisect_left(self._upper_bounds, value)
+        with self._lock:
+            self._counts[index] += 1
+            self._sum += value
+
+    def snapshot(self) -> Tuple[List[int], float]:
+        with self._lock:
+            return list(self._counts), self._sum
+
+
+class Histogram(_Metric):
+    """Distribución de valores en buckets acumulativos, más su suma y cuántos hubo."""
+    kind = "histogram"
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = (),
+                 buckets: Sequence[float] = DEFAULT_BUCKETS, registry: Optional[Registry] = REGISTRY):
+        self.upper_bounds = tuple(sorted(buckets))
+        super().__init__(name, documentation, labelnames, registry)
+
+    def _new_child(self) -> _HistogramChild:
+        return _HistogramChild(self.upper_bounds)
+
+    def observe(self, value: float) -> None:
+        self.labels().observe(value)
+
+    def samples(self) -> Iterable[str]:
+        for values, child in self._items():
+            counts, total = child.snapshot()
+            cumulative = 0
+            for upper_bound, count in zip(self.upper_bounds + (float("inf"),), counts):
+                cumulative += count
+                le = f'le="{_format_value(float(upper_bound))}"'
+                yield f"{self.name}_bucket{_format_labels(self.labelnames, values, le)} {cumulative}"
+            labels = _format_labels(self.labelnames, values)
+            yield f"{self.name}_sum{labels} {_format_value(total)}"
+            yield f"{self.name}_count{labels} {cumulative}"
+
+
+class CallbackGauge(_Metric):
+    """
+    Gauge cuyo valor se calcula al exponer las métricas: `callback()` devuelve
+    {(valores de etiqueta...): valor}. Sirve para publicar estadísticas que ya lleva otro
+    componente (el pool de conexiones, las cachés) sin instrumentar su código.
+    """
+    kind = "gauge"
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str],
+                 callback: Callable[[], Dict[LabelValues, float]], registry: Optional[Registry] = REGISTRY):
+        self._callback = callback
+        super().__init__(name, documentation, labelnames, registry)
+
+    def samples(self) -> Iterable[str]:
+        for values, value in sorted(self._callback().items()):
+            yield f"{self.name}{_format_labels(self.labelnames, values)} {_format_value(value)}"
+
+
+# --- Métricas HTTP ---
+
+HTTP_REQUEST_DURATION = Histogram(
+    "cul_http_request_duration_seconds", "Duración de las peticiones HTTP hasta enviar el último byte.",
+    ("method", "route"))
+HTTP_REQUESTS = Counter(
+    "cul_http_requests_total", "Peticiones HTTP respondidas por método, ruta y código de estado.",
+    ("method", "route", "status"))
+HTTP_REQUESTS_IN_PROGRESS = Gauge(
+    "cul_http_requests_in_progress", "Peticiones HTTP en curso.", ("method",))
+
+UNMATCHED_ROUTE = "<unmatched>" # 404 sin ruta: no se usa la URL como etiqueta para no crear series sin límite
+
+
+class MetricsMiddleware:
+    """
+    Middleware ASGI que mide cada petición HTTP por plantilla de ruta (`/api/cul/v1/faqs/{faq_id}`,
+    no la URL concreta). Es ASGI puro en lugar de `@app.middleware("http")` para no pasar cada
+    respuesta por los streams de BaseHTTPMiddleware.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        method = scope["method"]
+        status = 500 # Si la app lanza una excepción antes de responder
+        in_progress = HTTP_REQUESTS_IN_PROGRESS.labels(method)
+
+        async def send_wrapper(message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+            await send(message)
+
+        in_progress.inc()
+        start = time.perf_counter()
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            elapsed = time.perf_counter() - start
+            in_progress.dec()
+            route = scope.get("route") # FastAPI deja aquí la ruta que atendió la petición
+            route_path = getattr(route, "path", UNMATCHED_ROUTE)
+            HTTP_REQUEST_DURATION.labels(method, route_path).observe(elapsed)
+            HTTP_REQUESTS.labels(method, route_path, str(status)).inc()
+
+
+def render_metrics() -> str:
+    """Texto de /metrics con todas las métricas registradas."""
+    return REGISTRY.render()
@@ -0,0 +1,255 @@
+# backend/core/migrations.py
+# Sistema de migraciones versionadas para evolucionar el esquema de la BD sin recrearla.
+#
+# Las migraciones viven en backend/migrations/ con nombre `NNNN_descripcion.sql` o `NNNN_descripcion.py`.
+# - `.sql`: sentencias separadas por `;` al final de línea (los comentarios `--` se ignoran).
+# - `.py`: un módulo con una función `upgrade(cursor)` que recibe un cursor PyMySQL.
+# Las versiones aplicadas se registran en la tabla `schema_migrations`.
+#
+# Uso (desde la carpeta backend):
+#   python -m core.migrations status    # Lista migraciones aplicadas y pendientes
+#   python -m core.migrations upgrade   # Aplica las pendientes en orden
+#   python -m core.migrations explain   # Informe EXPLAIN de las consultas CRUD
+
+import argparse
+import hashlib
+import importlib.util
+import os
+import re
+from dataclasses import dataclass
+from typing import List, Dict, Any, Tuple
+
+from core.database import get_db_connection
+from core.logging_config import get_logger, setup_logging
+
+logger = get_logger("migrations")
+
+MIGRATIONS_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "migrations")
+MIGRATION_FILE_RE = re.compile(r"^(\d{4})_([\w\-]+)\.(sql|py)$")
+MIGRATIONS_LOCK_NAME = "cul_chatbot_schema_migrations"
+MIGRATIONS_LOCK_TIMEOUT = 30 # Segundos esperando a otro proceso que esté migrando
+
+CREATE_MIGRATIONS_TABLE_SQL = """
+CREATE TABLE IF NOT EXISTS schema_migrations (
+    version VARCHAR(10) NOT NULL COMMENT 'Número de versión (prefijo del archivo)',
+    name VARCHAR(255) NOT NULL COMMENT 'Nombre del archivo de migración',
+    checksum CHAR(64) NOT NULL COMMENT 'SHA-256 del archivo al aplicarse',
+    applied_at TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP COMMENT 'Fecha de aplicación',
+    PRIMARY KEY (version)
+) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COLLATE=utf8mb4_general_ci COMMENT='Migraciones de esquema aplicadas'
+"""
+
+
+@dataclass
+class Migration:
+    version: str
+    name: str
+    path: str
+    kind: str # "sql" o "py"
+
+    @property
+    def checksum(self) -> str:
+        with open(self.path, "rb") as f:
+            return hashlib.sha256(f.read()).hexdigest()
+
+
+def discover_migrations(directory: str = MIGRATIONS_DIR) -> List[Migration]:
+    """Devuelve las migraciones disponibles ordenadas por versión."""
+    migrations = []
+    seen_versions = set()
+    for filename in sorted(os.listdir(directory)):
+        match = MIGRATION_FILE_RE.match(filename)
+        if not match:
+            continue
+        version, _, kind = match.groups()
+        if version in seen_versions:
+            raise ValueError(f"Versión de migración duplicada: {version} ({filename})")
+        seen_versions.add(version)
+        migrations.append(Migration(version=version, name=filename, path=os.path.join(directory, filename), kind=kind))
+    return migrations
+
+
+def split_sql_statements(sql_text: str) -> List[str]:
+    """Separa un script SQL en sentencias (terminadas en `;` al final de línea), ignorando comentarios `--`."""
+    statements, current = [], []
+    for line in sql_text.splitlines():
+        stripped = line.strip()
+        if not stripped or stripped.startswith("--"):
+            continue
+        current.append(line)
+        if stripped.endswith(";"):
+            statements.append("\n".join(current).rstrip().rstrip(";"))
+            current = []
+    if current:
+        statements.append("\n".join(current))
+    return statements
+
+
+def _apply_migration(cursor, migration: Migration) -> None:
+    if migration.kind == "sql":
+        with open(migration.path, encoding="utf-8") as f:
+            for statement in split_sql_statements(f.read()):
+                cursor.execute(statement)
+    else:
+        spec = importlib.util.spec_from_file_location(f"cul_migration_{migration.version}", migration.path)
+        module = importlib.util.module_from_spec(spec)
+        spec.loader.exec_module(module)
+        module.upgrade(cursor)
+
+
+def _applied_versions(cursor) -> Dict[str, Dict[str, Any]]:
+    cursor.execute(CREATE_MIGRATIONS_TABLE_SQL)
+    cursor.execute("SELECT version, name, checksum, applied_at FROM schema_migrations ORDER BY version")
+    return {row["version"]: row for row in cursor.fetchall()}
+
+
+def migration_status() -> List[Tuple[Migration, Dict[str, Any]]]:
+    """Lista cada migración disponible junto con su registro en `schema_migrations` (o None si está pendiente)."""
+    conn = get_db_connection()
+    try:
+        with conn.cursor() as cursor:
+            applied = _applied_versions(cursor)
+        return [(migration, applied.get(migration.version)) for migration in discover_migrations()]
+    finally:
+        conn.close()
+
+
+def upgrade() -> List[str]:
+    """
+    Aplica en orden las migraciones pendientes y devuelve los nombres aplicados.
+    Usa un lock con nombre de MySQL para que dos procesos no migren a la vez.
+    Nota: en MySQL el DDL hace commit implícito, así que una migración que falla a mitad
+    puede dejar cambios parciales; por eso cada archivo debe contener un solo cambio lógico.
+    """
+    applied_now = []
+    conn = get_db_connection()
+    try:
+        with conn.cursor() as cursor:
+            cursor.execute("SELECT GET_LOCK(%s, %s) AS locked", (MIGRATIONS_LOCK_NAME, MIGRATIONS_LOCK_TIMEOUT))
+            if not cursor.fetchone()["locked"]:
+                raise RuntimeError("Otro proceso está aplicando migraciones; inténtalo más tarde.")
+            try:
+                applied = _applied_versions(cursor)
+                for migration in discover_migrations():
+                    record = applied.get(migration.version)
+                    if record:
+                        if record["checksum"] != migration.checksum:
+                            logger.warning("%s cambió después de aplicarse.", migration.name)
+                        continue
+                    logger.info("Aplicando %s...", migration.name)
+                    _apply_migration(cursor, migration)
+                    cursor.execute(
+                        "INSERT INTO schema_migrations (version, name, checksum) VALUES (%s, %s, %s)",
+                        (migration.version, migration.name, migration.checksum)
+                    )
+                    conn.commit()
+                    applied_now.append(migration.name)
+            finally:
+                cursor.execute("SELECT RELEASE_LOCK(%s)", (MIGRATIONS_LOCK_NAME,))
+    finally:
+        conn.close()
+    return applied_now
+
+
+# --- Informe EXPLAIN de las consultas CRUD ---
+
+def crud_queries_to_explain() -> List[Tuple[str, str, tuple]]:
+    """
+    Consultas representativas que emite crud.py (generadas con los mismos helpers que usa el CRUD),
+    con argumentos de ejemplo. Devuelve (descripción, sql, args).
+    """
+    from crud import crud # Import diferido: crud importa modelos y FastAPI
+
+    queries = [
+        ("Ticket por ID", "SELECT * FROM tickets WHERE id = %s", ("00000000-0000-0000-0000-000000000000",)),
+        ("Tickets sin filtros (primera página)",
+         "SELECT * FROM tickets" + crud.TICKETS_ORDER_BY + " LIMIT %s", (101,)),
+        ("Tickets sin filtros (página con cursor)",
+         "SELECT * FROM tickets WHERE (created_at < %s OR (created_at = %s AND id < %s))" + crud.TICKETS_ORDER_BY + " LIMIT %s",
+         ("2030-01-01 00:00:00", "2030-01-01 00:00:00", "ffffffff", 101)),
+    ]
+
+    sample_values = {"status": "Abierto", "category": "Soporte Técnico", "user_id_telegram": "123456789",
+                     "priority": "Alta", "source": "Chatbot CUL Telegram"}
+    filter_combinations = [[column] for column in crud.TICKET_FILTER_COLUMNS] + [["status", "category"]]
+    for combination in filter_combinations:
+        conditions, args = crud._build_ticket_conditions({column: sample_values[column] for column in combination})
+        sql = "SELECT * FROM tickets WHERE " + " AND ".join(conditions) + crud.TICKETS_ORDER_BY + " LIMIT %s"
+        queries.append((f"Tickets filtrados por {' + '.join(combination)}", sql, tuple(args) + (101,)))
+
+    queries.extend([
+        ("FAQ por ID", f"SELECT {crud.FAQ_COLUMNS} FROM faqs WHERE id = %s", ("FAQ-BIB001",)),
+        ("FAQs sin filtros", f"SELECT {crud.FAQ_COLUMNS} FROM faqs ORDER BY created_at DESC", ()),
+        ("Palabras clave de varias FAQs",
+         "SELECT faq_id, keyword FROM faq_keywords WHERE faq_id IN (%s, %s) ORDER BY faq_id, position",
+         ("FAQ-BIB001", "FAQ-PAG001")),
+        ("FAQs por palabra clave",
+         f"SELECT {crud.FAQ_COLUMNS} FROM faqs WHERE id IN (SELECT faq_id FROM faq_keywords WHERE keyword_norm = %s)"
+         " ORDER BY created_at DESC", ("pse",)),
+        ("FAQs modificadas desde una marca de agua",
+         f"SELECT {crud.FAQ_COLUMNS} FROM faqs WHERE updated_at >= %s ORDER BY updated_at, id", ("2030-01-01 00:00:00",)),
+        ("FAQs eliminadas desde una marca de agua",
+         "SELECT faq_id FROM faq_deletions WHERE deleted_at >= %s ORDER BY deleted_at", ("2030-01-01 00:00:00",)),
+    ])
+    return queries
+
+
+def explain_report() -> List[Dict[str, Any]]:
+    """
+    Ejecuta EXPLAIN sobre cada consulta CRUD e indica si usa índice y si necesita filesort.
+    Con tablas casi vacías el optimizador puede preferir recorrer la tabla; el informe es
+    representativo con un volumen de datos realista (ver el seed de los benchmarks).
+    """
+    report = []
+    conn = get_db_connection()
+    try:
+        with conn.cursor() as cursor:
+            for description, sql, args in crud_queries_to_explain():
+                cursor.execute("EXPLAIN " + sql, args)
+                for row in cursor.fetchall():
+                    extra = row.get("Extra") or ""
+                    report.append({
+                        "query": description,
+                        "table": row.get("table"),
+                        "type": row.get("type"),
+                        "key": row.get("key"),
+                        "rows": row.get("rows"),
+                        "uses_index": row.get("key") is not None and row.get("type") != "ALL",
+                        "filesort": "filesort" in extra,
+                        "extra": extra,
+                    })
+    finally:
+        conn.close()
+    return report
+
+
+def _print_explain_report(report: List[Dict[str, Any]]) -> None:
+    print(f"{'consulta':<48}{'tipo':<8}{'índice':<38}{'filas':>8}  estado")
+    for entry in report:
+        state = "OK" if entry["uses_index"] and not entry["filesort"] else \
+                ("FILESORT" if entry["uses_index"] else "SIN ÍNDICE")
+        print(f"{entry['query']:<48}{str(entry['type']):<8}{str(entry['key']):<38}{str(entry['rows']):>8}  {state}")
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Migraciones de esquema de la API del Chatbot CUL.")
+    parser.add_argument("command", choices=["status", "upgrade", "explain"])
+    args = parser.parse_args()
+    setup_logging(log_format=os.getenv("LOG_FORMAT", "text")) # En consola, texto legible por defecto
+
+    if args.command == "upgrade":
+        applied = upgrade()
+        if applied:
+            logger.info("%d migración(es) aplicada(s).", len(applied))
+        else:
+            logger.info("El esquema ya está al día.")
+    elif args.command == "status":
+        for migration, record in migration_status():
+            state = f"aplicada {record['applied_at']}" if record else "PENDIENTE"
+            print(f"{migration.name:<50}{state}")
+    else:
+        _print_explain_report(explain_report())
+
+
+if __name__ == "__main__":
+    main()
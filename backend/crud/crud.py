@@ -1,18 +1,81 @@
 # api_cul_project/crud.py
 # Operaciones CRUD interactuando con la base de datos MySQL.
 
-from typing import List, Optional, Dict, Any
-from datetime import datetime, timezone # timezone no es necesario para pymysql directamente
+from typing import List, Optional, Dict, Any, Tuple, AsyncIterator, NamedTuple
+from datetime import datetime, timedelta, timezone # timezone no es necesario para pymysql directamente
+import base64
+import hashlib
+import os
+import threading
 import uuid
 import pymysql # Para manejar errores específicos de pymysql
 
 # Importar modelos Pydantic y configuración de BD
 from models import models
-from core.database import get_db_connection
+from core.cache import TTLCache
+from core.logging_config import get_logger
+from core.database import DB_QUERY_ROWS, PoolTimeoutError, get_db_connection, instrumented_query, run_in_db_executor
+from search import faq_index
+from search.text import normalize_keyword, unique_keywords
+
+logger = get_logger("crud")
+
+# Cada operación tiene una versión síncrona `_nombre` (PyMySQL es bloqueante) y una envoltura
+# `async` con la firma pública que la ejecuta en el executor acotado de core.database.
+# Así las consultas no congelan el event loop de uvicorn y las peticiones concurrentes se solapan.
+
+# --- Helpers de lectura reutilizables dentro de una misma conexión ---
+
+def _fetch_ticket(cursor, ticket_id: str) -> Optional[models.TicketResponse]:
+    """Lee un ticket usando un cursor ya abierto (evita pedir otra conexión al pool)."""
+    cursor.execute("SELECT * FROM tickets WHERE id = %s", (ticket_id,))
+    result = cursor.fetchone()
+    return models.TicketResponse(**result) if result else None
+
+# Columnas de `faqs` que se devuelven; las palabras clave se leen de `faq_keywords` (migración 0003).
+FAQ_COLUMNS = "id, question, answer, category, created_at, updated_at"
+
+def _load_faq_keywords(cursor, faq_ids: List[str]) -> Dict[str, List[str]]:
+    """Carga las palabras clave de varias FAQs con una sola consulta: {faq_id: [keyword, ...]}."""
+    keywords_by_faq: Dict[str, List[str]] = {faq_id: [] for faq_id in faq_ids}
+    if not faq_ids:
+        return keywords_by_faq
+    placeholders = ", ".join(["%s"] * len(faq_ids))
+    cursor.execute(
+        f"SELECT faq_id, keyword FROM faq_keywords WHERE faq_id IN ({placeholders}) ORDER BY faq_id, position",
+        tuple(faq_ids)
+    )
+    for row in cursor.fetchall():
+        keywords_by_faq[row['faq_id']].append(row['keyword'])
+    return keywords_by_faq
+
+def _faq_rows_to_models(cursor, rows: List[Dict[str, Any]]) -> List[models.FAQResponse]:
+    """Convierte filas de `faqs` al modelo de respuesta, adjuntando sus palabras clave en lote."""
+    keywords_by_faq = _load_faq_keywords(cursor, [row['id'] for row in rows])
+    for row in rows:
+        row['keywords'] = keywords_by_faq[row['id']]
+    return models.FAQListAdapter.validate_python(rows)
+
+def _fetch_faq(cursor, faq_id: str) -> Optional[models.FAQResponse]:
+    """Lee una FAQ usando un cursor ya abierto."""
+    cursor.execute(f"SELECT {FAQ_COLUMNS} FROM faqs WHERE id = %s", (faq_id,))
+    result = cursor.fetchone()
+    return _faq_rows_to_models(cursor, [result])[0] if result else None
+
+def _replace_faq_keywords(cursor, faq_id: str, keywords: Optional[List[str]]) -> None:
+    """Sustituye las palabras clave de una FAQ (normalizadas y sin duplicados) dentro de la transacción en curso."""
+    cursor.execute("DELETE FROM faq_keywords WHERE faq_id = %s", (faq_id,))
+    rows = [(faq_id, normalized, keyword, position)
+            for position, (normalized, keyword) in enumerate(unique_keywords(keywords or []))]
+    if rows:
+        cursor.executemany(
+            "INSERT INTO faq_keywords (faq_id, keyword_norm, keyword, position) VALUES (%s, %s, %s, %s)", rows
+        )
 
 # --- Funciones CRUD para Tickets ---
 
-async def create_ticket_in_db(ticket_data: models.TicketCreate) -> models.TicketResponse:
+@instrumented_query
+def _create_ticket_in_db(ticket_data: models.TicketCreate) -> models.TicketResponse:
     """Crea un nuevo ticket en la base de datos."""
     ticket_id = str(uuid.uuid4())
     # Nota: created_at y updated_at son manejados por la BD (DEFAULT CURRENT_TIMESTAMP)
@@ -41,61 +104,69 @@ async def create_ticket_in_db(ticket_data: models.TicketCreate) -> models.Ticket
         conn = get_db_connection()
         with conn.cursor() as cursor:
             cursor.execute(sql, args)
-        conn.commit()
-        
-        # Para devolver el objeto completo, necesitamos recuperarlo o construirlo
-        # La BD ya tiene created_at, updated_at, status.
-        # Vamos a recuperarlo para ser precisos
-        created_ticket = await get_ticket_from_db(ticket_id)
+            conn.commit()
+            # Para devolver el objeto completo (created_at, updated_at, status los pone la BD)
+            # lo releemos con la misma conexión en lugar de pedir otra al pool.
+            created_ticket = _fetch_ticket(cursor, ticket_id)
         if not created_ticket: # Esto no debería pasar si la inserción fue exitosa
              raise Exception("Ticket creado pero no pudo ser recuperado.")
-        print(f"CRUD: Ticket creado con ID {ticket_id} en la BD.")
+        logger.info("Ticket creado con ID %s en la BD.", ticket_id)
         return created_ticket
     except pymysql.MySQLError as e:
-        print(f"CRUD Error (MySQL) al crear ticket: {e}")
+        logger.error("Error (MySQL) al crear ticket: %s", e)
         # Podrías querer deshacer (rollback) si algo falla, aunque commit es al final.
         # if conn: conn.rollback() # No es necesario aquí si el error es antes del commit
         raise HTTPException(status_code=500, detail=f"Error de base de datos al crear ticket: {e}")
+    except PoolTimeoutError:
+        raise # main.py la responde con un 503
     except Exception as e:
-        print(f"CRUD Error (General) al crear ticket: {e}")
+        logger.exception("Error inesperado al crear ticket: %s", e)
         raise HTTPException(status_code=500, detail=f"Error inesperado al crear ticket: {e}")
     finally:
         if conn:
             conn.close()
 
-async def get_ticket_from_db(ticket_id: str) -> Optional[models.TicketResponse]:
+async def create_ticket_in_db(ticket_data: models.TicketCreate) -> models.TicketResponse:
+    """Crea un nuevo ticket en la base de datos."""
+    return await run_in_db_executor(_create_ticket_in_db, ticket_data)
+
+@instrumented_query
+def _get_ticket_from_db(ticket_id: str) -> Optional[models.TicketResponse]:
     """Obtiene un ticket de la base de datos por su ID."""
-    sql = "SELECT * FROM tickets WHERE id = %s"
     conn = None
     try:
         conn = get_db_connection()
         with conn.cursor() as cursor:
-            cursor.execute(sql, (ticket_id,))
-            result = cursor.fetchone() # fetchone() devuelve un dict gracias a DictCursor
+            # fetchone() devuelve un dict gracias a DictCursor; Pydantic v2 maneja los datetime directamente.
+            ticket = _fetch_ticket(cursor, ticket_id)
         
-        if result:
-            # Convertir las fechas de la BD (objetos datetime) a cadenas ISO si es necesario
-            # o asegurarse de que Pydantic las maneje correctamente.
-            # Pydantic v2 maneja objetos datetime directamente.
-            # result['created_at'] = result['created_at'].isoformat() if result.get('created_at') else None
-            # result['updated_at'] = result['updated_at'].isoformat() if result.get('updated_at') else None
-            # result['closed_at'] = result['closed_at'].isoformat() if result.get('closed_at') else None
-            print(f"CRUD: Ticket recuperado de BD: {result.get('id')}")
-            return models.TicketResponse(**result)
-        return None
+        if ticket:
+            logger.debug("Ticket recuperado de BD: %s", ticket.id)
+        return ticket
     except pymysql.MySQLError as e:
-        print(f"CRUD Error (MySQL) al obtener ticket {ticket_id}: {e}")
+        logger.error("Error (MySQL) al obtener ticket %s: %s", ticket_id, e)
         raise HTTPException(status_code=500, detail=f"Error de base de datos al obtener ticket: {e}")
+    except PoolTimeoutError:
+        raise
     except Exception as e:
-        print(f"CRUD Error (General) al obtener ticket {ticket_id}: {e}")
+        logger.exception("Error inesperado al obtener ticket %s: %s", ticket_id, e)
         raise HTTPException(status_code=500, detail=f"Error inesperado al obtener ticket: {e}")
     finally:
         if conn:
             conn.close()
 
-async def get_all_tickets_from_db(filters: Optional[Dict[str, Any]] = None) -> List[models.TicketResponse]:
-    """Obtiene todos los tickets, con filtros básicos."""
-    base_sql = "SELECT * FROM tickets"
+async def get_ticket_from_db(ticket_id: str) -> Optional[models.TicketResponse]:
+    """Obtiene un ticket de la base de datos por su ID."""
+    return await run_in_db_executor(_get_ticket_from_db, ticket_id)
+
+# Columnas permitidas para filtrar tickets (evita inyección SQL en los nombres de columna)
+TICKET_FILTER_COLUMNS = ["status", "category", "user_id_telegram", "priority", "source"]
+
+# Orden estable para la paginación por cursor: (created_at, id) identifica una fila de forma única.
+TICKETS_ORDER_BY = " ORDER BY created_at DESC, id DESC"
+
+def _build_ticket_conditions(filters: Optional[Dict[str, Any]]) -> Tuple[List[str], List[Any]]:
+    """Traduce el diccionario de filtros a condiciones SQL parametrizadas."""
     conditions = []
     args = []
 
@@ -104,46 +175,213 @@ async def get_all_tickets_from_db(filters: Optional[Dict[str, Any]] = None) -> L
             if value is not None: # Solo añadir condición si el valor del filtro no es None
                 # Asegurarse de que la clave es una columna válida para evitar inyección SQL
                 # (aunque aquí los keys vienen de parámetros Query definidos)
-                if key in ["status", "category", "user_id_telegram", "priority", "source"]: # Columnas permitidas para filtrar
+                if key in TICKET_FILTER_COLUMNS:
                     conditions.append(f"{key} = %s")
                     args.append(value)
                 elif key == "problem_description_contains": # Ejemplo de filtro LIKE
                     conditions.append("problem_description LIKE %s")
                     args.append(f"%{value}%")
+    return conditions, args
+
+def encode_ticket_cursor(ticket: models.TicketResponse) -> str:
+    """Cursor opaco (base64 url-safe) con la posición (created_at, id) del último ticket de una página."""
+    raw = f"{ticket.created_at.strftime('%Y-%m-%d %H:%M:%S.%f')}|{ticket.id}"
+    return base64.urlsafe_b64encode(raw.encode("utf-8")).decode("ascii").rstrip("=")
+
+def decode_ticket_cursor(cursor: str) -> Tuple[datetime, str]:
+    """Decodifica un cursor de `encode_ticket_cursor`. Lanza ValueError si no es válido."""
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        created_at_str, ticket_id = base64.urlsafe_b64decode(padded.encode("ascii")).decode("utf-8").split("|", 1)
+        return datetime.strptime(created_at_str, "%Y-%m-%d %H:%M:%S.%f"), ticket_id
+    except Exception:
+        raise ValueError("El parámetro 'cursor' no es válido.")
 
+@instrumented_query
+def _get_tickets_page_from_db(filters: Optional[Dict[str, Any]] = None, limit: Optional[int] = None,
+                              cursor: Optional[str] = None) -> Tuple[List[models.TicketResponse], Optional[str]]:
+    """
+    Obtiene una página de tickets (más recientes primero) usando paginación por cursor (keyset).
+    Devuelve la lista de tickets y el cursor de la página siguiente (None si no hay más).
+    Sin `limit` devuelve todos los tickets que cumplan los filtros.
+    """
+    conditions, args = _build_ticket_conditions(filters)
 
+    if cursor:
+        cursor_created_at, cursor_id = decode_ticket_cursor(cursor)
+        # Filas estrictamente posteriores a la última entregada según (created_at DESC, id DESC)
+        conditions.append("(created_at < %s OR (created_at = %s AND id < %s))")
+        args.extend([cursor_created_at, cursor_created_at, cursor_id])
+
+    base_sql = "SELECT * FROM tickets"
     if conditions:
         base_sql += " WHERE " + " AND ".join(conditions)
     
-    base_sql += " ORDER BY created_at DESC" # Ordenar por más reciente por defecto
+    base_sql += TICKETS_ORDER_BY # Ordenar por más reciente por defecto
+
+    if limit is not None:
+        base_sql += " LIMIT %s"
+        args.append(limit + 1) # Una fila extra para saber si existe una página siguiente
 
     conn = None
     try:
         conn = get_db_connection()
-        with conn.cursor() as cursor:
-            cursor.execute(base_sql, tuple(args))
-            results = cursor.fetchall()
+        with conn.cursor() as db_cursor:
+            db_cursor.execute(base_sql, tuple(args))
+            results = db_cursor.fetchall()
         
-        print(f"CRUD: Recuperados {len(results)} tickets de la BD. Query: {base_sql} Args: {args}")
-        return [models.TicketResponse(**row) for row in results]
+        logger.debug("Recuperados %d tickets de la BD. Query: %s Args: %s", len(results), base_sql, args)
+        tickets = models.TicketListAdapter.validate_python(results[:limit])
+        next_cursor = None
+        if limit is not None and len(results) > limit:
+            next_cursor = encode_ticket_cursor(tickets[-1])
+        return tickets, next_cursor
     except pymysql.MySQLError as e:
-        print(f"CRUD Error (MySQL) al listar tickets: {e}")
+        logger.error("Error (MySQL) al listar tickets: %s", e)
         raise HTTPException(status_code=500, detail=f"Error de base de datos al listar tickets: {e}")
+    except PoolTimeoutError:
+        raise
     except Exception as e:
-        print(f"CRUD Error (General) al listar tickets: {e}")
+        logger.exception("Error inesperado al listar tickets: %s", e)
         raise HTTPException(status_code=500, detail=f"Error inesperado al listar tickets: {e}")
     finally:
         if conn:
             conn.close()
 
+async def get_tickets_page_from_db(filters: Optional[Dict[str, Any]] = None, limit: Optional[int] = None,
+                                   cursor: Optional[str] = None) -> Tuple[List[models.TicketResponse], Optional[str]]:
+    """Obtiene una página de tickets y el cursor de la siguiente."""
+    if cursor:
+        decode_ticket_cursor(cursor) # Validar antes de ocupar un hilo del executor (ValueError -> 400)
+    return await run_in_db_executor(_get_tickets_page_from_db, filters, limit, cursor)
+
+async def get_all_tickets_from_db(filters: Optional[Dict[str, Any]] = None) -> List[models.TicketResponse]:
+    """Obtiene todos los tickets, con filtros básicos."""
+    tickets, _ = await run_in_db_executor(_get_tickets_page_from_db, filters)
+    return tickets
+
+class TicketStream:
+    """
+    Filas de tickets leídas con un cursor del lado del servidor, en lotes, con `async for`.
+    Tiene la conexión ocupada desde que se crea: quien la recibe debe llamar siempre a `aclose()`
+    (idempotente), también si nunca llega a recorrerla (p. ej. el cliente se fue antes).
+    """
+
+    def __init__(self, conn, db_cursor, batch_size: int):
+        self._conn = conn
+        self._cursor = db_cursor
+        self._batch_size = batch_size
+        self._exhausted = False
+        self._closed = False
+        self._streamed = 0
+        self._streamed_rows = DB_QUERY_ROWS.labels("stream_tickets_from_db")
+
+    async def __aiter__(self) -> AsyncIterator[Dict[str, Any]]:
+        try:
+            while not self._closed:
+                rows = await run_in_db_executor(self._cursor.fetchmany, self._batch_size)
+                if not rows:
+                    self._exhausted = True
+                    break
+                for row in rows:
+                    yield row
+                self._streamed += len(rows)
+                self._streamed_rows.inc(len(rows))
+        finally:
+            await self.aclose()
+
+    async def aclose(self) -> None:
+        if self._closed:
+            return
+        self._closed = True
+        logger.info("Streaming de tickets finalizado (%d filas, completo=%s).", self._streamed, self._exhausted)
+        if self._exhausted:
+            await run_in_db_executor(self._cursor.close)
+            self._conn.close()
+        else:
+            # Si el cliente se desconectó a mitad del stream (o antes de empezar), cerrar el cursor
+            # obligaría a leer el resto del resultado; es más barato descartar la conexión.
+            self._conn.invalidate()
+
+async def stream_tickets_from_db(filters: Optional[Dict[str, Any]] = None,
+                                 batch_size: int = 500) -> TicketStream:
+    """
+    Ejecuta la consulta de tickets con un cursor del lado del servidor (SSDictCursor) y devuelve
+    un `TicketStream` que entrega las filas a medida que llegan. Solo hay `batch_size` filas
+    en memoria a la vez, sin importar el tamaño de la tabla.
+    La consulta se lanza antes de devolverlo para que los errores de BD aún puedan responderse
+    con un 500 en lugar de cortar un stream ya iniciado; por eso hay que cerrarlo siempre.
+    """
+    conditions, args = _build_ticket_conditions(filters)
+    sql = "SELECT * FROM tickets"
+    if conditions:
+        sql += " WHERE " + " AND ".join(conditions)
+    sql += TICKETS_ORDER_BY
+
+    @instrumented_query
+    def _stream_tickets_from_db():
+        conn = get_db_connection()
+        try:
+            db_cursor = conn.cursor(pymysql.cursors.SSDictCursor)
+            db_cursor.execute(sql, tuple(args))
+            return conn, db_cursor
+        except Exception:
+            conn.invalidate()
+            raise
+
+    try:
+        conn, db_cursor = await run_in_db_executor(_stream_tickets_from_db)
+    except pymysql.MySQLError as e:
+        logger.error("Error (MySQL) al abrir el streaming de tickets: %s", e)
+        raise HTTPException(status_code=500, detail=f"Error de base de datos al listar tickets: {e}")
+    return TicketStream(conn, db_cursor, batch_size)
+
+# --- Caché de lectura de FAQs ---
+# Las FAQs casi no cambian: las lecturas se sirven desde memoria y cada escritura que hace commit
+# invalida la FAQ afectada y todos los listados/búsquedas (cualquiera podría incluirla).
+# Cada resultado se guarda ya serializado a JSON y con su ETag: un acierto de caché se responde
+# sin volver a validar ni serializar, y un If-None-Match que coincide con un 304.
+
+FAQ_CACHE_MAX_ENTRIES = int(os.getenv("FAQ_CACHE_MAX_ENTRIES", 512)) # 0 desactiva la caché
+FAQ_CACHE_TTL = float(os.getenv("FAQ_CACHE_TTL", 300)) # Segundos; acota cuánto tardan en verse cambios de otros workers
+
+faq_list_cache = TTLCache("faqs_list", FAQ_CACHE_MAX_ENTRIES, FAQ_CACHE_TTL)
+faq_item_cache = TTLCache("faqs_item", FAQ_CACHE_MAX_ENTRIES, FAQ_CACHE_TTL)
+
+class SerializedFAQs(NamedTuple):
+    """FAQ o lista de FAQs junto con su JSON serializado y la ETag de ese JSON."""
+    value: Any
+    body: bytes
+    etag: str
+
+def _serialize_faqs(value: Any) -> SerializedFAQs:
+    body = models.FAQListAdapter.dump_json(value) if isinstance(value, list) else value.model_dump_json().encode()
+    return SerializedFAQs(value, body, '"' + hashlib.sha256(body).hexdigest()[:32] + '"')
+
+def _faq_list_cache_key(query_term: Optional[str], category_filter: Optional[str], top_k: int,
+                        keyword: Optional[str]) -> Tuple[str, str, Optional[int], str]:
+    """Clave normalizada: "Matrícula " y "matricula" comparten entrada (la búsqueda tampoco las distingue)."""
+    return (normalize_keyword(query_term or ""), normalize_keyword(category_filter or ""),
+            top_k if query_term else None, normalize_keyword(keyword or ""))
+
+def _invalidate_faq_cache(faq_id: str) -> None:
+    """Invalida la caché tras un commit que crea, modifica o elimina la FAQ `faq_id`."""
+    faq_item_cache.invalidate(faq_id)
+    faq_list_cache.clear()
+
+def get_faq_cache_stats() -> List[Dict[str, Any]]:
+    """Contadores de aciertos/fallos de las cachés de FAQs."""
+    return [faq_list_cache.stats(), faq_item_cache.stats()]
+
 # --- Funciones CRUD para FAQs ---
 
-async def create_faq_in_db(faq_data: models.FAQCreate) -> models.FAQResponse:
+@instrumented_query
+def _create_faq_in_db(faq_data: models.FAQCreate) -> models.FAQResponse:
     """Crea una nueva FAQ en la base de datos."""
     faq_id = f"FAQ-{str(uuid.uuid4())[:8].upper()}" # Generar ID si no se provee uno
     # created_at y updated_at son manejados por la BD.
     
-    # Convertir lista de keywords a string si es necesario (ej. separada por comas)
+    # La columna `keywords` se sigue escribiendo por compatibilidad; la fuente de verdad es `faq_keywords`.
     keywords_str = ",".join(faq_data.keywords) if faq_data.keywords else None
 
     sql = """
@@ -162,65 +400,189 @@ async def create_faq_in_db(faq_data: models.FAQCreate) -> models.FAQResponse:
         conn = get_db_connection()
         with conn.cursor() as cursor:
             cursor.execute(sql, args)
-        conn.commit()
-        
-        # Recuperar la FAQ creada para devolver el objeto completo
-        created_faq = await get_faq_from_db_by_id(faq_id) # Necesitaremos esta función
+            _replace_faq_keywords(cursor, faq_id, faq_data.keywords)
+            cursor.execute("DELETE FROM faq_deletions WHERE faq_id = %s", (faq_id,)) # Por si el ID se reutiliza
+            conn.commit()
+            # Recuperar la FAQ creada (misma conexión) para devolver el objeto completo
+            created_faq = _fetch_faq(cursor, faq_id)
         if not created_faq:
             raise Exception("FAQ creada pero no pudo ser recuperada.")
-        print(f"CRUD: FAQ creada con ID {faq_id} en la BD.")
+        _index_faq_for_search(created_faq)
+        _invalidate_faq_cache(faq_id)
+        logger.info("FAQ creada con ID %s en la BD.", faq_id)
         return created_faq
     except pymysql.MySQLError as e:
-        print(f"CRUD Error (MySQL) al crear FAQ: {e}")
+        logger.error("Error (MySQL) al crear FAQ: %s", e)
         raise HTTPException(status_code=500, detail=f"Error de base de datos al crear FAQ: {e}")
+    except PoolTimeoutError:
+        raise
     except Exception as e:
-        print(f"CRUD Error (General) al crear FAQ: {e}")
+        logger.exception("Error inesperado al crear FAQ: %s", e)
         raise HTTPException(status_code=500, detail=f"Error inesperado al crear FAQ: {e}")
     finally:
         if conn:
             conn.close()
 
-async def get_faq_from_db_by_id(faq_id: str) -> Optional[models.FAQResponse]:
+async def create_faq_in_db(faq_data: models.FAQCreate) -> models.FAQResponse:
+    """Crea una nueva FAQ en la base de datos."""
+    return await run_in_db_executor(_create_faq_in_db, faq_data)
+
+@instrumented_query
+def _get_faq_from_db_by_id(faq_id: str) -> Optional[models.FAQResponse]:
     """Obtiene una FAQ de la base de datos por su ID."""
-    sql = "SELECT * FROM faqs WHERE id = %s"
     conn = None
     try:
         conn = get_db_connection()
         with conn.cursor() as cursor:
-            cursor.execute(sql, (faq_id,))
-            result = cursor.fetchone()
-        if result:
-            # Convertir keywords de string a lista si es necesario
-            if result.get('keywords') and isinstance(result['keywords'], str):
-                result['keywords'] = [k.strip() for k in result['keywords'].split(',')]
-            else:
-                result['keywords'] = []
-            return models.FAQResponse(**result)
-        return None
+            return _fetch_faq(cursor, faq_id)
     except pymysql.MySQLError as e:
-        print(f"CRUD Error (MySQL) al obtener FAQ {faq_id}: {e}")
+        logger.error("Error (MySQL) al obtener FAQ %s: %s", faq_id, e)
         # No relanzar HTTPException aquí si es para uso interno como en create_faq_in_db
         return None # O manejar el error de otra forma
     finally:
         if conn:
             conn.close()
 
+async def get_faq_serialized(faq_id: str) -> Optional[SerializedFAQs]:
+    """Obtiene una FAQ (desde la caché si está) ya serializada y con su ETag; None si no existe."""
+    hit, cached = faq_item_cache.get(faq_id)
+    if hit:
+        return cached
+    generation = faq_item_cache.generation
+    faq = await run_in_db_executor(_get_faq_from_db_by_id, faq_id)
+    if not faq:
+        return None # Las FAQs inexistentes no se cachean: podrían crearse desde otro worker
+    result = _serialize_faqs(faq)
+    faq_item_cache.set(faq_id, result, generation)
+    return result
 
-async def get_faqs_from_db(query_term: Optional[str] = None, category_filter: Optional[str] = None) -> List[models.FAQResponse]:
-    """Busca/obtiene FAQs de la base de datos."""
-    base_sql = "SELECT * FROM faqs"
+async def get_faq_from_db_by_id(faq_id: str) -> Optional[models.FAQResponse]:
+    """Obtiene una FAQ de la base de datos por su ID."""
+    result = await get_faq_serialized(faq_id)
+    return result.value if result else None
+
+
+def _index_faq_for_search(faq: models.FAQResponse) -> None:
+    """Refleja en el índice de búsqueda una FAQ recién creada o actualizada."""
+    faq_index.index_faq(faq.id, faq.question, faq.answer, faq.category, faq.keywords)
+
+def _faqs_for_search():
+    """Genera las filas de FAQs con sus palabras clave; lee la BD al empezar a recorrerse."""
+    conn = get_db_connection()
+    try:
+        with conn.cursor() as cursor:
+            cursor.execute("SELECT id, question, answer, category FROM faqs")
+            rows = cursor.fetchall()
+            cursor.execute("SELECT faq_id, keyword FROM faq_keywords ORDER BY faq_id, position")
+            keyword_rows = cursor.fetchall()
+    finally:
+        conn.close()
+    keywords_by_faq: Dict[str, List[str]] = {}
+    for keyword_row in keyword_rows:
+        keywords_by_faq.setdefault(keyword_row['faq_id'], []).append(keyword_row['keyword'])
+    for row in rows:
+        row['keywords'] = keywords_by_faq.get(row['id'], [])
+        yield row
+
+# Una sola reconstrucción a la vez por worker: los hilos del executor que encuentran el índice
+# caducado mientras otro lo reconstruye siguen buscando en el anterior en lugar de repetir el trabajo.
+_faq_index_rebuild_lock = threading.Lock()
+
+@instrumented_query
+def _rebuild_faq_search_index(only_if_stale: bool = False) -> int:
+    """
+    Reconstruye el índice BM25 de FAQs leyendo toda la tabla. Con `only_if_stale` no hace nada si el
+    índice está al día o ya se está reconstruyendo (salvo que nunca se haya construido: entonces espera).
+    Devuelve el número de FAQs indexadas (0 si no se reconstruyó).
+    """
+    if not _faq_index_rebuild_lock.acquire(blocking=not only_if_stale or not faq_index.is_built()):
+        return 0
+    try:
+        if only_if_stale and not faq_index.needs_rebuild(): # Otro hilo acaba de reconstruirlo
+            return 0
+        indexed = faq_index.rebuild_faq_index(_faqs_for_search())
+        # Las búsquedas cacheadas salieron del índice anterior (quizá sin cambios de otros workers) y la
+        # nueva generación descarta las que estaban en curso durante la reconstrucción.
+        faq_list_cache.clear()
+    finally:
+        _faq_index_rebuild_lock.release()
+    logger.info("Índice de búsqueda de FAQs reconstruido con %d FAQs.", indexed)
+    return indexed
+
+async def rebuild_faq_search_index() -> int:
+    """Reconstruye el índice de búsqueda de FAQs (se llama al arrancar la API)."""
+    return await run_in_db_executor(_rebuild_faq_search_index)
+
+@instrumented_query
+def _get_faq_ids_by_keyword(keyword: str) -> List[str]:
+    """IDs de las FAQs con esa palabra clave exacta (sin distinguir mayúsculas ni tildes)."""
+    conn = get_db_connection()
+    try:
+        with conn.cursor() as cursor:
+            cursor.execute("SELECT faq_id FROM faq_keywords WHERE keyword_norm = %s", (normalize_keyword(keyword),))
+            return [row['faq_id'] for row in cursor.fetchall()]
+    finally:
+        conn.close()
+
+@instrumented_query
+def _search_faqs_in_db(query_term: str, category_filter: Optional[str], top_k: int,
+                       keyword: Optional[str] = None) -> List[models.FAQResponse]:
+    """Búsqueda por relevancia: el índice BM25 elige y ordena las FAQs y la BD aporta las filas actuales."""
+    if faq_index.needs_rebuild():
+        _rebuild_faq_search_index(only_if_stale=True)
+
+    allowed_ids = set(_get_faq_ids_by_keyword(keyword)) if keyword else None
+    ranked = faq_index.search_faqs(query_term, category_filter=category_filter, top_k=top_k, allowed_ids=allowed_ids)
+    if not ranked:
+        logger.debug("Búsqueda de FAQs sin resultados para '%s' (categoría: %s).", query_term, category_filter)
+        return []
+
+    scores = dict(ranked)
+    placeholders = ", ".join(["%s"] * len(ranked))
+    sql = f"SELECT {FAQ_COLUMNS} FROM faqs WHERE id IN ({placeholders})"
+    conn = get_db_connection()
+    try:
+        with conn.cursor() as cursor:
+            cursor.execute(sql, tuple(scores))
+            results = cursor.fetchall()
+            for row in results:
+                row['relevance_score'] = round(scores[row['id']], 4)
+            faqs_list = _faq_rows_to_models(cursor, results)
+    finally:
+        conn.close()
+
+    faqs_list.sort(key=lambda faq: faq.relevance_score, reverse=True)
+    logger.debug("Búsqueda BM25 de FAQs para '%s' devolvió %d resultados.", query_term, len(faqs_list))
+    return faqs_list
+
+@instrumented_query
+def _get_faqs_from_db(query_term: Optional[str] = None, category_filter: Optional[str] = None,
+                      top_k: int = faq_index.FAQ_SEARCH_DEFAULT_TOP_K,
+                      keyword: Optional[str] = None) -> List[models.FAQResponse]:
+    """
+    Busca/obtiene FAQs de la base de datos.
+    Con `query_term` devuelve las `top_k` FAQs más relevantes según BM25 (con `relevance_score`);
+    sin él, lista las FAQs (filtradas por categoría si se indica) de la más reciente a la más antigua.
+    `keyword` restringe ambos casos a las FAQs que tienen esa palabra clave exacta.
+    """
+    try:
+        if query_term:
+            return _search_faqs_in_db(query_term, category_filter, top_k, keyword)
+    except pymysql.MySQLError as e:
+        logger.error("Error (MySQL) al buscar FAQs: %s", e)
+        raise HTTPException(status_code=500, detail=f"Error de base de datos al buscar FAQs: {e}")
+
+    base_sql = f"SELECT {FAQ_COLUMNS} FROM faqs"
     conditions = []
     args = []
 
+    if keyword:
+        # Búsqueda exacta por palabra clave, resuelta con el índice (keyword_norm, faq_id) de faq_keywords
+        conditions.append("id IN (SELECT faq_id FROM faq_keywords WHERE keyword_norm = %s)")
+        args.append(normalize_keyword(keyword))
     if category_filter:
         conditions.append("category LIKE %s") # Usar LIKE para búsquedas parciales de categoría
         args.append(f"%{category_filter}%")
-    
-    if query_term:
-        # Buscar en question, answer, y keywords
-        query_like = f"%{query_term}%"
-        conditions.append("(question LIKE %s OR answer LIKE %s OR keywords LIKE %s)")
-        args.extend([query_like, query_like, query_like])
 
     if conditions:
         base_sql += " WHERE " + " AND ".join(conditions)
@@ -233,30 +595,89 @@ async def get_faqs_from_db(query_term: Optional[str] = None, category_filter: Op
         with conn.cursor() as cursor:
             cursor.execute(base_sql, tuple(args))
             results = cursor.fetchall()
-
-        faqs_list = []
-        for row in results:
-            if row.get('keywords') and isinstance(row['keywords'], str):
-                row['keywords'] = [k.strip() for k in row['keywords'].split(',') if k.strip()]
-            elif not row.get('keywords'):
-                 row['keywords'] = []
-            faqs_list.append(models.FAQResponse(**row))
+            faqs_list = _faq_rows_to_models(cursor, results)
         
-        print(f"CRUD: Recuperadas {len(faqs_list)} FAQs de la BD. Query: {base_sql} Args: {args}")
+        logger.debug("Recuperadas %d FAQs de la BD. Query: %s Args: %s", len(faqs_list), base_sql, args)
         return faqs_list
     except pymysql.MySQLError as e:
-        print(f"CRUD Error (MySQL) al listar FAQs: {e}")
+        logger.error("Error (MySQL) al listar FAQs: %s", e)
         raise HTTPException(status_code=500, detail=f"Error de base de datos al listar FAQs: {e}")
+    except PoolTimeoutError:
+        raise
     except Exception as e:
-        print(f"CRUD Error (General) al listar FAQs: {e}")
+        logger.exception("Error inesperado al listar FAQs: %s", e)
         raise HTTPException(status_code=500, detail=f"Error inesperado al listar FAQs: {e}")
     finally:
         if conn:
             conn.close()
 
+async def get_faqs_serialized(query_term: Optional[str] = None, category_filter: Optional[str] = None,
+                              top_k: int = faq_index.FAQ_SEARCH_DEFAULT_TOP_K,
+                              keyword: Optional[str] = None) -> SerializedFAQs:
+    """Busca/obtiene FAQs (desde la caché si está) ya serializadas y con la ETag de la lista."""
+    key = _faq_list_cache_key(query_term, category_filter, top_k, keyword)
+    hit, cached = faq_list_cache.get(key)
+    if hit:
+        return cached
+    generation = faq_list_cache.generation
+    faqs = await run_in_db_executor(_get_faqs_from_db, query_term, category_filter, top_k, keyword)
+    result = _serialize_faqs(faqs)
+    faq_list_cache.set(key, result, generation)
+    return result
+
+async def get_faqs_from_db(query_term: Optional[str] = None, category_filter: Optional[str] = None,
+                           top_k: int = faq_index.FAQ_SEARCH_DEFAULT_TOP_K,
+                           keyword: Optional[str] = None) -> List[models.FAQResponse]:
+    """Busca/obtiene FAQs de la base de datos."""
+    return (await get_faqs_serialized(query_term, category_filter, top_k, keyword)).value
+
+# --- Sincronización incremental de FAQs (réplicas locales, p. ej. el chatbot) ---
+
+# Margen restado a la marca de agua devuelta: una transacción que fijó updated_at justo antes de
+# leer NOW() pero hizo commit después seguirá entrando en la siguiente sincronización.
+FAQ_CHANGES_OVERLAP_SECONDS = int(os.getenv("FAQ_CHANGES_OVERLAP_SECONDS", 5))
+
+@instrumented_query
+def _get_faq_changes_from_db(since: Optional[datetime] = None) -> models.FAQChanges:
+    """
+    FAQs creadas/modificadas y eliminadas desde la marca de agua `since` (inclusive).
+    Sin `since` devuelve todas las FAQs (`full=True`). Las FAQs pueden repetirse entre
+    sincronizaciones consecutivas por el margen de solape; aplicarlas es idempotente.
+    """
+    conn = None
+    try:
+        conn = get_db_connection()
+        with conn.cursor() as cursor:
+            cursor.execute("SELECT NOW() AS now")
+            watermark = cursor.fetchone()['now'] - timedelta(seconds=FAQ_CHANGES_OVERLAP_SECONDS)
+            if since is None:
+                cursor.execute(f"SELECT {FAQ_COLUMNS} FROM faqs ORDER BY updated_at, id")
+                rows = cursor.fetchall()
+                deleted_ids = []
+            else:
+                since = since.replace(tzinfo=None) # Mismo formato que devuelve MySQL para TIMESTAMP
+                cursor.execute(f"SELECT {FAQ_COLUMNS} FROM faqs WHERE updated_at >= %s ORDER BY updated_at, id", (since,))
+                rows = cursor.fetchall()
+                cursor.execute("SELECT faq_id FROM faq_deletions WHERE deleted_at >= %s ORDER BY deleted_at", (since,))
+                deleted_ids = [row['faq_id'] for row in cursor.fetchall()]
+            faqs = _faq_rows_to_models(cursor, rows)
+        logger.info("Cambios de FAQs desde %s: %d modificadas, %d eliminadas.", since, len(faqs), len(deleted_ids))
+        return models.FAQChanges(faqs=faqs, deleted_ids=deleted_ids, watermark=watermark, full=since is None)
+    except pymysql.MySQLError as e:
+        logger.error("Error (MySQL) al obtener cambios de FAQs: %s", e)
+        raise HTTPException(status_code=500, detail=f"Error de base de datos al obtener cambios de FAQs: {e}")
+    finally:
+        if conn:
+            conn.close()
+
+async def get_faq_changes_from_db(since: Optional[datetime] = None) -> models.FAQChanges:
+    """FAQs creadas/modificadas y eliminadas desde la marca de agua `since`."""
+    return await run_in_db_executor(_get_faq_changes_from_db, since)
+
 # --- Funciones para actualizar y eliminar (necesarias para gestión completa) ---
 
-async def update_ticket_status_in_db(ticket_id: str, status: str, resolution_details: Optional[str] = None, assigned_to: Optional[str] = None) -> Optional[models.TicketResponse]:
+@instrumented_query
+def _update_ticket_status_in_db(ticket_id: str, status: str, resolution_details: Optional[str] = None, assigned_to: Optional[str] = None) -> Optional[models.TicketResponse]:
     """Actualiza el estado, detalles de resolución y/o asignado de un ticket."""
     fields_to_update = []
     args = []
@@ -274,7 +695,7 @@ async def update_ticket_status_in_db(ticket_id: str, status: str, resolution_det
     if not fields_to_update:
         # No hay nada que actualizar, podríamos devolver el ticket actual o un error.
         # Por ahora, devolvemos el ticket sin cambios.
-        return await get_ticket_from_db(ticket_id)
+        return _get_ticket_from_db(ticket_id)
 
     # `updated_at` se actualiza automáticamente por la BD.
     # Si el estado es "Cerrado" o "Resuelto", podríamos querer actualizar `closed_at`.
@@ -289,23 +710,29 @@ async def update_ticket_status_in_db(ticket_id: str, status: str, resolution_det
         conn = get_db_connection()
         with conn.cursor() as cursor:
             rows_affected = cursor.execute(sql, tuple(args))
-        conn.commit()
+            conn.commit()
+            updated_ticket = _fetch_ticket(cursor, ticket_id) if rows_affected > 0 else None
         
         if rows_affected > 0:
-            print(f"CRUD: Ticket {ticket_id} actualizado en BD. Campos: {fields_to_update}")
-            return await get_ticket_from_db(ticket_id) # Devolver el ticket actualizado
+            logger.info("Ticket %s actualizado en BD. Campos: %s", ticket_id, fields_to_update)
+            return updated_ticket # Devolver el ticket actualizado
         else:
-            print(f"CRUD: Ticket {ticket_id} no encontrado para actualizar o sin cambios.")
+            logger.info("Ticket %s no encontrado para actualizar o sin cambios.", ticket_id)
             return None # O el ticket original si no hubo error pero no se actualizó
     except pymysql.MySQLError as e:
-        print(f"CRUD Error (MySQL) al actualizar ticket {ticket_id}: {e}")
+        logger.error("Error (MySQL) al actualizar ticket %s: %s", ticket_id, e)
         raise HTTPException(status_code=500, detail=f"Error de base de datos al actualizar ticket: {e}")
     finally:
         if conn:
             conn.close()
 
+async def update_ticket_status_in_db(ticket_id: str, status: str, resolution_details: Optional[str] = None, assigned_to: Optional[str] = None) -> Optional[models.TicketResponse]:
+    """Actualiza el estado, detalles de resolución y/o asignado de un ticket."""
+    return await run_in_db_executor(_update_ticket_status_in_db, ticket_id, status, resolution_details, assigned_to)
 
-async def update_faq_in_db(faq_id: str, faq_update_data: models.FAQCreate) -> Optional[models.FAQResponse]:
+
+@instrumented_query
+def _update_faq_in_db(faq_id: str, faq_update_data: models.FAQCreate) -> Optional[models.FAQResponse]:
     """Actualiza una FAQ existente."""
     keywords_str = ",".join(faq_update_data.keywords) if faq_update_data.keywords else None
     sql = """
@@ -325,21 +752,32 @@ async def update_faq_in_db(faq_id: str, faq_update_data: models.FAQCreate) -> Op
         conn = get_db_connection()
         with conn.cursor() as cursor:
             rows_affected = cursor.execute(sql, args)
-        conn.commit()
+            if rows_affected > 0:
+                _replace_faq_keywords(cursor, faq_id, faq_update_data.keywords)
+            conn.commit()
+            updated_faq = _fetch_faq(cursor, faq_id) if rows_affected > 0 else None
         if rows_affected > 0:
-            print(f"CRUD: FAQ {faq_id} actualizada en BD.")
-            return await get_faq_from_db_by_id(faq_id)
+            if updated_faq:
+                _index_faq_for_search(updated_faq)
+            _invalidate_faq_cache(faq_id)
+            logger.info("FAQ %s actualizada en BD.", faq_id)
+            return updated_faq
         else:
-            print(f"CRUD: FAQ {faq_id} no encontrada para actualizar.")
+            logger.info("FAQ %s no encontrada para actualizar.", faq_id)
             return None
     except pymysql.MySQLError as e:
-        print(f"CRUD Error (MySQL) al actualizar FAQ {faq_id}: {e}")
+        logger.error("Error (MySQL) al actualizar FAQ %s: %s", faq_id, e)
         raise HTTPException(status_code=500, detail=f"Error de base de datos al actualizar FAQ: {e}")
     finally:
         if conn:
             conn.close()
 
-async def delete_faq_from_db(faq_id: str) -> bool:
+async def update_faq_in_db(faq_id: str, faq_update_data: models.FAQCreate) -> Optional[models.FAQResponse]:
+    """Actualiza una FAQ existente."""
+    return await run_in_db_executor(_update_faq_in_db, faq_id, faq_update_data)
+
+@instrumented_query
+def _delete_faq_from_db(faq_id: str) -> bool:
     """Elimina una FAQ de la base de datos."""
     sql = "DELETE FROM faqs WHERE id = %s"
     conn = None
@@ -347,18 +785,27 @@ async def delete_faq_from_db(faq_id: str) -> bool:
         conn = get_db_connection()
         with conn.cursor() as cursor:
             rows_affected = cursor.execute(sql, (faq_id,))
+            if rows_affected > 0:
+                # Marca de borrado para que los clientes de /faqs/changes eliminen su copia
+                cursor.execute("REPLACE INTO faq_deletions (faq_id) VALUES (%s)", (faq_id,))
         conn.commit()
         if rows_affected > 0:
-            print(f"CRUD: FAQ {faq_id} eliminada de la BD.")
+            faq_index.remove_faq(faq_id)
+            _invalidate_faq_cache(faq_id)
+            logger.info("FAQ %s eliminada de la BD.", faq_id)
             return True
-        print(f"CRUD: FAQ {faq_id} no encontrada para eliminar.")
+        logger.info("FAQ %s no encontrada para eliminar.", faq_id)
         return False
     except pymysql.MySQLError as e:
-        print(f"CRUD Error (MySQL) al eliminar FAQ {faq_id}: {e}")
+        logger.error("Error (MySQL) al eliminar FAQ %s: %s", faq_id, e)
         raise HTTPException(status_code=500, detail=f"Error de base de datos al eliminar FAQ: {e}")
     finally:
         if conn:
             conn.close()
 
+async def delete_faq_from_db(faq_id: str) -> bool:
+    """Elimina una FAQ de la base de datos."""
+    return await run_in_db_executor(_delete_faq_from_db, faq_id)
+
 # Necesario para que el endpoint de la API pueda usarlo
 from fastapi import HTTPException
@@ -1,14 +1,20 @@
 # main.py (API para Chatbot CUL)
 
-from fastapi import FastAPI, HTTPException, Query, Body
+from fastapi import FastAPI, HTTPException, Query, Body, Request, Response
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import JSONResponse, PlainTextResponse, StreamingResponse
+from contextlib import asynccontextmanager
 from typing import List, Optional, Dict, Any
+import math
 import uuid
 from datetime import datetime, timezone
 
 # Importar modelos y funciones crud (simuladas)
 from crud import crud
 from models import models
+from core import database, metrics
+from core.logging_config import get_logger, setup_logging
+from search.faq_index import FAQ_SEARCH_DEFAULT_TOP_K
 
 # --- Metadata para la documentación de la API (Swagger UI / ReDoc) ---
 API_TITLE = "API para Chatbot CUL"
@@ -18,10 +24,33 @@ API para gestionar la creación de tickets de soporte y la consulta de Preguntas
 para el chatbot de la Corporación Universitaria Latinoamericana (CUL).
 """
 
+# Logging JSON no bloqueante (LOG_LEVEL, LOG_FORMAT, LOG_SAMPLE_RATES; ver core/logging_config.py)
+setup_logging()
+logger = get_logger("api")
+
+# --- Paginación del listado de tickets ---
+TICKETS_PAGE_DEFAULT_LIMIT = 100 # Tamaño de página por defecto para GET /tickets/
+TICKETS_PAGE_MAX_LIMIT = 1000
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    """Abre el pool de conexiones a MySQL al iniciar la API y lo cierra al apagarla."""
+    database.init_db_pool()
+    try:
+        await crud.rebuild_faq_search_index()
+    except Exception as e:
+        # La API puede arrancar sin BD; el índice se reconstruye en la primera búsqueda.
+        logger.warning("No se pudo construir el índice de búsqueda de FAQs al iniciar: %s", e)
+    try:
+        yield
+    finally:
+        database.close_db_pool()
+
 app = FastAPI(
     title=API_TITLE,
     version=API_VERSION,
     description=API_DESCRIPTION,
+    lifespan=lifespan,
     # openapi_url="/api/cul/v1/openapi.json", # Estructura de URL sugerida
     # docs_url="/api/cul/v1/docs",
     # redoc_url="/api/cul/v1/redoc"
@@ -42,8 +71,66 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["GET", "POST", "PUT", "DELETE"], # Métodos HTTP permitidos
     allow_headers=["*"], # Cabeceras permitidas
+    expose_headers=["X-Next-Cursor", "ETag"], # Cursor de paginación y ETag de las FAQs
 )
 
+# --- Métricas (latencia por ruta, peticiones en curso y códigos de estado; ver core/metrics.py) ---
+app.add_middleware(metrics.MetricsMiddleware)
+
+# --- Pool de conexiones agotado ---
+@app.exception_handler(database.PoolTimeoutError)
+async def pool_timeout_handler(request: Request, exc: database.PoolTimeoutError):
+    """
+    Sin conexiones libres la API está saturada, no rota: 503 con Retry-After para que el cliente
+    (el bot) reintente más tarde en lugar de tratarlo como un error interno.
+    """
+    logger.warning("Pool de conexiones agotado en %s %s: %s", request.method, request.url.path, exc,
+                   extra={"db_pool": database.get_pool_stats()})
+    return JSONResponse(status_code=503, content={"detail": "El servicio está saturado; inténtalo de nuevo en unos segundos."},
+                        headers={"Retry-After": str(max(1, math.ceil(database.DB_POOL_TIMEOUT)))})
+
+# --- Peticiones condicionales (ETag / If-None-Match) ---
+def _etag_matches(request: Request, etag: str) -> bool:
+    """True si alguna de las ETags de If-None-Match coincide (comparación débil, RFC 9110)."""
+    header = request.headers.get("if-none-match")
+    if not header:
+        return False
+    if header.strip() == "*":
+        return True
+    return any(tag.strip().removeprefix("W/") == etag for tag in header.split(","))
+
+def _json_response(body: bytes, headers: Optional[Dict[str, str]] = None) -> Response:
+    """
+    Respuesta con JSON ya serializado (por pydantic-core). Al devolver un `Response`, FastAPI no
+    vuelve a validar los modelos contra `response_model` ni los codifica otra vez con el encoder
+    estándar; `response_model` se mantiene en los decoradores sólo para la documentación OpenAPI.
+    """
+    return Response(content=body, media_type="application/json", headers=headers)
+
+def _serialized_faqs_response(request: Request, result: crud.SerializedFAQs) -> Response:
+    """Devuelve un 304 si el cliente ya tiene esta versión; si no, el JSON cacheado con su ETag."""
+    headers = {"ETag": result.etag, "Cache-Control": "no-cache"} # no-cache: el cliente puede guardarla pero debe revalidar
+    if _etag_matches(request, result.etag):
+        return Response(status_code=304, headers=headers)
+    return _json_response(result.body, headers)
+
+class _ClosingStreamingResponse(StreamingResponse):
+    """
+    StreamingResponse que cierra `closing` (p. ej. un `crud.TicketStream`) al terminar, pase lo que pase:
+    si el cliente se desconecta antes de que empiece el cuerpo, el generador nunca arranca y su
+    `finally` no se ejecuta, y Starlette tampoco lanza las background tasks en ese caso.
+    """
+
+    def __init__(self, content, closing, **kwargs):
+        super().__init__(content, **kwargs)
+        self._closing = closing
+
+    async def __call__(self, scope, receive, send) -> None:
+        try:
+            await super().__call__(scope, receive, send)
+        finally:
+            await self._closing.aclose()
+
 # --- Endpoints de la API ---
 
 @app.get("/api/cul/v1/", response_model=models.HealthCheck, tags=["General"])
@@ -53,6 +140,33 @@ async def root():
     """
     return {"status": "OK", "message": f"{API_TITLE} v{API_VERSION} está operativa."}
 
+@app.get("/api/cul/v1/cache/faqs", response_model=List[models.CacheStats], tags=["General"])
+async def faq_cache_stats():
+    """
+    Aciertos, fallos, expulsiones e invalidaciones de la caché de FAQs de este worker.
+    Útil para ajustar FAQ_CACHE_MAX_ENTRIES y FAQ_CACHE_TTL.
+    """
+    return crud.get_faq_cache_stats()
+
+@app.get("/api/cul/v1/db/pool", response_model=models.PoolStats, tags=["General"])
+async def db_pool_stats():
+    """
+    Estadísticas del pool de conexiones a la base de datos (en uso, libres, tiempos de espera).
+    Útil para dimensionar DB_POOL_SIZE y DB_POOL_MAX_OVERFLOW.
+    """
+    stats = database.get_pool_stats()
+    if not stats:
+        raise HTTPException(status_code=503, detail="El pool de conexiones no está inicializado.")
+    return stats
+
+@app.get("/api/cul/v1/metrics", response_class=PlainTextResponse, tags=["General"])
+async def prometheus_metrics():
+    """
+    Métricas de este worker en formato de texto de Prometheus: latencia y códigos de estado
+    por ruta, duración y filas de cada operación CRUD, y tiempos de espera del pool de conexiones.
+    """
+    return PlainTextResponse(metrics.render_metrics(), media_type=metrics.CONTENT_TYPE)
+
 # --- Endpoints para Tickets ---
 @app.post("/api/cul/v1/tickets/",
             response_model=models.TicketResponse,
@@ -76,9 +190,10 @@ async def create_new_ticket(ticket_data: models.TicketCreate = Body(...)):
         return created_ticket
     except ValueError as e: # Ejemplo de manejo de error de validación
         raise HTTPException(status_code=400, detail=str(e))
+    except database.PoolTimeoutError:
+        raise
     except Exception as e:
-        # En un entorno de producción, loguear el error `e`
-        print(f"Error inesperado al crear ticket: {e}") # Log a consola para debug
+        logger.exception("Error inesperado al crear ticket: %s", e)
         raise HTTPException(status_code=500, detail="Error interno del servidor al procesar el ticket.")
 
 @app.get("/api/cul/v1/tickets/{ticket_id}",
@@ -96,16 +211,23 @@ async def get_ticket_by_id(ticket_id: str):
 
 @app.get("/api/cul/v1/tickets/",
             response_model=List[models.TicketResponse],
-            summary="Listar todos los tickets (con filtros opcionales)",
+            summary="Listar tickets paginados (con filtros opcionales)",
             tags=["Tickets"])
 async def list_all_tickets(
     status: Optional[str] = Query(None, description="Filtrar tickets por estado (ej: 'Abierto', 'Cerrado')"),
     category: Optional[str] = Query(None, description="Filtrar tickets por categoría"),
-    user_id_telegram: Optional[str] = Query(None, description="Filtrar tickets por ID de usuario de Telegram")
+    user_id_telegram: Optional[str] = Query(None, description="Filtrar tickets por ID de usuario de Telegram"),
+    limit: int = Query(TICKETS_PAGE_DEFAULT_LIMIT, ge=1, le=TICKETS_PAGE_MAX_LIMIT, description="Número máximo de tickets por página"),
+    cursor: Optional[str] = Query(None, description="Cursor de la página siguiente (cabecera X-Next-Cursor de la respuesta anterior)"),
+    stream: bool = Query(False, description="Si es true, devuelve TODOS los tickets como NDJSON (una línea JSON por ticket) leyendo con un cursor del servidor")
 ):
     """
-    Obtiene una lista de todos los tickets, con posibilidad de aplicar filtros.
-    (Simulación: los filtros no están completamente implementados en el CRUD simulado)
+    Obtiene los tickets más recientes primero, con posibilidad de aplicar filtros.
+
+    - Paginación por cursor: si hay más resultados, la respuesta incluye la cabecera
+      **X-Next-Cursor**; envíala como `cursor` para obtener la página siguiente.
+    - Con **stream=true** se ignoran `limit` y `cursor` y se emiten todos los tickets en
+      formato NDJSON (`application/x-ndjson`) con memoria constante en el servidor.
     """
     filters_dict = {}
     if status:
@@ -114,9 +236,22 @@ async def list_all_tickets(
         filters_dict["category"] = category
     if user_id_telegram:
         filters_dict["user_id_telegram"] = user_id_telegram
-        
-    tickets = await crud.get_all_tickets_from_db(filters=filters_dict)
-    return tickets
+
+    if stream:
+        rows = await crud.stream_tickets_from_db(filters=filters_dict)
+
+        async def ndjson_lines():
+            async for row in rows:
+                yield models.TicketResponse(**row).model_dump_json() + "\n"
+
+        return _ClosingStreamingResponse(ndjson_lines(), closing=rows, media_type="application/x-ndjson")
+
+    try:
+        tickets, next_cursor = await crud.get_tickets_page_from_db(filters=filters_dict, limit=limit, cursor=cursor)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    headers = {"X-Next-Cursor": next_cursor} if next_cursor else None
+    return _json_response(models.TicketListAdapter.dump_json(tickets), headers)
 
 # --- Endpoints para FAQs ---
 @app.get("/api/cul/v1/faqs/",
@@ -124,19 +259,48 @@ async def list_all_tickets(
            summary="Buscar o listar FAQs",
            tags=["FAQs"])
 async def search_faqs(
+    request: Request,
     query: Optional[str] = Query(None, description="Término de búsqueda para preguntas o respuestas de FAQs."),
-    category: Optional[str] = Query(None, description="Filtrar FAQs por categoría (ej: 'Matrículas', 'Soporte Técnico').")
+    category: Optional[str] = Query(None, description="Filtrar FAQs por categoría (ej: 'Matrículas', 'Soporte Técnico')."),
+    keyword: Optional[str] = Query(None, description="Palabra clave exacta (sin distinguir mayúsculas ni tildes, ej: 'pse')."),
+    limit: int = Query(FAQ_SEARCH_DEFAULT_TOP_K, ge=1, le=100, description="Máximo de resultados cuando se busca con `query`.")
 ):
     """
     Busca FAQs que coincidan con el término de búsqueda y/o categoría.
-    Si no se proporcionan parámetros, devuelve todas las FAQs (limitado en simulación).
-    """
-    faqs = await crud.get_faqs_from_db(query_term=query, category_filter=category)
-    if not faqs and (query or category): # Si hubo búsqueda pero no resultados
-        # Podrías devolver 200 con lista vacía o 404 si es mandatorio encontrar algo.
-        # Devolver 200 con lista vacía es común para búsquedas.
-        return []
-    return faqs
+    Con `query` devuelve las FAQs más relevantes primero (BM25, sin distinguir tildes),
+    cada una con su `relevance_score`. Con `keyword` sólo se devuelven las FAQs que tienen
+    esa palabra clave. Sin parámetros devuelve todas las FAQs.
+    La respuesta incluye una ETag: si se envía en `If-None-Match` y no hubo cambios se devuelve 304.
+    """
+    # Una búsqueda sin resultados devuelve 200 con lista vacía (lo habitual en búsquedas).
+    result = await crud.get_faqs_serialized(query_term=query, category_filter=category, top_k=limit, keyword=keyword)
+    return _serialized_faqs_response(request, result)
+
+@app.get("/api/cul/v1/faqs/changes",
+           response_model=models.FAQChanges,
+           summary="Cambios de FAQs desde una marca de agua (sincronización incremental)",
+           tags=["FAQs"])
+async def get_faq_changes(
+    since: Optional[datetime] = Query(None, description="Marca de agua (`watermark`) de la sincronización anterior. Sin ella se devuelven todas las FAQs.")
+):
+    """
+    Devuelve las FAQs creadas o modificadas y los IDs de las eliminadas desde `since`.
+    Pensado para réplicas locales (el chatbot): guardan `watermark` y lo envían en la siguiente llamada.
+    """
+    return await crud.get_faq_changes_from_db(since)
+
+@app.get("/api/cul/v1/faqs/{faq_id}",
+           response_model=models.FAQResponse,
+           summary="Obtener una FAQ por su ID",
+           tags=["FAQs"])
+async def get_faq_by_id(faq_id: str, request: Request):
+    """
+    Obtiene una Pregunta Frecuente por su ID. Admite `If-None-Match` (304 si no cambió).
+    """
+    result = await crud.get_faq_serialized(faq_id)
+    if not result:
+        raise HTTPException(status_code=404, detail=f"FAQ con ID '{faq_id}' no encontrada.")
+    return _serialized_faqs_response(request, result)
 
 @app.post("/api/cul/v1/faqs/",
             response_model=models.FAQResponse,
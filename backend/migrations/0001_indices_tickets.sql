@@ -0,0 +1,17 @@
+-- 0001: Índices secundarios para el listado de tickets.
+-- Cada filtro de get_all_tickets_from_db / get_tickets_page_from_db va seguido del orden
+-- (created_at DESC, id DESC) que usa la paginación por cursor, así MySQL resuelve el filtro,
+-- el orden y el LIMIT con el mismo índice, sin recorrer la tabla ni hacer filesort.
+
+-- Listado sin filtros y páginas siguientes (keyset)
+CREATE INDEX idx_tickets_created ON tickets (created_at, id);
+
+-- Filtros individuales expuestos por la API
+CREATE INDEX idx_tickets_status_created ON tickets (status, created_at, id);
+CREATE INDEX idx_tickets_category_created ON tickets (category, created_at, id);
+CREATE INDEX idx_tickets_user_created ON tickets (user_id_telegram, created_at, id);
+CREATE INDEX idx_tickets_priority_created ON tickets (priority, created_at, id);
+CREATE INDEX idx_tickets_source_created ON tickets (source, created_at, id);
+
+-- Combinación habitual en el panel de soporte: estado + categoría
+CREATE INDEX idx_tickets_status_category_created ON tickets (status, category, created_at, id);
@@ -0,0 +1,7 @@
+-- 0002: Índices secundarios para el listado de FAQs.
+-- get_faqs_from_db ordena por created_at DESC. El filtro de categoría usa LIKE '%...%' y no puede
+-- aprovechar un índice B-tree, pero un índice (category, created_at) sí cubre las búsquedas exactas
+-- por categoría que hagan los administradores.
+
+CREATE INDEX idx_faqs_created ON faqs (created_at);
+CREATE INDEX idx_faqs_category_created ON faqs (category, created_at);
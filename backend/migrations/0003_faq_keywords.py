@@ -0,0 +1,41 @@
+# 0003: Palabras clave de FAQs en su propia tabla indexada.
+#
+# Hasta ahora las keywords se guardaban en `faqs.keywords` como un string separado por comas
+# que había que volver a partir en cada lectura. Esta migración crea `faq_keywords`
+# (una fila por FAQ y palabra clave normalizada) y la rellena desde la columna existente.
+# La columna `faqs.keywords` se conserva (el CRUD la sigue escribiendo) por compatibilidad
+# con versiones anteriores de la API; las lecturas ya sólo usan la tabla nueva.
+
+from core.logging_config import get_logger
+from search.text import unique_keywords
+
+CREATE_FAQ_KEYWORDS_SQL = """
+CREATE TABLE IF NOT EXISTS faq_keywords (
+    faq_id VARCHAR(50) NOT NULL COMMENT 'FAQ a la que pertenece la palabra clave',
+    keyword_norm VARCHAR(100) NOT NULL COMMENT 'Palabra clave normalizada (minúsculas, sin tildes)',
+    keyword VARCHAR(100) NOT NULL COMMENT 'Palabra clave tal como se escribió',
+    position SMALLINT UNSIGNED NOT NULL DEFAULT 0 COMMENT 'Orden dentro de la FAQ',
+    PRIMARY KEY (faq_id, keyword_norm),
+    KEY idx_faq_keywords_keyword (keyword_norm, faq_id),
+    CONSTRAINT fk_faq_keywords_faq FOREIGN KEY (faq_id) REFERENCES faqs (id) ON DELETE CASCADE
+) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COLLATE=utf8mb4_general_ci COMMENT='Palabras clave de las FAQs'
+"""
+
+
+def keyword_rows(faq_id, keywords):
+    """Filas (faq_id, keyword_norm, keyword, position) con la misma normalización que usa el CRUD."""
+    return [(faq_id, normalized, keyword, position) for position, (normalized, keyword) in enumerate(unique_keywords(keywords))]
+
+
+def upgrade(cursor):
+    cursor.execute(CREATE_FAQ_KEYWORDS_SQL)
+    cursor.execute("SELECT id, keywords FROM faqs WHERE keywords IS NOT NULL AND keywords <> ''")
+    backfill = []
+    for faq in cursor.fetchall():
+        backfill.extend(keyword_rows(faq["id"], faq["keywords"].split(",")))
+    if backfill:
+        cursor.executemany(
+            "INSERT IGNORE INTO faq_keywords (faq_id, keyword_norm, keyword, position) VALUES (%s, %s, %s, %s)",
+            backfill
+        )
+    get_logger("migrations").info("%d palabras clave copiadas a faq_keywords.", len(backfill))
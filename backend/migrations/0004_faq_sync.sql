@@ -0,0 +1,12 @@
+-- 0004: Soporte para la sincronización incremental de FAQs (GET /faqs/changes).
+-- Los clientes (la réplica local del chatbot) piden las FAQs con updated_at >= su marca de agua;
+-- las eliminaciones se registran en faq_deletions para que también puedan propagarse.
+
+CREATE INDEX idx_faqs_updated ON faqs (updated_at, id);
+
+CREATE TABLE IF NOT EXISTS faq_deletions (
+    faq_id VARCHAR(50) NOT NULL COMMENT 'ID de la FAQ eliminada',
+    deleted_at TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP COMMENT 'Fecha y hora de la eliminación',
+    PRIMARY KEY (faq_id),
+    KEY idx_faq_deletions_deleted (deleted_at)
+) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COLLATE=utf8mb4_general_ci COMMENT='Registro de FAQs eliminadas para la sincronización incremental';
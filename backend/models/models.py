@@ -1,6 +1,6 @@
 # models.py (API para Chatbot CUL)
 
-from pydantic import BaseModel, Field, EmailStr
+from pydantic import BaseModel, Field, EmailStr, TypeAdapter
 from typing import Optional, List
 from datetime import datetime, timezone
 import uuid
@@ -24,6 +24,9 @@ class TicketCreate(TicketBase):
 class TicketResponse(TicketBase):
     """Modelo para la respuesta al obtener o crear un ticket."""
     id: str = Field(..., description="ID único del ticket generado por el sistema")
+    # El email ya se validó como EmailStr al crear el ticket (TicketCreate); volver a pasarlo por
+    # email_validator en cada lectura era la mayor parte del coste de listar tickets.
+    user_email: Optional[str] = Field(None, description="Email de contacto del usuario", json_schema_extra={"format": "email"})
     status: str = Field("Abierto", description="Estado actual del ticket (ej: Abierto, En Proceso, Cerrado)")
     created_at: datetime = Field(..., description="Fecha y hora de creación del ticket (UTC)")
     updated_at: Optional[datetime] = Field(None, description="Fecha y hora de la última actualización (UTC)")
@@ -51,13 +54,54 @@ class FAQResponse(FAQBase):
     id: str = Field(..., description="ID único de la FAQ")
     created_at: datetime = Field(..., description="Fecha y hora de creación de la FAQ (UTC)")
     updated_at: Optional[datetime] = Field(None, description="Fecha y hora de la última actualización (UTC)")
-    # relevance_score: Optional[float] = Field(None, description="Puntuación de relevancia si es resultado de una búsqueda") # Ejemplo
+    relevance_score: Optional[float] = Field(None, description="Puntuación de relevancia (BM25) si es resultado de una búsqueda")
 
     class Config:
         orm_mode = True
         # from_attributes = True
 
+class FAQChanges(BaseModel):
+    """Respuesta de la sincronización incremental de FAQs."""
+    faqs: List[FAQResponse] = Field(..., description="FAQs creadas o modificadas desde la marca de agua")
+    deleted_ids: List[str] = Field(..., description="IDs de FAQs eliminadas desde la marca de agua")
+    watermark: datetime = Field(..., description="Valor a enviar como `since` en la siguiente sincronización")
+    full: bool = Field(..., description="True si es una copia completa (sin `since`): el cliente debe descartar lo que tenía")
+
 # --- Modelo para Health Check ---
 class HealthCheck(BaseModel):
     status: str
     message: str
+
+# --- Modelo para estadísticas del pool de conexiones ---
+class PoolStats(BaseModel):
+    size: int = Field(..., description="Conexiones que se mantienen abiertas en reposo")
+    max_overflow: int = Field(..., description="Conexiones extra permitidas en picos de carga")
+    open: int = Field(..., description="Conexiones abiertas actualmente (libres + en uso)")
+    in_use: int = Field(..., description="Conexiones prestadas a una petición")
+    idle: int = Field(..., description="Conexiones libres en el pool")
+    waiting: int = Field(..., description="Peticiones esperando una conexión libre")
+    acquisitions: int = Field(..., description="Total de conexiones entregadas")
+    connects: int = Field(..., description="Total de conexiones TCP abiertas contra MySQL")
+    recycled: int = Field(..., description="Conexiones descartadas por edad o por fallar el ping")
+    timeouts: int = Field(..., description="Peticiones que agotaron DB_POOL_TIMEOUT")
+    wait_time_avg_ms: float = Field(..., description="Espera media para obtener una conexión (ms)")
+    wait_time_max_ms: float = Field(..., description="Espera máxima para obtener una conexión (ms)")
+    wait_time_total_ms: float = Field(..., description="Espera acumulada para obtener conexiones (ms)")
+
+class CacheStats(BaseModel):
+    name: str = Field(..., description="Nombre de la caché")
+    entries: int = Field(..., description="Entradas guardadas actualmente")
+    max_entries: int = Field(..., description="Máximo de entradas antes de expulsar la menos usada (LRU)")
+    ttl_seconds: float = Field(..., description="Segundos que vive cada entrada")
+    hits: int = Field(..., description="Lecturas servidas desde la caché")
+    misses: int = Field(..., description="Lecturas que tuvieron que ir a la base de datos")
+    hit_ratio: float = Field(..., description="hits / (hits + misses)")
+    evictions: int = Field(..., description="Entradas expulsadas por falta de espacio")
+    expirations: int = Field(..., description="Entradas descartadas por superar el TTL")
+    invalidations: int = Field(..., description="Entradas eliminadas por escrituras en la BD")
+
+# --- Adaptadores de listas ---
+# Validan o serializan una lista completa en una sola llamada a pydantic-core (Rust),
+# en lugar de recorrerla modelo a modelo desde Python.
+TicketListAdapter = TypeAdapter(List[TicketResponse])
+FAQListAdapter = TypeAdapter(List[FAQResponse])
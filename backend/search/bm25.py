@@ -0,0 +1,102 @@
+# backend/search/bm25.py
+# Índice invertido en memoria con ranking BM25, actualizable documento a documento.
+
+import math
+import threading
+from collections import Counter
+from typing import Dict, List, Tuple, Iterable, Optional
+
+from search.text import analyze
+
+
+class BM25Index:
+    """
+    Índice invertido término -> {doc_id: frecuencia} con puntuación BM25.
+
+    Cada documento se compone de campos con peso (p. ej. la pregunta pesa más que la respuesta);
+    el peso se aplica multiplicando la frecuencia de los términos de ese campo.
+    Es seguro para hilos: las funciones CRUD lo actualizan desde el executor de la BD.
+    """
+
+    def __init__(self, k1: float = 1.5, b: float = 0.75):
+        self.k1 = k1
+        self.b = b
+        self._postings: Dict[str, Dict[str, int]] = {}
+        self._doc_terms: Dict[str, Counter] = {} # Para poder retirar un documento del índice
+        self._doc_lengths: Dict[str, int] = {}
+        self._total_length = 0
+        self._lock = threading.RLock()
+
+    def __len__(self) -> int:
+        return len(self._doc_lengths)
+
+    def __contains__(self, doc_id: str) -> bool:
+        return doc_id in self._doc_lengths
+
+    @staticmethod
+    def _weighted_terms(fields: Iterable[Tuple[Optional[str], int]]) -> Counter:
+        terms = Counter()
+        for text, weight in fields:
+            for token in analyze(text or ""):
+                terms[token] += weight
+        return terms
+
+    def upsert(self, doc_id: str, fields: Iterable[Tuple[Optional[str], int]]) -> None:
+        """Añade o reemplaza un documento. `fields` es una secuencia de (texto, peso)."""
+        terms = self._weighted_terms(fields)
+        with self._lock:
+            self._remove_locked(doc_id)
+            for term, freq in terms.items():
+                self._postings.setdefault(term, {})[doc_id] = freq
+            length = sum(terms.values())
+            self._doc_terms[doc_id] = terms
+            self._doc_lengths[doc_id] = length
+            self._total_length += length
+
+    def remove(self, doc_id: str) -> bool:
+        """Retira un documento del índice. Devuelve False si no estaba."""
+        with self._lock:
+            return self._remove_locked(doc_id)
+
+    def _remove_locked(self, doc_id: str) -> bool:
+        terms = self._doc_terms.pop(doc_id, None)
+        if terms is None:
+            return False
+        for term in terms:
+            postings = self._postings.get(term)
+            if postings is not None:
+                postings.pop(doc_id, None)
+                if not postings:
+                    del self._postings[term]
+        self._total_length -= self._doc_lengths.pop(doc_id)
+        return True
+
+    def clear(self) -> None:
+        with self._lock:
+            self._postings.clear()
+            self._doc_terms.clear()
+            self._doc_lengths.clear()
+            self._total_length = 0
+
+    def search(self, query: str, top_k: int = 10) -> List[Tuple[str, float]]:
+        """Devuelve hasta `top_k` pares (doc_id, puntuación) ordenados por relevancia BM25."""
+        query_terms = set(analyze(query))
+        if not query_terms:
+            return []
+        with self._lock:
+            n_docs = len(self._doc_lengths)
+            if n_docs == 0:
+                return []
+            avg_length = self._total_length / n_docs
+            scores: Dict[str, float] = {}
+            for term in query_terms:
+                postings = self._postings.get(term)
+                if not postings:
+                    continue
+                df = len(postings)
+                idf = math.log(1 + (n_docs - df + 0.5) / (df + 0.5))
+                for doc_id, tf in postings.items():
+                    norm = self.k1 * (1 - self.b + self.b * self._doc_lengths[doc_id] / avg_length)
+                    scores[doc_id] = scores.get(doc_id, 0.0) + idf * tf * (self.k1 + 1) / (tf + norm)
+        ranked = sorted(scores.items(), key=lambda item: item[1], reverse=True)
+        return ranked[:top_k]
@@ -0,0 +1,157 @@
+# backend/search/faq_index.py
+# Índice de búsqueda BM25 sobre la tabla `faqs`, compartido por todo el proceso de la API.
+#
+# El CRUD lo reconstruye completo desde la BD al arrancar (o cuando caduca) y lo actualiza
+# de forma incremental tras cada create/update/delete de FAQs. Como cada worker de uvicorn
+# tiene su propia copia, el TTL garantiza que los cambios hechos por otros workers
+# se vean como mucho FAQ_SEARCH_INDEX_TTL segundos después.
+
+import os
+import threading
+import time
+from typing import Dict, List, Optional, Set, Tuple, Iterable, Any
+
+from search.bm25 import BM25Index
+from search.ngram_matcher import CharNgramMatcher
+from search.text import fold_accents
+
+FAQ_SEARCH_INDEX_TTL = int(os.getenv("FAQ_SEARCH_INDEX_TTL", 300)) # Segundos; <= 0 desactiva la reconstrucción periódica
+FAQ_SEARCH_DEFAULT_TOP_K = int(os.getenv("FAQ_SEARCH_DEFAULT_TOP_K", 10))
+# Similitud coseno mínima (0-1) para aceptar un resultado del emparejamiento difuso por n-gramas.
+FAQ_FUZZY_MIN_SCORE = float(os.getenv("FAQ_FUZZY_MIN_SCORE", 0.3))
+
+# Peso de cada campo en la puntuación: la pregunta y las palabras clave describen mejor la FAQ que la respuesta.
+FAQ_FIELD_WEIGHTS = {"question": 3, "keywords": 3, "category": 1, "answer": 1}
+
+_FAQData = Tuple[str, str, Optional[str], List[str]] # (question, answer, category, keywords)
+
+
+class _SearchState:
+    __slots__ = ("index", "fuzzy", "categories")
+
+    def __init__(self):
+        self.index = BM25Index()
+        self.fuzzy = CharNgramMatcher()
+        self.categories: Dict[str, str] = {}
+
+
+# Estado de búsqueda: índice BM25, matcher difuso (pregunta + palabras clave, para consultas con
+# errores de escritura) y faq_id -> categoría plegada (para filtrar sin ir a la BD). Una reconstrucción
+# arma un estado nuevo aparte y lo publica con una sola asignación; las búsquedas toman una referencia
+# local al estado vigente, así que nunca ven un índice vacío o a medio llenar.
+_state = _SearchState()
+_built_at: Optional[float] = None
+_state_lock = threading.Lock() # Protege la publicación de _state y los cambios pendientes
+_pending: Optional[List[Tuple[str, Optional[_FAQData]]]] = None # Cambios llegados durante una reconstrucción
+
+
+def _faq_fields(question: str, answer: str, category: Optional[str], keywords: Iterable[str]) -> List[Tuple[str, int]]:
+    return [
+        (question, FAQ_FIELD_WEIGHTS["question"]),
+        (" ".join(keywords or []), FAQ_FIELD_WEIGHTS["keywords"]),
+        (category or "", FAQ_FIELD_WEIGHTS["category"]),
+        (answer, FAQ_FIELD_WEIGHTS["answer"]),
+    ]
+
+
+def _apply(state: _SearchState, faq_id: str, faq: Optional[_FAQData]) -> None:
+    """Añade/actualiza (`faq`) o retira (`faq` None) una FAQ de `state`."""
+    if faq is None:
+        state.index.remove(faq_id)
+        state.fuzzy.remove(faq_id)
+        state.categories.pop(faq_id, None)
+        return
+    question, answer, category, keywords = faq
+    state.index.upsert(faq_id, _faq_fields(question, answer, category, keywords))
+    state.fuzzy.upsert(faq_id, [question, " ".join(keywords)])
+    state.categories[faq_id] = fold_accents(category or "")
+
+
+def _apply_change(faq_id: str, faq: Optional[_FAQData]) -> None:
+    with _state_lock:
+        _apply(_state, faq_id, faq)
+        if _pending is not None: # Se repite sobre el estado nuevo antes de publicarlo
+            _pending.append((faq_id, faq))
+
+
+def index_faq(faq_id: str, question: str, answer: str, category: Optional[str], keywords: Iterable[str]) -> None:
+    """Añade o actualiza una FAQ en el índice."""
+    _apply_change(faq_id, (question, answer, category, list(keywords or [])))
+
+
+def remove_faq(faq_id: str) -> None:
+    """Retira una FAQ del índice."""
+    _apply_change(faq_id, None)
+
+
+def rebuild_faq_index(faqs: Iterable[Dict[str, Any]]) -> int:
+    """
+    Reconstruye el índice completo a partir de filas con id, question, answer, category y keywords (lista).
+    Devuelve el número de FAQs indexadas.
+
+    El índice nuevo se construye aparte mientras las búsquedas siguen usando el anterior. Los cambios
+    incrementales que lleguen desde que empieza a recorrerse `faqs` (puede ser un generador que lee
+    la BD) se repiten sobre el nuevo antes de publicarlo. Las reconstrucciones no deben solaparse:
+    quien llama se encarga de serializarlas.
+    """
+    global _state, _built_at, _pending
+    with _state_lock:
+        _pending = []
+    try:
+        state = _SearchState()
+        for faq in faqs:
+            _apply(state, faq["id"], (faq["question"], faq["answer"], faq.get("category"), list(faq.get("keywords") or [])))
+        state.fuzzy.build() # Así la primera búsqueda no ensambla la matriz de n-gramas
+        with _state_lock:
+            for faq_id, faq in _pending:
+                _apply(state, faq_id, faq)
+            _state = state
+            _built_at = time.monotonic()
+            return len(state.index)
+    finally:
+        with _state_lock:
+            _pending = None
+
+
+def is_built() -> bool:
+    """True si el índice se construyó al menos una vez."""
+    return _built_at is not None
+
+
+def needs_rebuild() -> bool:
+    """True si el índice nunca se construyó o superó su TTL."""
+    if _built_at is None:
+        return True
+    return FAQ_SEARCH_INDEX_TTL > 0 and time.monotonic() - _built_at > FAQ_SEARCH_INDEX_TTL
+
+
+def _filter_ranked(state: _SearchState, ranked: List[Tuple[str, float]], category_filter: Optional[str],
+                   allowed_ids: Optional[Set[str]]) -> List[Tuple[str, float]]:
+    if allowed_ids is not None:
+        ranked = [(faq_id, score) for faq_id, score in ranked if faq_id in allowed_ids]
+    if not category_filter:
+        return ranked
+    folded_filter = fold_accents(category_filter)
+    return [(faq_id, score) for faq_id, score in ranked if folded_filter in state.categories.get(faq_id, "")]
+
+
+def search_faqs(query: str, category_filter: Optional[str] = None, top_k: int = FAQ_SEARCH_DEFAULT_TOP_K,
+                allowed_ids: Optional[Set[str]] = None) -> List[Tuple[str, float]]:
+    """
+    Devuelve hasta `top_k` pares (faq_id, puntuación) para la consulta.
+
+    Primero se usa BM25 sobre palabras; si ninguna palabra coincide (errores de escritura como
+    "inscricion" o "horaio") se recurre al emparejamiento por n-gramas de caracteres, cuya
+    puntuación es una similitud coseno entre 0 y 1.
+    El filtro de categoría replica el `category LIKE %x%` del CRUD (sin distinguir mayúsculas ni tildes);
+    `allowed_ids` limita los resultados a un conjunto de FAQs (p. ej. las que tienen una palabra clave).
+    """
+    if allowed_ids is not None and not allowed_ids:
+        return []
+    state = _state # Referencia local: una reconstrucción concurrente no cambia el estado a mitad de búsqueda
+    candidates = top_k if not category_filter and allowed_ids is None else len(state.index)
+    ranked = _filter_ranked(state, state.index.search(query, top_k=candidates), category_filter, allowed_ids)
+    if not ranked:
+        ranked = _filter_ranked(state, state.fuzzy.search(query, top_k=candidates, min_score=FAQ_FUZZY_MIN_SCORE),
+                                category_filter, allowed_ids)
+    return ranked[:top_k]
@@ -0,0 +1,187 @@
+# backend/search/ngram_matcher.py
+# Emparejamiento tolerante a errores de escritura con TF-IDF de n-gramas de caracteres.
+#
+# Cada documento se representa por sus trigramas de caracteres ("inscripcion" -> " in", "ins", ...).
+# Una palabra mal escrita ("inscricion", "horaio", "corre") comparte la mayoría de sus trigramas
+# con la correcta, así que la similitud coseno sigue siendo alta aunque no coincida ninguna palabra.
+#
+# La matriz documento x n-grama se guarda en formato disperso por columnas (CSC) con NumPy:
+# puntuar una consulta es juntar las columnas de sus n-gramas y sumarlas con un solo `np.bincount`.
+# Tras un cambio la matriz se reensambla en segundo plano; las búsquedas no esperan a que termine.
+
+import math
+import threading
+from collections import Counter
+from typing import Dict, List, Tuple, Iterable, Optional
+
+import numpy as np
+
+from search.text import fold_accents, TOKEN_RE
+
+NGRAM_SIZE = 3
+
+
+def char_ngrams(text: str, n: int = NGRAM_SIZE) -> Counter:
+    """Cuenta los n-gramas de cada palabra (con un espacio de relleno a cada lado)."""
+    grams = Counter()
+    for token in TOKEN_RE.findall(fold_accents(text or "")):
+        padded = f" {token} "
+        if len(padded) <= n:
+            grams[padded] += 1
+            continue
+        for i in range(len(padded) - n + 1):
+            grams[padded[i:i + n]] += 1
+    return grams
+
+
+class _Matrix:
+    """Matriz TF-IDF en CSC ya ensamblada; no se modifica una vez publicada."""
+
+    __slots__ = ("version", "doc_ids", "vocab", "idf", "indptr", "rows", "weights")
+
+    def __init__(self, version: int, doc_grams: Dict[str, Counter]):
+        self.version = version
+        doc_ids = list(doc_grams)
+        n_docs = len(doc_ids)
+
+        # Frecuencia documental de cada n-grama -> vocabulario e IDF suavizado
+        df = Counter()
+        for grams in doc_grams.values():
+            df.update(grams.keys())
+        vocab = {gram: col for col, gram in enumerate(df)}
+        idf = np.array([math.log((1 + n_docs) / (1 + df[gram])) + 1.0 for gram in vocab], dtype=np.float32)
+
+        # Tripletas (columna, fila, tf sublineal) de todos los documentos
+        cols, rows, tfs = [], [], []
+        for row, doc_id in enumerate(doc_ids):
+            for gram, count in doc_grams[doc_id].items():
+                cols.append(vocab[gram])
+                rows.append(row)
+                tfs.append(1.0 + math.log(count))
+        cols_arr = np.asarray(cols, dtype=np.int64)
+        rows_arr = np.asarray(rows, dtype=np.int32)
+        weights = np.asarray(tfs, dtype=np.float32) * idf[cols_arr] if cols else np.zeros(0, dtype=np.float32)
+
+        # Normalización L2 por documento para que el producto escalar sea la similitud coseno
+        norms = np.sqrt(np.bincount(rows_arr, weights=weights * weights, minlength=n_docs)).astype(np.float32)
+        norms[norms == 0] = 1.0
+        weights = weights / norms[rows_arr]
+
+        # Ordenar por columna -> formato CSC (indptr, filas, pesos)
+        order = np.argsort(cols_arr, kind="stable")
+        self.rows = rows_arr[order]
+        self.weights = weights[order].astype(np.float32)
+        self.indptr = np.concatenate(([0], np.cumsum(np.bincount(cols_arr, minlength=len(vocab))))).astype(np.int64)
+        self.doc_ids = doc_ids
+        self.vocab = vocab
+        self.idf = idf
+
+
+class CharNgramMatcher:
+    """
+    Matriz TF-IDF dispersa de n-gramas de caracteres con puntuación coseno vectorizada.
+
+    Las altas, cambios y bajas sólo recalculan los n-gramas del documento afectado. La matriz
+    (pesos IDF y normas incluidos) se reensambla entera en un hilo aparte, sin el lock, y se publica
+    con una sola asignación: mientras tanto las búsquedas usan la matriz anterior, así que un cambio
+    tarda en verse lo que tarde ese ensamblado. Sólo la primera búsqueda sin matriz la construye
+    en el momento (o `build()`, p. ej. antes de publicar un índice nuevo).
+    """
+
+    def __init__(self, n: int = NGRAM_SIZE):
+        self.n = n
+        self._doc_grams: Dict[str, Counter] = {}
+        self._lock = threading.RLock()
+        self._version = 0 # Aumenta con cada cambio; la matriz recuerda la versión con la que se armó
+        self._matrix: Optional[_Matrix] = None
+        self._building = False # Hay un hilo de reensamblado en marcha
+
+    def __len__(self) -> int:
+        return len(self._doc_grams)
+
+    def upsert(self, doc_id: str, texts: Iterable[Optional[str]]) -> None:
+        """Añade o reemplaza un documento formado por uno o varios textos."""
+        grams = Counter()
+        for text in texts:
+            grams.update(char_ngrams(text or "", self.n))
+        with self._lock:
+            self._doc_grams[doc_id] = grams
+            self._changed_locked()
+
+    def remove(self, doc_id: str) -> bool:
+        with self._lock:
+            removed = self._doc_grams.pop(doc_id, None) is not None
+            if removed:
+                self._changed_locked()
+            return removed
+
+    def clear(self) -> None:
+        with self._lock:
+            self._doc_grams.clear()
+            self._version += 1
+            self._matrix = None
+
+    def _changed_locked(self) -> None:
+        self._version += 1
+        if self._matrix is not None and not self._building: # Sin matriz previa la armará build() o la primera búsqueda
+            self._building = True
+            threading.Thread(target=self._rebuild_in_background, name="ngram-matrix-build", daemon=True).start()
+
+    def _rebuild_in_background(self) -> None:
+        try:
+            while True: # Repite si hubo más cambios mientras se ensamblaba
+                matrix = self.build()
+                with self._lock:
+                    if self._matrix is None or matrix.version == self._version:
+                        self._building = False
+                        return
+        except BaseException:
+            with self._lock:
+                self._building = False
+            raise
+
+    def build(self) -> _Matrix:
+        """Ensambla la matriz con los documentos actuales fuera del lock y la publica si es más reciente."""
+        with self._lock:
+            version, doc_grams = self._version, dict(self._doc_grams)
+        matrix = _Matrix(version, doc_grams)
+        with self._lock:
+            if self._matrix is None or self._matrix.version < version:
+                self._matrix = matrix
+            return self._matrix
+
+    def search(self, query: str, top_k: int = 10, min_score: float = 0.0) -> List[Tuple[str, float]]:
+        """Devuelve hasta `top_k` pares (doc_id, similitud coseno en [0, 1]) por encima de `min_score`."""
+        query_grams = char_ngrams(query, self.n)
+        matrix = self._matrix or self.build()
+        doc_ids, vocab, idf = matrix.doc_ids, matrix.vocab, matrix.idf
+        indptr, rows, weights = matrix.indptr, matrix.rows, matrix.weights
+
+        if not doc_ids:
+            return []
+        cols = [vocab[gram] for gram in query_grams if gram in vocab]
+        if not cols:
+            return []
+
+        # Vector de consulta TF-IDF normalizado (los n-gramas desconocidos también cuentan en la norma)
+        query_weights = np.array([1.0 + math.log(query_grams[gram]) for gram in query_grams if gram in vocab],
+                                 dtype=np.float32) * idf[cols]
+        unseen_idf = math.log(1 + len(doc_ids)) + 1.0 # IDF que tendría un n-grama con df = 0
+        unknown = sum(((1.0 + math.log(c)) * unseen_idf) ** 2 for gram, c in query_grams.items() if gram not in vocab)
+        query_weights /= math.sqrt(float(np.dot(query_weights, query_weights)) + unknown)
+
+        # Juntar las columnas de la consulta y acumular por documento en una sola operación
+        cols_arr = np.asarray(cols, dtype=np.int64)
+        starts = indptr[cols_arr]
+        lengths = indptr[cols_arr + 1] - starts
+        # Posiciones de todas las entradas de esas columnas, sin bucles de Python
+        gather = np.repeat(starts - np.concatenate(([0], np.cumsum(lengths)[:-1])), lengths) + np.arange(lengths.sum())
+        scores = np.bincount(rows[gather], weights=weights[gather] * np.repeat(query_weights, lengths),
+                             minlength=len(doc_ids))
+
+        if top_k < len(scores):
+            candidates = np.argpartition(-scores, top_k)[:top_k]
+        else:
+            candidates = np.arange(len(scores))
+        candidates = candidates[np.argsort(-scores[candidates])]
+        return [(doc_ids[i], float(scores[i])) for i in candidates if scores[i] > min_score]
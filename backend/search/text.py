@@ -0,0 +1,74 @@
+# backend/search/text.py
+# Normalización de texto en español para la búsqueda de FAQs:
+# minúsculas, plegado de acentos, eliminación de palabras vacías y stemming ligero.
+
+import re
+import unicodedata
+from typing import Iterable, List, Optional, Tuple
+
+TOKEN_RE = re.compile(r"[a-z0-9]+")
+KEYWORD_MAX_LENGTH = 100 # Longitud de faq_keywords.keyword (migración 0003)
+
+# Palabras vacías frecuentes del español (ya sin acentos, porque se comparan tras el plegado).
+SPANISH_STOPWORDS = frozenset("""
+a al algo algun alguna algunas alguno algunos ante antes como con contra cual cuales cuando de del desde
+donde durante e el ella ellas ellos en entre era eres es esa esas ese eso esos esta estan estas este esto
+estos fue ha hay la las le les lo los mas me mi mis mucho muy nada ni no nos o os otra otro para pero poco
+por porque puede puedo que quien se sea ser si sin sobre son soy su sus te tengo ti tiene tu tus un una
+uno unos unas y ya yo hola buenas gracias favor quiero necesito saber cuanto cuanta
+""".split())
+
+
+def fold_accents(text: str) -> str:
+    """Pasa a minúsculas y elimina tildes/diéresis ("Matrícula" -> "matricula")."""
+    decomposed = unicodedata.normalize("NFKD", text.lower())
+    return "".join(ch for ch in decomposed if not unicodedata.combining(ch))
+
+
+def light_stem(token: str) -> str:
+    """
+    Stemmer ligero para español (estilo Savoy): normaliza plurales y género sin
+    intentar un análisis morfológico completo. "inscripciones" -> "inscripcion",
+    "horarios" -> "horari", "matricula" -> "matricul".
+    """
+    if len(token) <= 4 or token.isdigit():
+        return token
+    if token.endswith("iones"):
+        token = token[:-2]
+    elif token.endswith("ces"):
+        token = token[:-3] + "z"
+    elif token.endswith("es") and token[-3] not in "aeiou":
+        token = token[:-2]
+    elif token.endswith("s") and token[-2] in "aeiou":
+        token = token[:-1]
+    if len(token) > 4 and token[-1] in "aoe":
+        token = token[:-1]
+    return token
+
+
+def analyze(text: str) -> List[str]:
+    """Tokeniza un texto para indexarlo o buscarlo: plegado, stopwords y stemming."""
+    if not text:
+        return []
+    return [light_stem(token) for token in TOKEN_RE.findall(fold_accents(text))
+            if token not in SPANISH_STOPWORDS and len(token) > 1]
+
+
+def normalize_keyword(keyword: str) -> str:
+    """Forma canónica de una palabra clave de FAQ: plegada y con espacios colapsados ("  Matrícula " -> "matricula")."""
+    return " ".join(fold_accents(keyword or "").split())
+
+
+def unique_keywords(keywords: Iterable[Optional[str]]) -> List[Tuple[str, str]]:
+    """
+    Pares (normalizada, tal como se escribió) de una lista de palabras clave de FAQ, en orden, sin
+    vacías ni duplicados (según la forma normalizada) y recortadas a KEYWORD_MAX_LENGTH caracteres.
+    """
+    pairs, seen = [], set()
+    for keyword in keywords:
+        keyword = (keyword or "").strip()[:KEYWORD_MAX_LENGTH]
+        normalized = normalize_keyword(keyword)
+        if normalized and normalized not in seen:
+            seen.add(normalized)
+            pairs.append((normalized, keyword))
+    return pairs
@@ -0,0 +1,137 @@
+# Archivo: chatbot/benchmarks/bench_llm_modes.py
+# Compara, contra Gemini real, los dos modos de respuesta del LLM (LLM_RESPONSE_MODE):
+#   two_call: classify_intent_and_extract_entities + (FAQ) + generate_response
+#   combined: classify_and_respond + (FAQ + answer_with_faq sólo si el modelo la pide)
+#
+# Cada mensaje va en una sesión nueva (como el primer mensaje de un usuario) y se mide:
+# latencia hasta tener la respuesta final (y la misma sin la espera en la cola del planificador),
+# llamadas a Gemini y tokens consumidos según `usage_metadata`. La búsqueda de FAQs es la misma en
+# ambos modos (réplica cargada desde el backend si responde; si no, sin FAQs).
+#
+# Uso (desde la raíz del repositorio, con GEMINI_API_KEY y TELEGRAM_BOT_TOKEN en el entorno o .env):
+#   python -m chatbot.benchmarks.bench_llm_modes --repeat 3 --output modos.json
+#   python -m chatbot.benchmarks.bench_llm_modes --messages mensajes.txt   # un mensaje por línea
+#
+# Ojo con la cuota: cada mensaje hace 1-2 llamadas por modo. El planificador respeta
+# LLM_REQUESTS_PER_MINUTE; la columna "sin cola" descuenta esa espera.
+
+import argparse
+import asyncio
+import json
+import math
+import sys
+import time
+from typing import Any, Dict, List
+
+from chatbot import llm_service
+from chatbot.api_client import get_faq_from_api
+from chatbot.bot_logging import setup_logging
+from chatbot.faq_replica import faq_replica
+from chatbot.handlers.general_handler import CONSULT_INTENTS, _faq_subject
+from chatbot.http_client import start_http_client, stop_http_client
+from chatbot.llm_scheduler import llm_scheduler
+
+DEFAULT_MESSAGES = [
+    "Hola, buenas tardes",
+    "¿Cuál es el horario de la biblioteca?",
+    "¿Cómo es el proceso de inscripción para ingeniería de sistemas?",
+    "¿Qué necesito para solicitar un certificado de estudios?",
+    "No puedo entrar a Moodle, me dice contraseña incorrecta",
+    "¿Dónde queda la oficina de admisiones?",
+    "Quiero hablar con una persona de cartera",
+    "¿Qué puedes hacer?",
+    "Gracias, eso era todo",
+]
+
+
+async def _two_call(user_id: str, message: str) -> str:
+    classification = await llm_service.classify_intent_and_extract_entities(message, user_id)
+    api_data = None
+    if classification.get("intent") in CONSULT_INTENTS and not classification.get("error"):
+        faq = await get_faq_from_api(query=message, subject=_faq_subject(classification.get("entities", {})))
+        if faq and faq.get("answer"):
+            api_data = {"faq_encontrada": faq}
+    return await llm_service.generate_response(user_id, message, api_data_context=api_data)
+
+
+async def _combined(user_id: str, message: str) -> str:
+    result = await llm_service.classify_and_respond(user_id, message)
+    if not result["needs_faq"]:
+        return result["answer"]
+    faq = await get_faq_from_api(query=result["faq_query"] or message, subject=_faq_subject(result["entities"]))
+    faq_context = {"faq_encontrada": faq} if faq and faq.get("answer") else \
+        {"info_consulta": (faq or {}).get("info_consulta", "No hay datos de FAQs disponibles para esta consulta.")}
+    return await llm_service.answer_with_faq(user_id, faq_context)
+
+
+MODES = {"two_call": _two_call, "combined": _combined}
+
+
+def _summary(values: List[float]) -> Dict[str, float]:
+    values = sorted(values)
+    pick = lambda pct: values[max(0, math.ceil(len(values) * pct / 100) - 1)]
+    return {"mean": round(sum(values) / len(values), 1), "p50": round(pick(50), 1), "p95": round(pick(95), 1),
+            "max": round(values[-1], 1)}
+
+
+async def run(messages: List[str], repeat: int) -> Dict[str, Any]:
+    await start_http_client()
+    await faq_replica.sync()
+    results: Dict[str, Any] = {}
+    for mode, pipeline in MODES.items():
+        latencies, latencies_no_queue, calls, tokens, empty = [], [], [], [], 0
+        for round_index in range(repeat):
+            for index, message in enumerate(messages):
+                user_id = f"bench-{mode}-{round_index}-{index}"
+                before = llm_scheduler.stats()
+                start = time.perf_counter()
+                answer = await pipeline(user_id, message)
+                elapsed_ms = (time.perf_counter() - start) * 1000
+                after = llm_scheduler.stats()
+                await llm_service.reset_conversation_history(user_id)
+                latencies.append(elapsed_ms)
+                latencies_no_queue.append(elapsed_ms - (after["wait_seconds"] - before["wait_seconds"]) * 1000)
+                calls.append(after["calls"] - before["calls"])
+                tokens.append(after["tokens_used"] - before["tokens_used"])
+                empty += not (answer and answer.strip())
+        results[mode] = {
+            "messages": len(latencies),
+            "latency_ms": _summary(latencies),
+            "latency_no_queue_ms": _summary(latencies_no_queue),
+            "gemini_calls_per_message": round(sum(calls) / len(calls), 2),
+            "tokens_per_message": round(sum(tokens) / len(tokens), 1),
+            "empty_answers": empty,
+        }
+    await stop_http_client()
+    return {"model": llm_service.MODEL_NAME, "faqs_in_replica": len(faq_replica), "results": results}
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Latencia y tokens: modo de dos llamadas vs. modo combinado.")
+    parser.add_argument("--messages", help="Archivo con un mensaje por línea (por defecto, un conjunto de ejemplo)")
+    parser.add_argument("--repeat", type=int, default=1, help="Veces que se repite el conjunto de mensajes")
+    parser.add_argument("--log-level", default="WARNING")
+    parser.add_argument("--output", help="Archivo JSON de resultados")
+    args = parser.parse_args()
+
+    setup_logging(level=args.log_level)
+    if llm_service.llm_model is None:
+        print("El modelo Gemini no está disponible (revisa GEMINI_API_KEY).", file=sys.stderr)
+        sys.exit(1)
+    messages = DEFAULT_MESSAGES
+    if args.messages:
+        with open(args.messages, encoding="utf-8") as messages_file:
+            messages = [line.strip() for line in messages_file if line.strip()]
+
+    report = asyncio.run(run(messages, args.repeat))
+    print(f"{'modo':<10}{'n':>5}{'p50 ms':>10}{'p95 ms':>10}{'p50 sin cola':>14}{'llamadas':>10}{'tokens':>10}")
+    for mode, row in report["results"].items():
+        print(f"{mode:<10}{row['messages']:>5}{row['latency_ms']['p50']:>10.0f}{row['latency_ms']['p95']:>10.0f}"
+              f"{row['latency_no_queue_ms']['p50']:>14.0f}{row['gemini_calls_per_message']:>10.2f}{row['tokens_per_message']:>10.0f}")
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as output_file:
+            json.dump(report, output_file, indent=2, ensure_ascii=False)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,135 @@
+# Archivo: chatbot/benchmarks/bench_prompt_tokens.py
+# Tokens de entrada por turno de una conversación con `generate_response`: ensamblado anterior vs. actual.
+#
+# - anterior: el prompt de sistema como primer turno "user" del historial (más el saludo del modelo)
+#   y el contexto de FAQs como JSON indentado pegado al mensaje, que quedaba en el historial y se
+#   reenviaba en todos los turnos siguientes;
+# - actual: el prompt de sistema como `system_instruction` y el contexto de FAQs compacto sólo en el
+#   turno en que se usa (ver `_faq_context_text` y `_forget_context` en chatbot/llm_service.py).
+#
+# Por defecto se estima (caracteres / 4, igual que el planificador) y no hace falta red. Con --exact
+# se cuentan con `count_tokens` de Gemini (necesita GEMINI_API_KEY; no consume cuota de generación).
+#
+# Uso (desde la raíz del repositorio):
+#   python -m chatbot.benchmarks.bench_prompt_tokens
+#   python -m chatbot.benchmarks.bench_prompt_tokens --exact --output tokens.json
+
+import argparse
+import json
+import os
+from typing import Any, Callable, Dict, List, Optional
+
+os.environ.setdefault("TELEGRAM_BOT_TOKEN", "bench-prompt-tokens") # config.py exige ambas variables
+os.environ.setdefault("GEMINI_API_KEY", "bench-prompt-tokens")
+
+from chatbot import llm_service
+from chatbot.llm_scheduler import estimate_tokens
+from chatbot.session_store import history_texts
+
+LEGACY_GREETING = "¡Hola! Soy Asistente CUL. Estoy aquí para ayudarte con tus consultas sobre la Corporación Universitaria Latinoamericana. ¿En qué puedo colaborarte hoy? 🎓"
+
+# (mensaje del usuario, FAQ encontrada o None). Las respuestas del modelo se simulan.
+CONVERSATION = [
+    ("Hola, buenas tardes", None),
+    ("¿Cuál es el horario de la biblioteca?",
+     {"faq_id": "FAQ-BIB001", "question": "¿Cuál es el horario de atención de la biblioteca?",
+      "answer": "La biblioteca central atiende de lunes a viernes de 7:00 a. m. a 9:00 p. m. y los sábados de 8:00 a. m. a 1:00 p. m. En periodo de exámenes el horario se extiende hasta las 10:00 p. m.",
+      "category": "Biblioteca", "updated_at": "2025-01-15T12:00:00"}),
+    ("¿Qué necesito para solicitar un certificado de estudios?",
+     {"faq_id": "FAQ-CER002", "question": "¿Cómo solicito un certificado de estudios?",
+      "answer": "Ingresa al portal académico, opción Solicitudes > Certificados, elige el tipo de certificado y realiza el pago en línea. El certificado se envía a tu correo institucional en un máximo de tres días hábiles.",
+      "category": "Trámites", "updated_at": "2025-02-03T09:30:00"}),
+    ("¿Y cuánto cuesta?", None),
+    ("¿Cómo es el proceso de inscripción para ingeniería de sistemas?",
+     {"faq_id": "FAQ-INS003", "question": "¿Cuál es el proceso de inscripción a un programa de pregrado?",
+      "answer": "Diligencia el formulario de inscripción en línea, paga el derecho de inscripción, adjunta el documento de identidad, el diploma de bachiller y los resultados de las pruebas Saber 11, y agenda la entrevista con el programa.",
+      "category": "Admisiones", "updated_at": "2025-01-20T16:45:00"}),
+    ("¿Dónde queda la oficina de admisiones?",
+     {"faq_id": "FAQ-ADM004", "question": "¿Dónde queda la oficina de admisiones?",
+      "answer": "La oficina de admisiones está en el bloque A, primer piso, sede principal. Atiende de lunes a viernes de 8:00 a. m. a 5:00 p. m.",
+      "category": "Admisiones", "updated_at": "2025-01-10T08:00:00"}),
+    ("Gracias, eso era todo", None),
+]
+
+
+def _reply(message: str, faq: Optional[Dict[str, Any]]) -> str:
+    if faq:
+        return f"¡Claro! {faq['answer']} Si necesitas algo más sobre este tema, con gusto te ayudo. También puedes usar /ayuda para ver lo que puedo hacer."
+    return "¡Con gusto! Estoy aquí para ayudarte con tus consultas sobre la CUL. Cuéntame qué necesitas o usa /ayuda para ver los temas que manejo."
+
+
+def _legacy_faq_context_text(api_data_context: dict) -> str:
+    return (
+        "\n\n--- Contexto de la base de datos de FAQs (para tu información interna al responder la pregunta actual del usuario) ---\n"
+        f"{json.dumps(api_data_context, indent=2, ensure_ascii=False)}\n"
+        "--- Fin del contexto ---"
+    )
+
+
+def _turn_parts(message: str, faq: Optional[Dict[str, Any]], context_text: Callable[[dict], str]) -> List[Dict[str, str]]:
+    parts = [{"text": message}]
+    if faq:
+        parts.append({"text": context_text({"faq_encontrada": faq})})
+    return parts
+
+
+def legacy_requests() -> List[List[Dict[str, Any]]]:
+    """Contenidos enviados en cada turno con el ensamblado anterior."""
+    history = [{"role": "user", "parts": [{"text": llm_service.SYSTEM_PROMPT_TEXT}]},
+               {"role": "model", "parts": [{"text": LEGACY_GREETING}]}]
+    requests = []
+    for message, faq in CONVERSATION:
+        user_turn = {"role": "user", "parts": _turn_parts(message, faq, _legacy_faq_context_text)}
+        requests.append(history + [user_turn])
+        history = history + [user_turn, {"role": "model", "parts": [{"text": _reply(message, faq)}]}]
+    return requests
+
+
+def compact_requests() -> List[List[Dict[str, Any]]]:
+    """Contenidos enviados en cada turno con el ensamblado actual (sin el prompt de sistema, que va aparte)."""
+    history: List[Dict[str, Any]] = []
+    requests = []
+    for message, faq in CONVERSATION:
+        requests.append(history + [{"role": "user", "parts": _turn_parts(message, faq, llm_service._faq_context_text)}])
+        history = history + [{"role": "user", "parts": [{"text": message}]},
+                             {"role": "model", "parts": [{"text": _reply(message, faq)}]}]
+    return requests
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Tokens de entrada por turno: ensamblado de prompts anterior vs. actual.")
+    parser.add_argument("--exact", action="store_true", help="Contar con count_tokens de Gemini en lugar de estimar")
+    parser.add_argument("--output", help="Archivo JSON de resultados")
+    args = parser.parse_args()
+
+    if args.exact:
+        if llm_service.llm_model is None:
+            raise SystemExit("El modelo Gemini no está disponible (revisa GEMINI_API_KEY).")
+        count_legacy = lambda contents: llm_service.llm_model.count_tokens(contents).total_tokens
+        count_compact = lambda contents: llm_service._chat_model(llm_service.SYSTEM_PROMPT_TEXT).count_tokens(contents).total_tokens
+    else:
+        count_legacy = lambda contents: estimate_tokens(*history_texts(contents))
+        count_compact = lambda contents: estimate_tokens(llm_service.SYSTEM_PROMPT_TEXT, *history_texts(contents))
+
+    turns = []
+    for index, (legacy, compact) in enumerate(zip(legacy_requests(), compact_requests())):
+        before, after = count_legacy(legacy), count_compact(compact)
+        turns.append({"turn": index + 1, "message": CONVERSATION[index][0], "with_faq": CONVERSATION[index][1] is not None,
+                      "input_tokens_before": before, "input_tokens_after": after})
+    total_before = sum(turn["input_tokens_before"] for turn in turns)
+    total_after = sum(turn["input_tokens_after"] for turn in turns)
+    report = {"method": "count_tokens" if args.exact else "estimate_chars_div_4", "turns": turns,
+              "total_before": total_before, "total_after": total_after,
+              "reduction": round(1 - total_after / total_before, 3) if total_before else None}
+
+    print(f"{'turno':<7}{'FAQ':<5}{'antes':>8}{'ahora':>8}")
+    for turn in turns:
+        print(f"{turn['turn']:<7}{'sí' if turn['with_faq'] else '':<5}{turn['input_tokens_before']:>8}{turn['input_tokens_after']:>8}")
+    print(f"{'total':<12}{total_before:>8}{total_after:>8}  ({report['reduction']:.0%} menos)")
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as output_file:
+            json.dump(report, output_file, indent=2, ensure_ascii=False)
+
+
+if __name__ == "__main__":
+    main()
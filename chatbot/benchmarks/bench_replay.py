@@ -0,0 +1,446 @@
+# Archivo: chatbot/benchmarks/bench_replay.py
+# Arnés de replay offline: ejecuta los handlers reales del bot sin Telegram ni Gemini.
+#
+# - Telegram: la Application de python-telegram-bot se construye con un `BaseRequest` falso que
+#   responde en memoria a la Bot API (getMe, sendMessage, sendChatAction...) con la latencia indicada.
+# - Gemini: `llm_service.llm_model` (y los modelos de chat) se reemplazan por un modelo falso con latencias
+#   configurables y clasificaciones predefinidas (reglas por palabra clave o la intención anotada en el corpus).
+# - Backend: el cliente HTTP compartido (chatbot/http_client.py) usa un transporte en memoria que
+#   responde POST /tickets/ y GET /faqs/ con la latencia indicada.
+# - FAQs: la réplica local se carga con FAQs sintéticas, así las consultas no salen de proceso.
+#
+# Se reproduce un corpus de conversaciones (grabado en JSONL o sintético, con flujos /ticket
+# completos) lanzando conversaciones a la tasa pedida; los mensajes de cada conversación van en
+# orden, como los mandaría un usuario. Al final informa updates/s, percentiles de latencia hasta
+# la primera respuesta y el crecimiento de memoria.
+#
+# Uso (desde la raíz del repositorio):
+#   python -m chatbot.benchmarks.bench_replay --conversations 500 --rate 20
+#   python -m chatbot.benchmarks.bench_replay --corpus conversaciones.jsonl --gemini-latency lognormal:800,0.4 --output r.json
+#
+# Formato del corpus (una conversación por línea):
+#   {"user_id": 1001, "messages": ["hola", {"text": "horario biblioteca", "intent": "CONSULTA_HORARIO"}, "/ticket", ...]}
+#
+# Distribuciones de latencia: "0" (sin latencia), "fixed:MS", "uniform:MIN_MS,MAX_MS", "lognormal:MEDIANA_MS,SIGMA".
+
+import os
+
+# chatbot.config exige estas variables al importarse; el arnés no habla con Telegram ni con Gemini.
+os.environ.setdefault("TELEGRAM_BOT_TOKEN", "123456:replay-harness")
+os.environ.setdefault("GEMINI_API_KEY", "replay-harness")
+# Sin presupuesto por minuto salvo que se pida: con los límites de producción (chatbot/llm_scheduler.py)
+# el replay mediría la cuota, no el bot. Exportar LLM_REQUESTS_PER_MINUTE/LLM_TOKENS_PER_MINUTE para probarlos.
+os.environ.setdefault("LLM_REQUESTS_PER_MINUTE", "0")
+os.environ.setdefault("LLM_TOKENS_PER_MINUTE", "0")
+
+import argparse
+import asyncio
+import gc
+import itertools
+import json
+import math
+import random
+import re
+import sys
+import time
+from datetime import datetime, timezone
+from typing import Any, Callable, Dict, List, Optional, Tuple, Union
+
+import httpx
+from telegram import Update
+from telegram.ext import Application
+from telegram.request import BaseRequest, RequestData
+
+from chatbot import http_client, llm_service
+from chatbot.bot_logging import setup_logging
+from chatbot.config import LLM_RESPONSE_MODE
+from chatbot.faq_replica import faq_replica
+from chatbot.handlers.general_handler import CONSULT_INTENTS, faq_answer_stats
+from chatbot.handlers.ticket_handler import TICKET_CATEGORIES
+from chatbot.intent_classifier import local_classifier
+from chatbot.llm_scheduler import llm_scheduler
+from chatbot.main_bot import make_update_processor, register_handlers
+
+BOT_USER = {"id": 123456, "is_bot": True, "first_name": "Asistente CUL", "username": "asistente_cul_bot",
+            "can_join_groups": False, "can_read_all_group_messages": False, "supports_inline_queries": False}
+
+
+# --- Latencias ---
+
+def parse_latency(spec: str) -> Callable[[random.Random], float]:
+    """Devuelve una función rng -> segundos según la especificación (ver cabecera)."""
+    kind, _, params = spec.partition(":")
+    try:
+        values = [float(value) for value in params.split(",") if value]
+        if kind in ("0", "none", ""):
+            return lambda rng: 0.0
+        if kind == "fixed":
+            return lambda rng: values[0] / 1000
+        if kind == "uniform":
+            low, high = values[0] / 1000, values[1] / 1000
+            return lambda rng: rng.uniform(low, high)
+        if kind == "lognormal":
+            mu, sigma = math.log(values[0] / 1000), values[1]
+            return lambda rng: rng.lognormvariate(mu, sigma)
+    except (ValueError, IndexError):
+        pass
+    raise argparse.ArgumentTypeError(f"Distribución de latencia no válida: {spec!r}")
+
+
+# --- Bot API falsa ---
+
+class FakeBotAPIRequest(BaseRequest):
+    """
+    Sustituye la conexión HTTP de python-telegram-bot: cada llamada a la Bot API se responde en
+    memoria tras la latencia configurada. Registra el instante del primer sendMessage por chat
+    para medir la latencia de respuesta de cada update.
+    """
+
+    def __init__(self, latency: Callable[[random.Random], float], seed: int):
+        self._latency = latency
+        self._rng = random.Random(seed)
+        self._message_ids = itertools.count(1)
+        self.calls: Dict[str, int] = {}
+        self.waiting_reply: Dict[int, float] = {} # chat_id -> perf_counter() de llegada del update
+        self.reply_latencies: List[float] = []
+
+    async def initialize(self) -> None:
+        pass
+
+    async def shutdown(self) -> None:
+        pass
+
+    @property
+    def read_timeout(self) -> Optional[float]:
+        return None
+
+    async def do_request(self, url: str, method: str, request_data: Optional[RequestData] = None,
+                         read_timeout=None, write_timeout=None, connect_timeout=None, pool_timeout=None) -> Tuple[int, bytes]:
+        api_method = url.rsplit("/", 1)[-1]
+        self.calls[api_method] = self.calls.get(api_method, 0) + 1
+        params = request_data.parameters if request_data else {}
+        delay = self._latency(self._rng)
+        if delay:
+            await asyncio.sleep(delay)
+
+        if api_method == "getMe":
+            result: Any = BOT_USER
+        elif api_method in ("sendMessage", "editMessageText"):
+            chat_id = int(params["chat_id"])
+            arrived = self.waiting_reply.pop(chat_id, None)
+            if arrived is not None:
+                self.reply_latencies.append(time.perf_counter() - arrived)
+            result = {"message_id": next(self._message_ids), "date": int(time.time()),
+                      "chat": {"id": chat_id, "type": "private"}, "from": BOT_USER, "text": params.get("text", "")}
+        else: # sendChatAction, deleteWebhook, setMyCommands...
+            result = True
+        return 200, json.dumps({"ok": True, "result": result}).encode("utf-8")
+
+
+# --- Backend falso ---
+
+class FakeBackend:
+    """Handler de `httpx.MockTransport` con las rutas del backend que usa el bot."""
+
+    def __init__(self, latency: Callable[[random.Random], float], faqs: List[Dict[str, Any]], seed: int):
+        self._latency = latency
+        self._faqs = faqs
+        self._rng = random.Random(seed)
+        self._ticket_ids = itertools.count(1)
+        self.calls: Dict[str, int] = {}
+
+    async def __call__(self, request: httpx.Request) -> httpx.Response:
+        route = f"{request.method} {request.url.path.rsplit('/api/cul/v1', 1)[-1]}"
+        self.calls[route] = self.calls.get(route, 0) + 1
+        delay = self._latency(self._rng)
+        if delay:
+            await asyncio.sleep(delay)
+        now = datetime.now(timezone.utc).isoformat()
+        if route == "POST /tickets/":
+            ticket = json.loads(request.content)
+            return httpx.Response(201, json={**ticket, "id": f"TICKET-REPLAY-{next(self._ticket_ids):06d}",
+                                             "status": "Abierto", "created_at": now})
+        if route == "GET /faqs/":
+            words = set(request.url.params.get("query", "").lower().split())
+            matches = [faq for faq in self._faqs if words & set(faq["keywords"])][:1]
+            return httpx.Response(200, json=[{**faq, "created_at": now} for faq in matches])
+        if route == "GET /faqs/changes":
+            return httpx.Response(200, json={"faqs": self._faqs, "deleted_ids": [], "watermark": now, "full": True})
+        return httpx.Response(404, json={"detail": "Not Found"})
+
+
+# --- Gemini falso ---
+
+# Reglas para las clasificaciones predefinidas (la primera que coincide gana).
+CLASSIFICATION_RULES: List[Tuple[str, str, Dict[str, str]]] = [
+    (r"\b(hola|buenas|buenos d[ií]as)\b", "SALUDO", {}),
+    (r"\b(gracias|chao|adi[oó]s)\b", "DESPEDIDA", {}),
+    (r"\b(humano|asesor|persona|ticket)\b", "GENERAR_TICKET_HUMANO", {"resumen_solicitud_ticket": "hablar con un asesor"}),
+    (r"\b(horario|hora)\b", "CONSULTA_HORARIO", {"lugar": "biblioteca"}),
+    (r"\b(inscrip|matr[ií]cula|certificado|homologa)", "CONSULTA_TRAMITE_ACADEMICO", {"nombre_tramite": "matrícula"}),
+    (r"\b(programa|pregrado|posgrado|carrera)\b", "CONSULTA_PROGRAMA_ACADEMICO", {"nombre_programa": "ingeniería"}),
+    (r"\b(moodle|correo|wifi|contraseña)\b", "SOLICITUD_SOPORTE_TECNICO", {"plataforma_afectada": "moodle"}),
+    (r"\b(d[oó]nde|tel[eé]fono|cafeter[ií]a|biblioteca)\b", "INFORMACION_GENERAL_CUL", {"tema_consulta_general": "ubicación"}),
+]
+_USER_MESSAGE_RE = re.compile(r'Mensaje del usuario: "(.*)"')
+
+
+class _FakeResponse:
+    def __init__(self, text: str):
+        self.text = text
+        self.prompt_feedback = None
+
+
+class _FakeChatSession:
+    def __init__(self, model: "FakeGeminiModel", history: List[Dict[str, Any]]):
+        self._model = model
+        self.history = list(history)
+
+    async def send_message_async(self, parts: List[Dict[str, str]], generation_config: Optional[Dict[str, Any]] = None) -> _FakeResponse:
+        await self._model.wait(self._model.generate_latency)
+        self.history.append({"role": "user", "parts": parts})
+        text = parts[0]["text"]
+        reply = f"Respuesta simulada a: {text[:80]}"
+        if generation_config and generation_config.get("response_mime_type") == "application/json": # LLM_RESPONSE_MODE=combined
+            follow_up = text.startswith(llm_service.FAQ_FOLLOW_UP_TEXT)
+            classification = {"intent": "DESCONOCIDO", "entities": {}} if follow_up else self._model.classify(text)
+            needs_faq = not follow_up and classification["intent"] in CONSULT_INTENTS
+            reply = json.dumps({**classification, "needs_faq": needs_faq, "faq_query": text if needs_faq else "",
+                                "answer": "" if needs_faq else reply}, ensure_ascii=False)
+        self.history.append({"role": "model", "parts": [{"text": reply}]})
+        return _FakeResponse(reply)
+
+
+class FakeGeminiModel:
+    """Imita a `genai.GenerativeModel` en lo que usa llm_service: generate_content_async y start_chat."""
+
+    def __init__(self, classify_latency: Callable[[random.Random], float],
+                 generate_latency: Callable[[random.Random], float], seed: int):
+        self.classify_latency = classify_latency
+        self.generate_latency = generate_latency
+        self.canned_intents: Dict[str, str] = {} # Intenciones anotadas en el corpus (texto -> intención)
+        self._rng = random.Random(seed)
+        self.calls = {"classify": 0, "generate": 0}
+
+    async def wait(self, latency: Callable[[random.Random], float]) -> None:
+        self.calls["generate" if latency is self.generate_latency else "classify"] += 1
+        delay = latency(self._rng)
+        if delay:
+            await asyncio.sleep(delay)
+
+    def classify(self, message: str) -> Dict[str, Any]:
+        if message in self.canned_intents:
+            return {"intent": self.canned_intents[message], "entities": {}}
+        lowered = message.lower()
+        for pattern, intent, entities in CLASSIFICATION_RULES:
+            if re.search(pattern, lowered):
+                return {"intent": intent, "entities": dict(entities)}
+        return {"intent": "DESCONOCIDO", "entities": {}}
+
+    async def generate_content_async(self, prompt: str) -> _FakeResponse:
+        await self.wait(self.classify_latency)
+        match = _USER_MESSAGE_RE.search(prompt)
+        return _FakeResponse(json.dumps(self.classify(match.group(1) if match else prompt), ensure_ascii=False))
+
+    def start_chat(self, history: List[Dict[str, Any]]) -> _FakeChatSession:
+        return _FakeChatSession(self, history)
+
+
+# --- Corpus ---
+
+Message = Union[str, Dict[str, str]]
+
+FAQ_QUESTIONS = ["¿Cuál es el horario de la biblioteca?", "¿Cómo es el proceso de inscripción?",
+                 "¿Qué necesito para un certificado de estudios?", "¿Dónde queda la cafetería?",
+                 "Información sobre el programa de ingeniería de sistemas", "¿Cuándo es la matrícula?",
+                 "No puedo entrar a moodle", "¿Qué posgrados tienen?", "Teléfono de admisiones"]
+
+
+def synthetic_corpus(conversations: int, seed: int) -> List[Dict[str, Any]]:
+    """Mezcla de conversaciones típicas: consultas de FAQs, charla corta, /reset_chat y flujos /ticket completos."""
+    rng = random.Random(seed)
+    corpus = []
+    for index in range(conversations):
+        kind = rng.choices(["faq", "ticket", "chat", "reset"], weights=[60, 20, 15, 5])[0]
+        if kind == "faq":
+            messages: List[Message] = ["Hola"] + rng.sample(FAQ_QUESTIONS, rng.randint(1, 3)) + ["Gracias"]
+        elif kind == "ticket":
+            messages = ["/ticket", f"No puedo acceder a la plataforma de notas desde hace {rng.randint(2, 9)} días.",
+                        rng.choice(TICKET_CATEGORIES), f"estudiante{index}@cul.edu.co",
+                        rng.choice(["Omitir este paso", str(1_000_000 + index)]), "✅ Sí, enviar ticket"]
+        elif kind == "chat":
+            messages = ["¿Quién eres?", "¿Qué puedes hacer?"]
+        else:
+            messages = ["Hola", "/reset_chat", rng.choice(FAQ_QUESTIONS)]
+        corpus.append({"user_id": 500000 + index, "messages": messages})
+    return corpus
+
+
+def load_corpus(path: str) -> List[Dict[str, Any]]:
+    with open(path, encoding="utf-8") as corpus_file:
+        return [json.loads(line) for line in corpus_file if line.strip()]
+
+
+def synthetic_faqs(count: int) -> List[Dict[str, Any]]:
+    topics = ["biblioteca", "horario", "inscripción", "matrícula", "certificado", "cafetería", "moodle",
+              "posgrado", "admisiones", "ingeniería", "pagos", "becas"]
+    return [{"id": f"FAQ-REPLAY-{i:05d}", "question": f"¿Cómo funciona {topics[i % len(topics)]} en la sede {i}?",
+             "answer": f"Información de {topics[i % len(topics)]} para la sede {i}.", "category": "General",
+             "keywords": [topics[i % len(topics)], topics[(i * 7) % len(topics)]],
+             "updated_at": "2025-01-15T12:00:00"} for i in range(count)]
+
+
+def make_update(bot, update_id: int, user_id: int, text: str) -> Update:
+    message: Dict[str, Any] = {
+        "message_id": update_id, "date": int(time.time()), "text": text,
+        "chat": {"id": user_id, "type": "private", "first_name": f"Usuario {user_id}"},
+        "from": {"id": user_id, "is_bot": False, "first_name": f"Usuario {user_id}"},
+    }
+    if text.startswith("/"):
+        message["entities"] = [{"type": "bot_command", "offset": 0, "length": len(text.split()[0])}]
+    return Update.de_json({"update_id": update_id, "message": message}, bot)
+
+
+# --- Replay ---
+
+def _rss_mb() -> float:
+    """RSS actual (Linux), el máximo alcanzado (otros Unix) o 0.0 si no se puede medir (Windows)."""
+    try:
+        with open("/proc/self/statm") as statm:
+            return int(statm.read().split()[1]) * os.sysconf("SC_PAGE_SIZE") / 1024 / 1024
+    except OSError:
+        pass
+    try:
+        import resource # Sólo existe en Unix
+    except ImportError:
+        return 0.0
+    max_rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return max_rss / 1024 / 1024 if sys.platform == "darwin" else max_rss / 1024 # macOS lo da en bytes, Linux en KiB
+
+
+def _percentiles(values: List[float]) -> Dict[str, float]:
+    values = sorted(values)
+    if not values:
+        return {}
+    pick = lambda pct: values[max(0, min(len(values) - 1, math.ceil(len(values) * pct / 100) - 1))]
+    return {"mean": round(sum(values) / len(values) * 1000, 2), "p50": round(pick(50) * 1000, 2),
+            "p90": round(pick(90) * 1000, 2), "p95": round(pick(95) * 1000, 2), "p99": round(pick(99) * 1000, 2),
+            "max": round(values[-1] * 1000, 2)}
+
+
+async def replay(args: argparse.Namespace) -> Dict[str, Any]:
+    corpus = load_corpus(args.corpus) if args.corpus else synthetic_corpus(args.conversations, args.seed)
+    bot_api = FakeBotAPIRequest(parse_latency(args.telegram_latency), args.seed)
+    gemini = FakeGeminiModel(parse_latency(args.classify_latency), parse_latency(args.gemini_latency), args.seed)
+    for conversation in corpus:
+        for message in conversation["messages"]:
+            if isinstance(message, dict) and message.get("intent"):
+                gemini.canned_intents[message["text"]] = message["intent"]
+    llm_service.llm_model = gemini
+    llm_service._chat_model = lambda system_prompt: gemini
+    faqs = synthetic_faqs(args.faqs or 200)
+    backend = FakeBackend(parse_latency(args.backend_latency), faqs, args.seed)
+    await http_client.start_http_client(transport=httpx.MockTransport(backend))
+    if args.faqs:
+        faq_replica.apply_changes({"full": True, "faqs": faqs, "deleted_ids": [],
+                                   "watermark": datetime.now(timezone.utc).isoformat()})
+
+    application = (Application.builder().token(os.environ["TELEGRAM_BOT_TOKEN"])
+                   .request(bot_api).get_updates_request(bot_api)
+                   .concurrent_updates(make_update_processor()).build())
+    register_handlers(application)
+    await application.initialize()
+
+    update_ids = itertools.count(1)
+    handler_latencies: List[float] = []
+    arrival_rng = random.Random(args.seed + 1)
+    think_time = parse_latency(args.think_time)
+
+    async def run_conversation(conversation: Dict[str, Any]) -> None:
+        user_id = int(conversation["user_id"])
+        rng = random.Random(user_id)
+        for message in conversation["messages"]:
+            text = message["text"] if isinstance(message, dict) else message
+            update = make_update(application.bot, next(update_ids), user_id, text)
+            start = time.perf_counter()
+            bot_api.waiting_reply[user_id] = start
+            # Como en el polling: pasa por el procesador de updates (BOT_CONCURRENT_UPDATES)
+            await application.update_processor.process_update(update, application.process_update(update))
+            handler_latencies.append(time.perf_counter() - start)
+            bot_api.waiting_reply.pop(user_id, None) # Updates que no respondieron nada
+            delay = think_time(rng)
+            if delay:
+                await asyncio.sleep(delay)
+
+    gc.collect()
+    rss_start = _rss_mb()
+    started = time.perf_counter()
+    tasks = []
+    for conversation in corpus:
+        tasks.append(asyncio.create_task(run_conversation(conversation)))
+        if args.rate > 0: # Llegadas de Poisson a `rate` conversaciones por segundo
+            await asyncio.sleep(arrival_rng.expovariate(args.rate))
+    await asyncio.gather(*tasks)
+    elapsed = time.perf_counter() - started
+    gc.collect()
+    rss_end = _rss_mb()
+    await application.shutdown()
+    await http_client.stop_http_client()
+
+    return {
+        "meta": {"started_at": datetime.now(timezone.utc).isoformat(timespec="seconds"), "seed": args.seed,
+                 "corpus": args.corpus or f"sintético ({len(corpus)} conversaciones)", "rate": args.rate,
+                 "telegram_latency": args.telegram_latency, "classify_latency": args.classify_latency,
+                 "gemini_latency": args.gemini_latency, "backend_latency": args.backend_latency,
+                 "think_time": args.think_time, "faqs": args.faqs, "llm_response_mode": LLM_RESPONSE_MODE},
+        "conversations": len(corpus),
+        "updates": len(handler_latencies),
+        "duration_s": round(elapsed, 3),
+        "updates_per_s": round(len(handler_latencies) / elapsed, 2) if elapsed else 0.0,
+        "reply_latency_ms": _percentiles(bot_api.reply_latencies),
+        "handler_latency_ms": _percentiles(handler_latencies),
+        "memory": {"rss_start_mb": round(rss_start, 1), "rss_end_mb": round(rss_end, 1),
+                   "rss_growth_mb": round(rss_end - rss_start, 1),
+                   "llm_sessions": len(llm_service.conversation_sessions_store),
+                   "user_data_entries": len(application.user_data)},
+        "bot_api_calls": bot_api.calls,
+        "gemini_calls": gemini.calls,
+        "backend_calls": backend.calls,
+        "llm_scheduler": llm_scheduler.stats(),
+        "intent_paths": local_classifier.stats(),
+        "llm_sessions": llm_service.conversation_sessions_store.stats(),
+        "intent_cache": llm_service.intent_cache.stats(),
+        "answer_cache": llm_service.answer_cache.stats(),
+        "faq_answers": faq_answer_stats.stats(),
+    }
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Replay offline del bot CUL con Telegram y Gemini simulados.")
+    parser.add_argument("--corpus", help="JSONL de conversaciones grabadas (por defecto, corpus sintético)")
+    parser.add_argument("--conversations", type=int, default=200, help="Conversaciones del corpus sintético")
+    parser.add_argument("--rate", type=float, default=20.0, help="Conversaciones nuevas por segundo (0 = todas a la vez)")
+    parser.add_argument("--seed", type=int, default=7)
+    parser.add_argument("--telegram-latency", default="lognormal:40,0.3", help="Latencia de cada llamada a la Bot API")
+    parser.add_argument("--classify-latency", default="lognormal:500,0.4", help="Latencia de la clasificación con Gemini")
+    parser.add_argument("--gemini-latency", default="lognormal:1200,0.5", help="Latencia de la respuesta de Gemini")
+    parser.add_argument("--backend-latency", default="lognormal:30,0.3", help="Latencia de cada llamada al backend")
+    parser.add_argument("--think-time", default="0", help="Pausa del usuario entre mensajes de una conversación")
+    parser.add_argument("--faqs", type=int, default=200, help="FAQs sintéticas en la réplica local (0 = consultar el backend)")
+    parser.add_argument("--log-level", default="ERROR")
+    parser.add_argument("--output", help="Archivo JSON de resultados (por defecto, stdout)")
+    args = parser.parse_args()
+
+    setup_logging(level=args.log_level)
+    report = asyncio.run(replay(args))
+    output = json.dumps(report, indent=2, ensure_ascii=False)
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as output_file:
+            output_file.write(output + "\n")
+        print(f"Resultados guardados en {args.output}", file=sys.stderr)
+    else:
+        print(output)
+
+
+if __name__ == "__main__":
+    main()
@@ -25,10 +25,109 @@ GEMINI_API_KEY = os.getenv("GEMINI_API_KEY")
 # Asegúrate que esta URL sea accesible desde donde corre tu bot.
 API_BASE_URL = os.getenv("API_BASE_URL", "http://127.0.0.1:8000/api/cul/v1")
 
+# --- Cliente HTTP del backend (chatbot/http_client.py) ---
+# Pool de conexiones keep-alive compartido por todo el bot. Los reintentos (BACKEND_HTTP_RETRIES,
+# con backoff exponencial con jitter desde BACKEND_HTTP_BACKOFF segundos) sólo se aplican a llamadas
+# idempotentes o a conexiones que no llegaron a establecerse.
+BACKEND_HTTP_MAX_CONNECTIONS = int(os.getenv("BACKEND_HTTP_MAX_CONNECTIONS", 20))
+BACKEND_HTTP_MAX_KEEPALIVE = int(os.getenv("BACKEND_HTTP_MAX_KEEPALIVE", 10))
+BACKEND_HTTP_KEEPALIVE_EXPIRY = float(os.getenv("BACKEND_HTTP_KEEPALIVE_EXPIRY", 60.0))
+BACKEND_HTTP_RETRIES = int(os.getenv("BACKEND_HTTP_RETRIES", 2))
+BACKEND_HTTP_BACKOFF = float(os.getenv("BACKEND_HTTP_BACKOFF", 0.2))
+
+
+# --- Planificador de llamadas a Gemini (chatbot/llm_scheduler.py) ---
+# Máximo de llamadas simultáneas y presupuesto por minuto (0 = sin límite). Por defecto no se limitan
+# las peticiones por minuto: fija LLM_REQUESTS_PER_MINUTE/LLM_TOKENS_PER_MINUTE a la cuota de tu
+# proyecto (el nivel gratuito de gemini-1.5-flash admite 15 peticiones por minuto).
+# Tras un 429 el despacho se pausa LLM_RATE_LIMIT_COOLDOWN segundos y la llamada se reintenta
+# hasta LLM_RATE_LIMIT_RETRIES veces. Cada LLM_STATS_LOG_INTERVAL segundos se registran cola y esperas.
+LLM_MAX_CONCURRENCY = int(os.getenv("LLM_MAX_CONCURRENCY", 8))
+LLM_REQUESTS_PER_MINUTE = int(os.getenv("LLM_REQUESTS_PER_MINUTE", 0))
+LLM_TOKENS_PER_MINUTE = int(os.getenv("LLM_TOKENS_PER_MINUTE", 1_000_000))
+LLM_RATE_LIMIT_COOLDOWN = float(os.getenv("LLM_RATE_LIMIT_COOLDOWN", 10.0))
+LLM_RATE_LIMIT_RETRIES = int(os.getenv("LLM_RATE_LIMIT_RETRIES", 2))
+LLM_STATS_LOG_INTERVAL = float(os.getenv("LLM_STATS_LOG_INTERVAL", 60.0))
+# Updates de Telegram atendidos a la vez (los de un mismo chat siempre en orden). Por defecto el
+# cuádruple de LLM_MAX_CONCURRENCY: los que no llaman a Gemini (cachés, respuestas directas con FAQ)
+# no esperan detrás de los que sí, y estos hacen cola en el planificador. 0 = 256.
+BOT_CONCURRENT_UPDATES = int(os.getenv("BOT_CONCURRENT_UPDATES", 4 * LLM_MAX_CONCURRENCY))
+
+
+# --- Sesiones de chat con Gemini (chatbot/session_store.py) ---
+# Máximo de sesiones en memoria (LRU), segundos de inactividad tras los que una sesión caduca y
+# ventana de historial por sesión: turnos (mensaje + respuesta) y tokens estimados, sin contar el
+# prompt de sistema. Al pasarse se eliminan los turnos más antiguos. 0 = sin límite.
+LLM_SESSION_MAX_SESSIONS = int(os.getenv("LLM_SESSION_MAX_SESSIONS", 5000))
+LLM_SESSION_IDLE_TTL = float(os.getenv("LLM_SESSION_IDLE_TTL", 2 * 3600))
+LLM_SESSION_MAX_TURNS = int(os.getenv("LLM_SESSION_MAX_TURNS", 20))
+LLM_SESSION_MAX_TOKENS = int(os.getenv("LLM_SESSION_MAX_TOKENS", 8000))
+LLM_SESSION_SWEEP_INTERVAL = float(os.getenv("LLM_SESSION_SWEEP_INTERVAL", 300.0))
+# Dónde se guarda el historial de cada conversación (chatbot/history_store.py): "memory" (un solo
+# proceso, se pierde al reiniciar) o "sqlite" (archivo LLM_HISTORY_SQLITE_PATH en modo WAL, en disco
+# local: varios workers de la máquina pueden compartirlo y los reinicios conservan las conversaciones).
+LLM_HISTORY_BACKEND = os.getenv("LLM_HISTORY_BACKEND", "memory").strip().lower()
+LLM_HISTORY_SQLITE_PATH = os.getenv("LLM_HISTORY_SQLITE_PATH", "chat_history.sqlite3")
+
+
+# --- Modo de respuesta del LLM ---
+# "two_call" (por defecto): clasificar la intención y después generar la respuesta (dos llamadas).
+# "combined": intención, entidades y respuesta en una sola llamada con salida JSON; las FAQs sólo
+# se consultan (y se hace una segunda llamada) cuando el modelo las pide.
+LLM_RESPONSE_MODE = os.getenv("LLM_RESPONSE_MODE", "two_call").strip().lower()
+
+
+# --- Clasificador local de intenciones (chatbot/intent_classifier.py) ---
+# Reglas + modelo lineal que resuelven sin Gemini las intenciones de INTENT_FAST_PATH_INTENTS cuando
+# su confianza llega a INTENT_LOCAL_THRESHOLD. El modelo se entrena con
+# `python -m chatbot.intent_classifier train` a partir de INTENT_EXAMPLES_FILE, donde el bot guarda
+# (si se configura; contiene los mensajes de los usuarios) las clasificaciones que hizo Gemini.
+INTENT_FAST_PATH_INTENTS = [intent.strip() for intent in os.getenv(
+    "INTENT_FAST_PATH_INTENTS", "SALUDO,DESPEDIDA,AFIRMACION,NEGACION,CANCELAR_ACCION,GENERAR_TICKET_HUMANO").split(",") if intent.strip()]
+INTENT_LOCAL_THRESHOLD = float(os.getenv("INTENT_LOCAL_THRESHOLD", 0.9))
+INTENT_MODEL_PATH = os.getenv("INTENT_MODEL_PATH", "intent_model.json")
+INTENT_EXAMPLES_FILE = os.getenv("INTENT_EXAMPLES_FILE", "")
+# Caché LRU+TTL de las clasificaciones de Gemini por mensaje normalizado (0 = desactivada).
+INTENT_CACHE_MAX_ENTRIES = int(os.getenv("INTENT_CACHE_MAX_ENTRIES", 5000))
+INTENT_CACHE_TTL = float(os.getenv("INTENT_CACHE_TTL", 6 * 3600))
+
+
+# --- Caché de respuestas generadas con una FAQ (chatbot/llm_service.py) ---
+# La misma pregunta (normalizada) resuelta con la misma FAQ y la misma intención reutiliza la
+# respuesta ya generada por Gemini. Las entradas de una FAQ se descartan cuando la réplica recibe
+# cambios de esa FAQ. No se usa en preguntas de seguimiento que dependen del historial. 0 = desactivada.
+RESPONSE_CACHE_MAX_ENTRIES = int(os.getenv("RESPONSE_CACHE_MAX_ENTRIES", 2000))
+RESPONSE_CACHE_TTL = float(os.getenv("RESPONSE_CACHE_TTL", 24 * 3600))
+
+
+# --- Réplica local de FAQs ---
+# El bot carga todas las FAQs al iniciar y luego pide sólo los cambios (GET /faqs/changes) cada
+# FAQ_REPLICA_SYNC_INTERVAL segundos. Si la última sincronización correcta tiene más de
+# FAQ_REPLICA_MAX_STALENESS segundos, las consultas vuelven a ir al backend.
+FAQ_REPLICA_SYNC_INTERVAL = int(os.getenv("FAQ_REPLICA_SYNC_INTERVAL", 300))
+FAQ_REPLICA_MAX_STALENESS = int(os.getenv("FAQ_REPLICA_MAX_STALENESS", 1800))
+# Si la FAQ encontrada en la réplica tiene una confianza (0-1, ver FAQReplica.search) igual o mayor
+# que FAQ_DIRECT_ANSWER_THRESHOLD, el bot responde con ella directamente, sin llamar a Gemini. Vale
+# en los dos LLM_RESPONSE_MODE: en "two_call" tras clasificar una consulta, en "combined" antes de
+# la llamada (buscando el mensaje en la réplica local). Un valor mayor que 1 lo desactiva.
+FAQ_DIRECT_ANSWER_THRESHOLD = float(os.getenv("FAQ_DIRECT_ANSWER_THRESHOLD", 0.85))
+
+
+# --- Trazas por update (chatbot/tracing.py) ---
+# TRACE_EXPORT: "off" (por defecto), "file" (TRACE_FILE, rotando cada TRACE_FILE_MAX_BYTES y
+# conservando TRACE_FILE_BACKUPS copias), "udp" (colector local en TRACE_COLLECTOR) o "file,udp".
+# TRACE_SAMPLE_RATE: fracción de updates que se trazan (0.0 - 1.0).
+TRACE_EXPORT = os.getenv("TRACE_EXPORT", "off")
+TRACE_FILE = os.getenv("TRACE_FILE", "traces.jsonl")
+TRACE_FILE_MAX_BYTES = int(os.getenv("TRACE_FILE_MAX_BYTES", 10 * 1024 * 1024))
+TRACE_FILE_BACKUPS = int(os.getenv("TRACE_FILE_BACKUPS", 5))
+TRACE_COLLECTOR = os.getenv("TRACE_COLLECTOR", "127.0.0.1:4319")
+TRACE_SAMPLE_RATE = float(os.getenv("TRACE_SAMPLE_RATE", 1.0))
+
 
 # --- Configuraciones de Logging ---
 # Nivel de logging para la aplicación. Opciones: DEBUG, INFO, WARNING, ERROR, CRITICAL.
-LOG_LEVEL = os.getenv("LOG_LEVEL", "DEBUG").upper()
+LOG_LEVEL = os.getenv("LOG_LEVEL", "INFO").upper()
 
 
 # --- Validaciones de Configuración Esencial ---
@@ -0,0 +1,193 @@
+# Archivo: chatbot/faq_replica.py
+# Réplica local de las FAQs del backend para responder consultas sin una llamada HTTP por mensaje.
+#
+# Al iniciar el bot se descarga la copia completa (GET /faqs/changes sin `since`) y después una tarea
+# en segundo plano pide sólo los cambios desde la última marca de agua (`watermark`), incluidas
+# las FAQs eliminadas. Las FAQs cambian unas pocas veces por semestre, así que la réplica es pequeña
+# y casi siempre está al día.
+
+import asyncio
+import math
+import re
+import time
+import unicodedata
+from collections import Counter
+from typing import Optional, Dict, Any, List, Callable, Set
+
+import httpx
+
+from chatbot.config import FAQ_REPLICA_SYNC_INTERVAL, FAQ_REPLICA_MAX_STALENESS
+from chatbot.bot_logging import get_logger
+from chatbot import http_client
+
+logger = get_logger("faq_replica")
+
+_TOKEN_RE = re.compile(r"[a-z0-9]+")
+_STEM_LENGTH = 5 # "inscripción", "inscripciones" -> "inscr"; "horario", "horarios" -> "horar"
+_STOPWORDS = frozenset("""
+a al como con cual cuales cuando de del donde el en es esta este hay la las lo los me mi mis para por puedo
+que quiero se si sobre su sus tengo un una uno y yo hola buenas gracias favor necesito saber informacion
+""".split())
+
+# Peso de cada campo de la FAQ al puntuar (la pregunta y las palabras clave son lo más descriptivo).
+_FIELD_WEIGHTS = (("question", 3.0), ("keywords", 3.0), ("category", 1.0), ("answer", 0.5))
+_MAX_FIELD_WEIGHT = max(weight for _, weight in _FIELD_WEIGHTS)
+
+
+def _terms(text: str) -> List[str]:
+    decomposed = unicodedata.normalize("NFKD", (text or "").lower())
+    folded = "".join(ch for ch in decomposed if not unicodedata.combining(ch))
+    return [token[:_STEM_LENGTH] for token in _TOKEN_RE.findall(folded)
+            if token not in _STOPWORDS and len(token) > 1]
+
+
+class FAQReplica:
+    """Copia en memoria de las FAQs con búsqueda por términos ponderada por IDF."""
+
+    def __init__(self, max_staleness: float = FAQ_REPLICA_MAX_STALENESS):
+        self.max_staleness = max_staleness
+        self.watermark: Optional[str] = None
+        self.last_sync: Optional[float] = None # time.monotonic() de la última sincronización correcta
+        self._faqs: Dict[str, Dict[str, Any]] = {}
+        self._faq_terms: Dict[str, Counter] = {} # faq_id -> {término: peso}
+        self._df: Counter = Counter()
+        self._listeners: List[Callable[[Optional[Set[str]]], None]] = []
+
+    def __len__(self) -> int:
+        return len(self._faqs)
+
+    @property
+    def is_fresh(self) -> bool:
+        """True si la réplica se sincronizó hace menos de `max_staleness` segundos."""
+        return self.last_sync is not None and time.monotonic() - self.last_sync <= self.max_staleness
+
+    # --- Mantenimiento ---
+
+    def _remove(self, faq_id: str) -> None:
+        self._faqs.pop(faq_id, None)
+        old_terms = self._faq_terms.pop(faq_id, None)
+        if old_terms:
+            self._df.subtract(old_terms.keys())
+
+    def _upsert(self, faq: Dict[str, Any]) -> None:
+        self._remove(faq["id"])
+        terms = Counter()
+        for field, weight in _FIELD_WEIGHTS:
+            value = faq.get(field)
+            text = " ".join(value) if isinstance(value, list) else value
+            for term in set(_terms(text)):
+                terms[term] = max(terms[term], weight)
+        self._faqs[faq["id"]] = faq
+        self._faq_terms[faq["id"]] = terms
+        self._df.update(terms.keys())
+
+    def add_listener(self, callback: Callable[[Optional[Set[str]]], None]) -> None:
+        """
+        Registra una función que se llama tras aplicar cambios con los IDs de las FAQs creadas,
+        modificadas o eliminadas (None si fue una copia completa). Sirve para invalidar cachés.
+        """
+        self._listeners.append(callback)
+
+    def apply_changes(self, changes: Dict[str, Any]) -> None:
+        """Aplica una respuesta de GET /faqs/changes (idempotente)."""
+        if changes.get("full"):
+            self._faqs.clear()
+            self._faq_terms.clear()
+            self._df.clear()
+        for faq_id in changes.get("deleted_ids", []):
+            self._remove(faq_id)
+        for faq in changes.get("faqs", []):
+            self._upsert(faq)
+        self._df += Counter() # Descarta términos que quedaron con frecuencia 0
+        self.watermark = changes.get("watermark")
+        self.last_sync = time.monotonic()
+        changed_ids = None if changes.get("full") else \
+            set(changes.get("deleted_ids", [])) | {faq["id"] for faq in changes.get("faqs", [])}
+        if changed_ids is None or changed_ids:
+            for callback in self._listeners:
+                callback(changed_ids)
+
+    async def sync(self) -> bool:
+        """Descarga los cambios desde la última marca de agua. Devuelve False si el backend no respondió."""
+        params = {"since": self.watermark} if self.watermark else {}
+        try:
+            response = await http_client.request("GET", "faqs/changes", params=params,
+                                                 timeout=http_client.FAQ_SYNC_TIMEOUT, idempotent=True)
+            response.raise_for_status()
+            changes = response.json()
+        except (httpx.HTTPError, ValueError) as e:
+            logger.warning("FAQ_REPLICA_CUL: No se pudo sincronizar la réplica de FAQs (faqs/changes): %s", e)
+            return False
+        self.apply_changes(changes)
+        logger.info("FAQ_REPLICA_CUL: Réplica sincronizada (%s): %d FAQs actualizadas, %d eliminadas, %d en total.",
+                    "completa" if changes.get("full") else "incremental",
+                    len(changes.get("faqs", [])), len(changes.get("deleted_ids", [])), len(self))
+        return True
+
+    # --- Consulta ---
+
+    def search(self, query: str, subject: Optional[str] = None) -> Optional[Dict[str, Any]]:
+        """
+        Devuelve la FAQ más relevante para la consulta con el formato de `get_faq_from_api`
+        ({"faq_id", "question", "answer", "category", "updated_at"}) más "confidence", o None si
+        ningún término coincide. El `subject` (entidad extraída por el LLM) sólo suma puntos, no filtra.
+
+        "confidence" (0-1) es la parte del peso IDF de los términos de la consulta que la FAQ cubre
+        en su pregunta o palabras clave: 1.0 si todos aparecen ahí; los términos que ninguna FAQ
+        contiene cuentan como los más raros.
+        """
+        message_terms = set(_terms(query))
+        query_terms = Counter({term: 1.0 for term in _terms(query)})
+        for term in _terms(subject or ""):
+            query_terms[term] = max(query_terms[term], 0.5)
+        if not query_terms or not self._faqs:
+            return None
+
+        n_faqs = len(self._faqs)
+        idf = {term: math.log(1 + n_faqs / self._df[term]) for term in query_terms if self._df.get(term)}
+        best_id, best_score = None, 0.0
+        for faq_id, faq_terms in self._faq_terms.items():
+            score = sum(idf[term] * query_weight * faq_terms[term]
+                        for term, query_weight in query_terms.items() if term in idf and term in faq_terms)
+            if score > best_score:
+                best_id, best_score = faq_id, score
+        if best_id is None:
+            return None
+        faq = self._faqs[best_id]
+        best_terms = self._faq_terms[best_id]
+        covered = sum(idf[term] * best_terms[term] for term in message_terms if term in idf and term in best_terms)
+        max_score = sum(idf.get(term, math.log(1 + n_faqs)) * _MAX_FIELD_WEIGHT for term in message_terms)
+        confidence = covered / max_score if max_score else 0.0
+        return {"faq_id": faq["id"], "question": faq["question"], "answer": faq["answer"], "category": faq.get("category"),
+                "updated_at": faq.get("updated_at"), "confidence": round(confidence, 3)}
+
+
+faq_replica = FAQReplica()
+_sync_task: Optional[asyncio.Task] = None
+
+
+async def _sync_loop(interval: float) -> None:
+    while True:
+        await asyncio.sleep(interval)
+        await faq_replica.sync()
+
+
+async def start_faq_replica(interval: float = FAQ_REPLICA_SYNC_INTERVAL) -> None:
+    """Carga la réplica completa y lanza la sincronización periódica (llamar con el event loop del bot en marcha)."""
+    global _sync_task
+    if not await faq_replica.sync():
+        logger.warning("FAQ_REPLICA_CUL: Réplica de FAQs vacía al iniciar; las consultas irán al backend hasta la próxima sincronización.")
+    if interval > 0 and _sync_task is None:
+        _sync_task = asyncio.create_task(_sync_loop(interval), name="faq-replica-sync")
+
+
+async def stop_faq_replica() -> None:
+    """Detiene la sincronización periódica."""
+    global _sync_task
+    if _sync_task is not None:
+        _sync_task.cancel()
+        try:
+            await _sync_task
+        except asyncio.CancelledError:
+            pass
+        _sync_task = None
@@ -2,55 +2,142 @@
 # Maneja mensajes de texto generales, interactuando con el servicio LLM.
 # MODIFICADO PARA EL CHATBOT UNIVERSITARIO CUL (para integrarse con ticket_handler)
 
+import html
+import time
+from collections import deque
+
 from telegram import Update
 from telegram.ext import ContextTypes, MessageHandler, filters, ConversationHandler
-from telegram.constants import ChatAction
+from telegram.constants import ChatAction, ParseMode
 
 from chatbot.llm_service import (
     generate_response,
     classify_intent_and_extract_entities,
+    classify_and_respond,
+    answer_with_faq,
+    record_exchange,
     reset_conversation_history
 )
-from chatbot.bot_logging import logger
+from chatbot.config import LLM_RESPONSE_MODE, FAQ_DIRECT_ANSWER_THRESHOLD
+from chatbot.bot_logging import get_logger
+from chatbot.tracing import trace_update, span
 from chatbot.api_client import get_faq_from_api # create_ticket_api se usará en ticket_handler
+from chatbot.faq_replica import faq_replica
 # Importar el punto de entrada del ConversationHandler de tickets y sus estados
 from .ticket_handler import start_ticket_creation 
 from .conversation_states import ASK_TICKET_DESCRIPTION # Para iniciar el flujo
 
+logger = get_logger("handlers.general")
+
+CONSULT_INTENTS = ["CONSULTA_TRAMITE_ACADEMICO", "CONSULTA_HORARIO", "CONSULTA_PROGRAMA_ACADEMICO", "INFORMACION_GENERAL_CUL"]
+
+
+FAQ_DIRECT_FOLLOW_UP = "¿Te puedo ayudar con algo más? Si necesitas más detalle sobre esto, pregúntame."
+# Si el LLM devuelve una respuesta vacía el usuario recibe esto en lugar de quedarse sin contestación.
+NO_ANSWER_TEXT = "Lo siento, no pude generar una respuesta en este momento. ¿Podrías reformular tu pregunta o intentarlo de nuevo?"
+
+
+class FAQAnswerStats:
+    """
+    Consultas respondidas con una FAQ encontrada: directamente (sin LLM, confianza >= umbral) o
+    generadas por Gemini con la FAQ como contexto. Con la latencia de cada camino (desde que llega
+    el mensaje hasta que se envía la respuesta) se estima el ahorro del atajo.
+    """
+
+    def __init__(self, window: int = 1000):
+        self._latencies_ms = {"direct": deque(maxlen=window), "llm": deque(maxlen=window)}
+        self._counts = {"direct": 0, "llm": 0}
+
+    def record(self, path: str, elapsed_ms: float) -> None:
+        self._counts[path] += 1
+        self._latencies_ms[path].append(elapsed_ms)
+
+    def stats(self) -> dict:
+        total = sum(self._counts.values())
+        means = {path: sum(values) / len(values) if values else None for path, values in self._latencies_ms.items()}
+        saved_ms = means["llm"] - means["direct"] if means["llm"] is not None and means["direct"] is not None else None
+        return {
+            "faq_answers": total,
+            "direct": self._counts["direct"],
+            "via_llm": self._counts["llm"],
+            "short_circuit_ratio": round(self._counts["direct"] / total, 3) if total else None,
+            "latency_ms_mean": {path: round(mean, 1) if mean is not None else None for path, mean in means.items()},
+            "saved_ms_per_direct_answer": round(saved_ms, 1) if saved_ms is not None else None,
+            "saved_seconds_total": round(saved_ms * self._counts["direct"] / 1000, 1) if saved_ms is not None else None,
+        }
+
+
+faq_answer_stats = FAQAnswerStats()
+
+
+def _format_faq_answer(faq: dict) -> str:
+    """Respuesta directa con la FAQ, en HTML de Telegram."""
+    return f"<b>{html.escape(faq['question'] or '')}</b>\n\n{html.escape(faq['answer'])}\n\n{FAQ_DIRECT_FOLLOW_UP}"
+
+
+async def _reply_faq_directly(update: Update, user_id: str, user_message: str, faq: dict, started: float) -> None:
+    """Atajo: la respuesta guardada en la FAQ ya es la que queremos, sin pasar por Gemini."""
+    with span("reply_text", faq_direct=True):
+        await update.message.reply_text(_format_faq_answer(faq), parse_mode=ParseMode.HTML)
+    await record_exchange(user_id, user_message, f"{faq['answer']}\n\n{FAQ_DIRECT_FOLLOW_UP}")
+    faq_answer_stats.record("direct", (time.perf_counter() - started) * 1000)
+
+
+def _faq_subject(entities: dict) -> str | None:
+    """Tema para afinar la búsqueda de FAQs a partir de las entidades extraídas por el LLM."""
+    return entities.get("nombre_tramite") or \
+           entities.get("nombre_asignatura") or \
+           entities.get("nombre_programa") or \
+           entities.get("tema_consulta_general")
+
 async def handle_message(update: Update, context: ContextTypes.DEFAULT_TYPE) -> int | None: # Puede devolver un estado
+    with trace_update(update, "handle_message"): # Duración de cada etapa (TRACE_EXPORT, ver chatbot/tracing.py)
+        return await _handle_message(update, context)
+
+async def _handle_message(update: Update, context: ContextTypes.DEFAULT_TYPE) -> int | None:
     if not update.message or not update.message.text:
         logger.debug("GENERAL_HANDLER_CUL: Mensaje vacío o sin texto recibido, ignorando.")
         return
 
+    started = time.perf_counter()
     user_id = str(update.effective_user.id)
     user_name = update.effective_user.full_name or update.effective_user.username
     user_message = update.message.text.strip()
 
     if not user_message:
-        logger.debug(f"GENERAL_HANDLER_CUL: Mensaje de user_id {user_id} vacío tras strip, ignorando.")
+        logger.debug("GENERAL_HANDLER_CUL: Mensaje de user_id %s vacío tras strip, ignorando.", user_id)
         return
 
-    logger.info(f"GENERAL_HANDLER_CUL: Mensaje de user_id {user_id} ({user_name}): '{user_message}'")
+    logger.info("GENERAL_HANDLER_CUL: Mensaje de user_id %s (%s): '%s'", user_id, user_name, user_message)
     
     try:
-        await context.bot.send_chat_action(chat_id=update.effective_chat.id, action=ChatAction.TYPING)
+        with span("typing_action"):
+            await context.bot.send_chat_action(chat_id=update.effective_chat.id, action=ChatAction.TYPING)
+
+        if LLM_RESPONSE_MODE == "combined": # Una sola llamada al LLM (ver chatbot/llm_service.py)
+            await _respond_combined(update, context, user_id, user_message, started)
+            return None
 
         # Ya no manejamos 'pending_action' aquí para tickets, se delega al ConversationHandler
 
         # 1. Clasificación de Intención y Extracción de Entidades
-        classification_result = await classify_intent_and_extract_entities(user_message)
+        with span("classify_intent") as span_attrs:
+            classification_result = await classify_intent_and_extract_entities(user_message, user_id)
+            if span_attrs is not None:
+                span_attrs["intent"] = classification_result.get("intent", "DESCONOCIDO")
+                span_attrs["source"] = classification_result.get("source", "llm")
         intent = classification_result.get("intent", "DESCONOCIDO")
         entities = classification_result.get("entities", {})
         
-        logger.info(f"GENERAL_HANDLER_CUL: Intención clasificada para '{user_message}': {intent}. Entidades: {entities}")
+        logger.info("GENERAL_HANDLER_CUL: Intención clasificada para '%s': %s. Entidades: %s", user_message, intent, entities)
         if classification_result.get("error"):
-            logger.warning(f"GENERAL_HANDLER_CUL: Error en clasificación: {classification_result.get('error')}. Se usará LLM general.")
+            logger.warning("GENERAL_HANDLER_CUL: Error en clasificación: %s. Se usará LLM general.", classification_result.get('error'))
 
         api_data_for_llm = None
 
         # 2. Lógica RAG (FAQs) o Inicio de Flujo de Ticket
         if intent == "GENERAR_TICKET_HUMANO" and not classification_result.get("error"):
-            logger.info(f"GENERAL_HANDLER_CUL: Intención GENERAR_TICKET_HUMANO detectada para user_id {user_id}.")
+            logger.info("GENERAL_HANDLER_CUL: Intención GENERAR_TICKET_HUMANO detectada para user_id %s.", user_id)
             resumen_solicitud = entities.get("resumen_solicitud_ticket", user_message)
             
             # Guardar la descripción inicial si el LLM la extrajo, para que ticket_handler la use
@@ -95,51 +182,124 @@ async def handle_message(update: Update, context: ContextTypes.DEFAULT_TYPE) ->
             # para que el `/ticket` la recoja.
             if resumen_solicitud:
                  context.user_data['llm_ticket_initial_description'] = resumen_solicitud
-                 logger.info(f"GENERAL_HANDLER_CUL: Descripción '{resumen_solicitud}' guardada para posible uso con /ticket.")
+                 logger.info("GENERAL_HANDLER_CUL: Descripción '%s' guardada para posible uso con /ticket.", resumen_solicitud)
 
 
-        consult_intents = ["CONSULTA_TRAMITE_ACADEMICO", "CONSULTA_HORARIO", "CONSULTA_PROGRAMA_ACADEMICO", "INFORMACION_GENERAL_CUL"]
-        if intent in consult_intents and not classification_result.get("error"):
-            logger.info(f"GENERAL_HANDLER_CUL: Intención de consulta '{intent}'. Buscando en FAQs para: '{user_message}'")
-            await context.bot.send_chat_action(chat_id=update.effective_chat.id, action=ChatAction.TYPING)
+        if intent in CONSULT_INTENTS and not classification_result.get("error"):
+            logger.info("GENERAL_HANDLER_CUL: Intención de consulta '%s'. Buscando en FAQs para: '%s'", intent, user_message)
+            with span("typing_action"):
+                await context.bot.send_chat_action(chat_id=update.effective_chat.id, action=ChatAction.TYPING)
             
             faq_query = user_message
-            faq_subject = entities.get("nombre_tramite") or \
-                          entities.get("nombre_asignatura") or \
-                          entities.get("nombre_programa") or \
-                          entities.get("tema_consulta_general")
+            faq_subject = _faq_subject(entities)
 
-            api_faq_response = await get_faq_from_api(query=faq_query, subject=faq_subject)
+            with span("faq_lookup"):
+                api_faq_response = await get_faq_from_api(query=faq_query, subject=faq_subject)
             
             if api_faq_response and api_faq_response.get("answer"):
-                logger.info(f"GENERAL_HANDLER_CUL: FAQ encontrada para '{user_message}'. ID: {api_faq_response.get('faq_id')}")
+                logger.info("GENERAL_HANDLER_CUL: FAQ encontrada para '%s'. ID: %s. Confianza: %s", user_message,
+                            api_faq_response.get('faq_id'), api_faq_response.get('confidence'))
+                if (api_faq_response.get("confidence") or 0.0) >= FAQ_DIRECT_ANSWER_THRESHOLD:
+                    await _reply_faq_directly(update, user_id, user_message, api_faq_response, started)
+                    return None
                 api_data_for_llm = {"faq_encontrada": api_faq_response}
             elif isinstance(api_faq_response, dict) and api_faq_response.get("info_consulta"):
-                 logger.info(f"GENERAL_HANDLER_CUL: API de FAQ respondió: {api_faq_response.get('info_consulta')}")
+                 logger.info("GENERAL_HANDLER_CUL: API de FAQ respondió: %s", api_faq_response.get('info_consulta'))
 
         # 3. Generación de Respuesta con LLM
-        await context.bot.send_chat_action(chat_id=update.effective_chat.id, action=ChatAction.TYPING)
-        final_llm_response_text = await generate_response(
-            user_id,
-            user_message, # El mensaje original del usuario
-            api_data_context=api_data_for_llm
-        )
+        with span("typing_action"):
+            await context.bot.send_chat_action(chat_id=update.effective_chat.id, action=ChatAction.TYPING)
+        with span("generate_response", with_faq=api_data_for_llm is not None):
+            final_llm_response_text = await generate_response(
+                user_id,
+                user_message, # El mensaje original del usuario
+                api_data_context=api_data_for_llm,
+                intent=intent if not classification_result.get("error") else None
+            )
         
         if final_llm_response_text and final_llm_response_text.strip():
-            await update.message.reply_text(final_llm_response_text)
+            with span("reply_text"):
+                await update.message.reply_text(final_llm_response_text)
+            if api_data_for_llm:
+                faq_answer_stats.record("llm", (time.perf_counter() - started) * 1000)
         else:
-            logger.error(f"GENERAL_HANDLER_CUL: LLM no generó respuesta para '{user_message}' de {user_id}.")
+            logger.error("GENERAL_HANDLER_CUL: LLM no generó respuesta para '%s' de %s.", user_message, user_id)
+            await update.message.reply_text(NO_ANSWER_TEXT)
         return None # No devuelve estado de conversación
 
     except Exception as e:
-        logger.error(f"GENERAL_HANDLER_CUL: Excepción en handle_message para '{user_message}' de {user_id}: {e}", exc_info=True)
+        logger.error("GENERAL_HANDLER_CUL: Excepción en handle_message para '%s' de %s: %s", user_message, user_id, e, exc_info=True)
         try:
             await update.message.reply_text("Lo siento, tuve un inconveniente técnico al procesar tu solicitud. Por favor, intenta de nuevo en un momento.")
         except Exception as e_reply:
-            logger.error(f"GENERAL_HANDLER_CUL: No se pudo enviar mensaje de error a {user_id}: {e_reply}", exc_info=True)
+            logger.error("GENERAL_HANDLER_CUL: No se pudo enviar mensaje de error a %s: %s", user_id, e_reply, exc_info=True)
         return None # No devuelve estado de conversación
     
-    logger.info(f"GENERAL_HANDLER_CUL: Fin handle_message para user_id {user_id}.")
+    logger.info("GENERAL_HANDLER_CUL: Fin handle_message para user_id %s.", user_id)
+
+
+async def _respond_combined(update: Update, context: ContextTypes.DEFAULT_TYPE, user_id: str, user_message: str,
+                            started: float) -> None:
+    """
+    Modo LLM_RESPONSE_MODE=combined: intención, entidades y respuesta en una llamada. La FAQ sólo
+    se busca (con una segunda llamada para responder con ella) si el modelo la pide.
+    Antes de llamar al LLM se aplica el mismo atajo de FAQ directa que en el modo de dos llamadas;
+    como aún no hay intención, sólo se consulta la réplica local (no cuesta una petición al backend).
+    """
+    if faq_replica.is_fresh:
+        with span("faq_replica.search", faqs=len(faq_replica)):
+            direct_faq = faq_replica.search(user_message)
+        if direct_faq and direct_faq["confidence"] >= FAQ_DIRECT_ANSWER_THRESHOLD:
+            logger.info("GENERAL_HANDLER_CUL: FAQ %s respondida directamente para '%s' (confianza %s).",
+                        direct_faq["faq_id"], user_message, direct_faq["confidence"])
+            await _reply_faq_directly(update, user_id, user_message, direct_faq, started)
+            return
+
+    with span("classify_and_respond") as span_attrs:
+        result = await classify_and_respond(user_id, user_message)
+        if span_attrs is not None:
+            span_attrs.update(intent=result["intent"], needs_faq=result["needs_faq"])
+    intent, entities = result["intent"], result["entities"]
+    logger.info("GENERAL_HANDLER_CUL: Intención (modo combinado) para '%s': %s. Entidades: %s. Pide FAQ: %s",
+                user_message, intent, entities, result["needs_faq"])
+
+    if intent == "GENERAR_TICKET_HUMANO" and not result.get("error"):
+        # Igual que en el modo de dos llamadas: la descripción queda guardada para cuando use /ticket.
+        resumen_solicitud = entities.get("resumen_solicitud_ticket", user_message)
+        if resumen_solicitud:
+            context.user_data['llm_ticket_initial_description'] = resumen_solicitud
+            logger.info("GENERAL_HANDLER_CUL: Descripción '%s' guardada para posible uso con /ticket.", resumen_solicitud)
+
+    final_llm_response_text = result["answer"]
+    if result["needs_faq"]:
+        with span("faq_lookup"):
+            api_faq_response = await get_faq_from_api(query=result["faq_query"] or user_message, subject=_faq_subject(entities))
+        if api_faq_response and api_faq_response.get("answer"):
+            logger.info("GENERAL_HANDLER_CUL: FAQ encontrada para '%s'. ID: %s", user_message, api_faq_response.get('faq_id'))
+            faq_context = {"faq_encontrada": api_faq_response}
+        else:
+            faq_context = {"info_consulta": (api_faq_response or {}).get("info_consulta", "No hay datos de FAQs disponibles para esta consulta.")}
+        with span("typing_action"):
+            await context.bot.send_chat_action(chat_id=update.effective_chat.id, action=ChatAction.TYPING)
+        with span("generate_response", with_faq="faq_encontrada" in faq_context):
+            final_llm_response_text = await answer_with_faq(user_id, faq_context)
+
+    if final_llm_response_text and final_llm_response_text.strip():
+        with span("reply_text"):
+            await update.message.reply_text(final_llm_response_text)
+        if result["needs_faq"] and "faq_encontrada" in faq_context:
+            faq_answer_stats.record("llm", (time.perf_counter() - started) * 1000)
+    elif result["needs_faq"] and "faq_encontrada" in faq_context:
+        # La segunda llamada también puede volver vacía (las instrucciones piden `answer` vacío con
+        # `needs_faq`): se responde con la FAQ tal cual.
+        logger.warning("GENERAL_HANDLER_CUL: LLM no generó respuesta con la FAQ %s para '%s' de %s; se envía la FAQ.",
+                       faq_context["faq_encontrada"].get("faq_id"), user_message, user_id)
+        with span("reply_text", faq_direct=True):
+            await update.message.reply_text(_format_faq_answer(faq_context["faq_encontrada"]), parse_mode=ParseMode.HTML)
+        faq_answer_stats.record("direct", (time.perf_counter() - started) * 1000)
+    else:
+        logger.error("GENERAL_HANDLER_CUL: LLM no generó respuesta para '%s' de %s.", user_message, user_id)
+        await update.message.reply_text(NO_ANSWER_TEXT)
 
 
 async def reset_chat_command(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
@@ -148,7 +308,7 @@ async def reset_chat_command(update: Update, context: ContextTypes.DEFAULT_TYPE)
         return
 
     user_id = str(update.effective_user.id)
-    logger.info(f"RESET_CHAT_CUL: Comando /reset_chat de user_id {user_id}.")
+    logger.info("RESET_CHAT_CUL: Comando /reset_chat de user_id %s.", user_id)
 
     if await reset_conversation_history(user_id):
         await update.message.reply_text(
@@ -4,13 +4,15 @@
 from telegram import Update
 from telegram.ext import CallbackContext, CommandHandler 
 from telegram.constants import ParseMode
-from chatbot.bot_logging import logger
+from chatbot.bot_logging import get_logger
 # Importar el punto de entrada del ConversationHandler de tickets
 from .ticket_handler import start_ticket_creation # Importante
 
+logger = get_logger("handlers.start")
+
 async def start(update: Update, context: CallbackContext) -> None:
     user = update.effective_user
-    logger.info(f"Usuario {user.id} ({user.username or user.first_name}) inició el bot CUL con /start o /ayuda.")
+    logger.info("Usuario %s (%s) inició el bot CUL con /start o /ayuda.", user.id, user.username or user.first_name)
     
     welcome_message = (
         f"¡Hola, {user.first_name}! 👋\n\n"
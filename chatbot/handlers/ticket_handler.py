@@ -9,7 +9,8 @@ from telegram.ext import (
     MessageHandler,
     filters
 )
-from chatbot.bot_logging import logger
+from chatbot.bot_logging import get_logger
+from chatbot.tracing import trace_update, span
 from chatbot.api_client import create_ticket_api
 from .conversation_states import (
     ASK_TICKET_DESCRIPTION,
@@ -20,6 +21,8 @@ from .conversation_states import (
 )
 import re # Para validación de email
 
+logger = get_logger("handlers.ticket")
+
 # --- Opciones para Categorías de Tickets ---
 TICKET_CATEGORIES = [
     "Soporte Técnico (Plataformas, Correo, WiFi)",
@@ -39,7 +42,7 @@ async def start_ticket_creation(update: Update, context: ContextTypes.DEFAULT_TY
     Puede ser llamado por el comando /ticket o por el LLM.
     """
     user = update.effective_user
-    logger.info(f"TICKET_HANDLER: Usuario {user.id} ({user.full_name or user.username}) inició creación de ticket.")
+    logger.info("TICKET_HANDLER: Usuario %s (%s) inició creación de ticket.", user.id, user.full_name or user.username)
     
     context.user_data['current_ticket_data'] = {} # Limpiar/iniciar datos para este ticket
 
@@ -47,7 +50,7 @@ async def start_ticket_creation(update: Update, context: ContextTypes.DEFAULT_TY
     pre_extracted_description = context.user_data.pop('llm_ticket_initial_description', None)
 
     if pre_extracted_description:
-        logger.info(f"TICKET_HANDLER: Usando descripción pre-extraída por LLM: '{pre_extracted_description}'")
+        logger.info("TICKET_HANDLER: Usando descripción pre-extraída por LLM: '%s'", pre_extracted_description)
         context.user_data['current_ticket_data']['problem_description'] = pre_extracted_description
         await update.message.reply_text(
             f"Entendido. Has mencionado: \"<i>{pre_extracted_description}</i>\"\n\n"
@@ -74,7 +77,7 @@ async def get_ticket_description(update: Update, context: ContextTypes.DEFAULT_T
         return ASK_TICKET_DESCRIPTION
 
     context.user_data['current_ticket_data']['problem_description'] = description
-    logger.info(f"TICKET_HANDLER: Descripción del ticket: '{description}'")
+    logger.debug("TICKET_HANDLER: Descripción del ticket: '%s'", description)
     
     return await ask_ticket_category(update, context)
 
@@ -107,7 +110,7 @@ async def get_ticket_category(update: Update, context: ContextTypes.DEFAULT_TYPE
         return ASK_TICKET_CATEGORY
 
     context.user_data['current_ticket_data']['category'] = category
-    logger.info(f"TICKET_HANDLER: Categoría del ticket: '{category}'")
+    logger.info("TICKET_HANDLER: Categoría del ticket: '%s'", category)
     
     await update.message.reply_text(
         "Categoría registrada.\n\n"
@@ -127,7 +130,7 @@ async def get_ticket_email(update: Update, context: ContextTypes.DEFAULT_TYPE) -
         return ASK_TICKET_EMAIL
 
     context.user_data['current_ticket_data']['user_email'] = email
-    logger.info(f"TICKET_HANDLER: Email del ticket: '{email}'")
+    logger.debug("TICKET_HANDLER: Email del ticket: '%s'", email)
 
     # Teclado para ID de estudiante (opcional)
     student_id_keyboard = [["Omitir este paso"]]
@@ -149,7 +152,7 @@ async def get_ticket_student_id(update: Update, context: ContextTypes.DEFAULT_TY
     else:
         # Podrías añadir una validación más específica para el formato del ID si es necesario
         context.user_data['current_ticket_data']['student_id'] = student_id_input
-        logger.info(f"TICKET_HANDLER: ID de estudiante/documento: '{student_id_input}'")
+        logger.debug("TICKET_HANDLER: ID de estudiante/documento: '%s'", student_id_input)
     
     return await show_ticket_summary_and_confirm(update, context)
 
@@ -181,6 +184,10 @@ async def show_ticket_summary_and_confirm(update: Update, context: ContextTypes.
 
 async def process_ticket_confirmation(update: Update, context: ContextTypes.DEFAULT_TYPE) -> int:
     """Procesa la confirmación final y envía el ticket a la API."""
+    with trace_update(update, "process_ticket_confirmation"):
+        return await _process_ticket_confirmation(update, context)
+
+async def _process_ticket_confirmation(update: Update, context: ContextTypes.DEFAULT_TYPE) -> int:
     user_choice = update.message.text
     user = update.effective_user
 
@@ -205,10 +212,11 @@ async def process_ticket_confirmation(update: Update, context: ContextTypes.DEFA
     # Si tu API espera student_id, asegúrate de que el modelo Pydantic en la API lo incluya.
     # Por ahora, lo omito del payload principal si la API no lo espera.
 
-    logger.info(f"TICKET_HANDLER: Enviando payload de ticket a la API: {api_payload}")
+    logger.debug("TICKET_HANDLER: Enviando payload de ticket a la API: %s", api_payload)
     await update.message.reply_text("Procesando tu solicitud de ticket...", reply_markup=ReplyKeyboardRemove())
     
-    api_response = await create_ticket_api(api_payload)
+    with span("create_ticket"):
+        api_response = await create_ticket_api(api_payload)
 
     if api_response and api_response.get("success"): # Asumiendo que tu API devuelve 'success': True
         ticket_id_api = api_response.get("ticket_id", "N/A")
@@ -226,7 +234,7 @@ async def process_ticket_confirmation(update: Update, context: ContextTypes.DEFA
              error_detail = str(api_response.get("error"))
 
         await update.message.reply_text(f"Hubo un problema al enviar tu ticket: <i>{error_detail}</i>\nPor favor, intenta de nuevo más tarde o contacta directamente a la universidad.")
-        logger.error(f"TICKET_HANDLER: Error al enviar ticket a API. Payload: {api_payload}. Respuesta API: {api_response}")
+        logger.error("TICKET_HANDLER: Error al enviar ticket a API. Payload: %s. Respuesta API: %s", api_payload, api_response)
 
     context.user_data.pop('current_ticket_data', None)
     return ConversationHandler.END
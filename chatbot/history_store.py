@@ -0,0 +1,196 @@
+# Archivo: chatbot/history_store.py
+# Dónde se guarda el historial de las conversaciones con Gemini (LLM_HISTORY_BACKEND).
+#
+# Las ChatSession del SDK viven en la memoria del proceso (chatbot/session_store.py), así que con
+# ellas solas sólo puede correr un bot y un reinicio borra todas las conversaciones. Aquí se guarda
+# una copia compacta de cada historial (lista de [rol, texto]) con un número de versión:
+# - "memory": en un dict del proceso (comportamiento de siempre, un solo worker);
+# - "sqlite": en un archivo SQLite en modo WAL (LLM_HISTORY_SQLITE_PATH) que pueden compartir varios
+#   workers de la misma máquina y que sobrevive a los reinicios. Cada operación es una consulta
+#   por clave primaria (< 1 ms en disco local), pero una escritura puede esperar hasta
+#   busy_timeout a otro worker: SessionStore las ejecuta en un hilo propio, fuera del event loop.
+#   El archivo debe estar en disco local: WAL no funciona sobre sistemas de archivos de red.
+#
+# Cuando la versión guardada no coincide con la de la sesión en memoria (otro worker respondió al
+# usuario, o el proceso se reinició), la sesión se reconstruye desde el historial guardado en el
+# siguiente mensaje del usuario. `save` es una escritura condicional (compare-and-set sobre la
+# versión): si otro worker guardó entre medias no se pisa su turno, y quien llama recarga y fusiona.
+
+import json
+import os
+import sqlite3
+import time
+from typing import Any, Dict, List, Optional, Tuple
+
+from chatbot.bot_logging import get_logger
+
+logger = get_logger("history_store")
+
+Records = List[List[str]] # [[rol, texto], ...]
+
+
+def history_records(history: List[Any]) -> Records:
+    """Historial de una ChatSession (dicts u objetos Content del SDK) como registros [rol, texto]."""
+    records = []
+    for content in history:
+        if isinstance(content, dict):
+            role, parts = content.get("role", "user"), content.get("parts", [])
+        else:
+            role, parts = getattr(content, "role", "user"), getattr(content, "parts", [])
+        texts = [part if isinstance(part, str) else part.get("text") if isinstance(part, dict) else getattr(part, "text", None)
+                 for part in parts]
+        records.append([role, "\n".join(text for text in texts if text)])
+    return records
+
+
+def records_to_history(records: Records) -> List[Dict[str, Any]]:
+    """Registros [rol, texto] como historial para `start_chat(history=...)`."""
+    return [{"role": role, "parts": [{"text": text}]} for role, text in records]
+
+
+class MemoryHistoryStore:
+    """Historiales en un dict del proceso. Sólo sirve para un worker y se pierde al reiniciar."""
+
+    persistent = False
+
+    def __init__(self):
+        self._conversations: Dict[str, Tuple[int, float, Records]] = {} # user_id -> (versión, actualizado, registros)
+        self._loads = 0
+        self._saves = 0
+        self._conflicts = 0
+
+    def load(self, user_id: str, max_age: float, known_version: Optional[int] = None) -> Optional[Tuple[int, Optional[Records]]]:
+        """
+        (versión, registros) del historial del usuario; registros None si la versión es `known_version`
+        (la sesión en memoria está al día). None si no hay historial o lleva más de `max_age` segundos
+        sin cambios (0 = sin límite).
+        """
+        conversation = self._conversations.get(user_id)
+        if conversation is None:
+            return None
+        version, updated_at, records = conversation
+        if max_age > 0 and time.time() - updated_at > max_age:
+            del self._conversations[user_id]
+            return None
+        if version == known_version:
+            return version, None
+        self._loads += 1
+        return version, list(records)
+
+    def save(self, user_id: str, records: Records, known_version: Optional[int] = None) -> Optional[int]:
+        """
+        Reemplaza el historial del usuario si la versión guardada sigue siendo `known_version` (None:
+        no había historial). Devuelve la nueva versión, o None si otro lo cambió antes (no se guarda).
+        """
+        current = self._conversations.get(user_id)
+        if (current[0] if current else None) != known_version:
+            self._conflicts += 1
+            return None
+        version = (known_version or 0) + 1
+        self._conversations[user_id] = (version, time.time(), records)
+        self._saves += 1
+        return version
+
+    def delete(self, user_id: str) -> bool:
+        return self._conversations.pop(user_id, None) is not None
+
+    def purge(self, max_age: float) -> int:
+        """Elimina los historiales sin cambios en `max_age` segundos; devuelve cuántos."""
+        if max_age <= 0:
+            return 0
+        limit = time.time() - max_age
+        expired = [user_id for user_id, (_, updated_at, _) in self._conversations.items() if updated_at < limit]
+        for user_id in expired:
+            del self._conversations[user_id]
+        return len(expired)
+
+    def close(self) -> None:
+        pass
+
+    def stats(self) -> Dict[str, Any]:
+        return {"backend": "memory", "conversations": len(self._conversations), "loads": self._loads, "saves": self._saves,
+                "conflicts": self._conflicts}
+
+
+class SQLiteHistoryStore:
+    """Historiales en un archivo SQLite (WAL) compartido por los workers de la máquina; sobrevive a reinicios."""
+
+    persistent = True
+
+    def __init__(self, path: str):
+        self.path = path
+        self._db = sqlite3.connect(path, isolation_level=None, check_same_thread=False) # Autocommit
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute("PRAGMA synchronous=NORMAL") # En WAL no pierde consistencia, sólo (quizá) el último turno si cae la máquina
+        self._db.execute("PRAGMA busy_timeout=5000") # Otro worker escribiendo a la vez
+        self._db.execute("""
+            CREATE TABLE IF NOT EXISTS conversations (
+                user_id TEXT PRIMARY KEY,
+                version INTEGER NOT NULL,
+                updated_at REAL NOT NULL,
+                history TEXT NOT NULL
+            )""")
+        self._db.execute("CREATE INDEX IF NOT EXISTS conversations_updated_at ON conversations (updated_at)")
+        self._loads = 0
+        self._saves = 0
+        self._conflicts = 0
+        logger.info("HISTORY_STORE_CUL: Historial de conversaciones en SQLite (%s).", path)
+
+    def load(self, user_id: str, max_age: float, known_version: Optional[int] = None) -> Optional[Tuple[int, Optional[Records]]]:
+        """Igual que `MemoryHistoryStore.load`; el historial sólo se lee si cambió la versión."""
+        row = self._db.execute(
+            "SELECT version, updated_at, CASE WHEN version IS ? THEN NULL ELSE history END FROM conversations WHERE user_id = ?",
+            (known_version, user_id)).fetchone()
+        if row is None:
+            return None
+        version, updated_at, history = row
+        if max_age > 0 and time.time() - updated_at > max_age:
+            self.delete(user_id)
+            return None
+        if history is None:
+            return version, None
+        self._loads += 1
+        return version, json.loads(history)
+
+    def save(self, user_id: str, records: Records, known_version: Optional[int] = None) -> Optional[int]:
+        """Igual que `MemoryHistoryStore.save`: una sola sentencia condicionada a la versión, atómica entre workers."""
+        history = json.dumps(records, ensure_ascii=False, separators=(",", ":"))
+        if known_version is None:
+            cursor = self._db.execute(
+                "INSERT INTO conversations (user_id, version, updated_at, history) VALUES (?, 1, ?, ?) "
+                "ON CONFLICT (user_id) DO NOTHING", (user_id, time.time(), history))
+        else:
+            cursor = self._db.execute(
+                "UPDATE conversations SET version = version + 1, updated_at = ?, history = ? WHERE user_id = ? AND version = ?",
+                (time.time(), history, user_id, known_version))
+        if cursor.rowcount == 0:
+            self._conflicts += 1
+            return None
+        self._saves += 1
+        return (known_version or 0) + 1
+
+    def delete(self, user_id: str) -> bool:
+        return self._db.execute("DELETE FROM conversations WHERE user_id = ?", (user_id,)).rowcount > 0
+
+    def purge(self, max_age: float) -> int:
+        if max_age <= 0:
+            return 0
+        return self._db.execute("DELETE FROM conversations WHERE updated_at < ?", (time.time() - max_age,)).rowcount
+
+    def close(self) -> None:
+        self._db.close()
+
+    def stats(self) -> Dict[str, Any]:
+        conversations = self._db.execute("SELECT COUNT(*) FROM conversations").fetchone()[0]
+        size = sum(os.path.getsize(self.path + suffix) for suffix in ("", "-wal") if os.path.exists(self.path + suffix))
+        return {"backend": "sqlite", "path": self.path, "conversations": conversations, "file_bytes": size,
+                "loads": self._loads, "saves": self._saves, "conflicts": self._conflicts}
+
+
+def make_history_store(backend: str, sqlite_path: str):
+    """Crea el almacén indicado en LLM_HISTORY_BACKEND ("memory" o "sqlite")."""
+    if backend == "sqlite":
+        return SQLiteHistoryStore(sqlite_path)
+    if backend != "memory":
+        logger.warning("HISTORY_STORE_CUL: LLM_HISTORY_BACKEND='%s' no reconocido, se usa 'memory'.", backend)
+    return MemoryHistoryStore()
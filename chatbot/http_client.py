@@ -0,0 +1,138 @@
+# Archivo: chatbot/http_client.py
+# Cliente HTTP compartido para hablar con el backend CUL.
+#
+# Un único `httpx.AsyncClient` de larga vida para todo el bot (api_client y la réplica de FAQs):
+# las conexiones TCP quedan abiertas (keep-alive) y se reutilizan entre mensajes en lugar de abrir
+# una por llamada. Se crea al iniciar la Application de PTB (post_init) y se cierra al apagarla
+# (post_shutdown).
+#
+# `request()` añade timeouts por endpoint y reintentos acotados con backoff exponencial con jitter:
+# - llamadas idempotentes (GET): ante errores de red, timeouts y 502/503/504;
+# - llamadas no idempotentes (POST): sólo si la conexión no llegó a establecerse, porque entonces
+#   el backend no recibió nada y reintentar no puede duplicar el ticket.
+#
+# `stats()` cuenta peticiones, conexiones nuevas vs. reutilizadas, reintentos y fallos; se publican
+# en el log al apagar el bot y como atributos de los spans de tracing.
+
+import asyncio
+import random
+import time
+from typing import Any, Dict, Optional
+
+import httpx
+
+from chatbot.config import (
+    API_BASE_URL,
+    BACKEND_HTTP_MAX_CONNECTIONS,
+    BACKEND_HTTP_MAX_KEEPALIVE,
+    BACKEND_HTTP_KEEPALIVE_EXPIRY,
+    BACKEND_HTTP_RETRIES,
+    BACKEND_HTTP_BACKOFF,
+)
+from chatbot.bot_logging import get_logger
+
+logger = get_logger("http_client")
+
+# Timeouts por endpoint: las consultas que bloquean una respuesta al usuario fallan rápido;
+# la sincronización de la réplica corre en segundo plano y puede esperar más.
+FAQ_SEARCH_TIMEOUT = httpx.Timeout(5.0, connect=2.0)
+TICKET_CREATE_TIMEOUT = httpx.Timeout(15.0, connect=3.0)
+FAQ_SYNC_TIMEOUT = httpx.Timeout(15.0, connect=5.0)
+
+RETRYABLE_STATUS = frozenset({502, 503, 504})
+# Errores en los que la petición no salió del cliente: se pueden reintentar aunque no sea idempotente.
+_NOT_SENT_ERRORS = (httpx.ConnectError, httpx.ConnectTimeout, httpx.PoolTimeout)
+
+_client: Optional[httpx.AsyncClient] = None
+_stats = {"requests": 0, "new_connections": 0, "retries": 0, "failures": 0}
+
+
+def _build_client(transport: Optional[httpx.AsyncBaseTransport] = None) -> httpx.AsyncClient:
+    limits = httpx.Limits(max_connections=BACKEND_HTTP_MAX_CONNECTIONS,
+                          max_keepalive_connections=BACKEND_HTTP_MAX_KEEPALIVE,
+                          keepalive_expiry=BACKEND_HTTP_KEEPALIVE_EXPIRY)
+    return httpx.AsyncClient(base_url=API_BASE_URL.rstrip("/") + "/", limits=limits, timeout=FAQ_SYNC_TIMEOUT,
+                             headers={"User-Agent": "cul-chatbot"}, transport=transport)
+
+
+async def start_http_client(transport: Optional[httpx.AsyncBaseTransport] = None) -> None:
+    """Crea el cliente compartido. `transport` permite sustituir la red (p. ej. el arnés de replay)."""
+    global _client
+    await stop_http_client()
+    _client = _build_client(transport)
+    logger.info("HTTP_CLIENT_CUL: Cliente del backend listo (%s, máx. %d conexiones, %d en keep-alive).",
+                API_BASE_URL, BACKEND_HTTP_MAX_CONNECTIONS, BACKEND_HTTP_MAX_KEEPALIVE)
+
+
+async def stop_http_client() -> None:
+    """Cierra las conexiones abiertas y publica las estadísticas de reutilización."""
+    global _client
+    if _client is not None:
+        client, _client = _client, None
+        await client.aclose()
+        logger.info("HTTP_CLIENT_CUL: Cliente del backend cerrado. Estadísticas: %s", stats())
+
+
+def get_http_client() -> httpx.AsyncClient:
+    """El cliente compartido; si no se inició (scripts, pruebas manuales) se crea en el primer uso."""
+    global _client
+    if _client is None:
+        _client = _build_client()
+    return _client
+
+
+def stats() -> Dict[str, Any]:
+    """Peticiones enviadas, conexiones TCP nuevas y reutilizadas, reintentos y fallos definitivos."""
+    reused = max(0, _stats["requests"] - _stats["new_connections"])
+    return {**_stats, "reused_connections": reused,
+            "reuse_ratio": round(reused / _stats["requests"], 3) if _stats["requests"] else None}
+
+
+def _backoff_delay(attempt: int) -> float:
+    """Backoff exponencial con jitter completo: uniforme en [0, base * 2^intento]."""
+    return random.uniform(0, BACKEND_HTTP_BACKOFF * (2 ** attempt))
+
+
+async def request(method: str, path: str, *, timeout: httpx.Timeout, idempotent: bool,
+                  span_attrs: Optional[Dict[str, Any]] = None, **kwargs: Any) -> httpx.Response:
+    """
+    Envía una petición al backend con el cliente compartido (`path` relativo a API_BASE_URL).
+    Devuelve la respuesta (sin lanzar por el código de estado); lanza `httpx.RequestError` si
+    no hubo respuesta tras los reintentos. `span_attrs` recibe intentos y si la conexión fue nueva.
+    """
+    client = get_http_client()
+    new_connection = False
+
+    async def trace(event_name: str, info: Dict[str, Any]) -> None:
+        nonlocal new_connection
+        if event_name == "connection.connect_tcp.complete":
+            new_connection = True
+            _stats["new_connections"] += 1
+
+    attempt = 0
+    while True:
+        start = time.perf_counter()
+        _stats["requests"] += 1
+        try:
+            response = await client.request(method, path.lstrip("/"), timeout=timeout,
+                                            extensions={"trace": trace}, **kwargs)
+        except httpx.RequestError as e:
+            retryable = idempotent or isinstance(e, _NOT_SENT_ERRORS)
+            if not retryable or attempt >= BACKEND_HTTP_RETRIES:
+                _stats["failures"] += 1
+                if span_attrs is not None:
+                    span_attrs.update(attempts=attempt + 1, new_connection=new_connection)
+                raise
+            logger.warning("HTTP_CLIENT_CUL: %s %s falló tras %.0f ms (%s); reintento %d de %d.", method, path,
+                           (time.perf_counter() - start) * 1000, type(e).__name__, attempt + 1, BACKEND_HTTP_RETRIES)
+        else:
+            if not (idempotent and response.status_code in RETRYABLE_STATUS and attempt < BACKEND_HTTP_RETRIES):
+                if span_attrs is not None:
+                    span_attrs.update(attempts=attempt + 1, new_connection=new_connection, status=response.status_code)
+                return response
+            logger.warning("HTTP_CLIENT_CUL: %s %s respondió %d; reintento %d de %d.", method, path,
+                           response.status_code, attempt + 1, BACKEND_HTTP_RETRIES)
+            await response.aclose()
+        _stats["retries"] += 1
+        await asyncio.sleep(_backoff_delay(attempt))
+        attempt += 1
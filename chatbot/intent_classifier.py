@@ -0,0 +1,346 @@
+# Archivo: chatbot/intent_classifier.py
+# Clasificador local de intenciones, delante del clasificador con Gemini.
+#
+# "hola", "gracias", "sí", "cancelar" o "quiero hablar con una persona" no necesitan un prompt de
+# cientos de tokens ni una ida y vuelta a Gemini. Dos etapas locales responden en microsegundos:
+# 1. Reglas: expresiones sobre el mensaje normalizado (minúsculas, sin tildes ni signos). Las de
+#    saludo, despedida, afirmación, negación y cancelación exigen que el mensaje sea SÓLO eso
+#    ("hola, ¿cómo me inscribo?" sigue yendo al LLM).
+# 2. Modelo lineal (regresión logística multinomial sobre palabras y bigramas) entrenado offline con
+#    las clasificaciones que ya hizo Gemini (INTENT_EXAMPLES_FILE). Sólo responde por las intenciones
+#    de INTENT_FAST_PATH_INTENTS y con probabilidad >= INTENT_LOCAL_THRESHOLD.
+# Si ninguna etapa está segura, se pregunta a Gemini como siempre. `stats()` cuenta cuántas
+# clasificaciones resolvió cada camino.
+#
+# Entrenar y evaluar (desde la raíz del repositorio):
+#   python -m chatbot.intent_classifier train intent_examples.jsonl [más.jsonl ...] --output intent_model.json
+#   python -m chatbot.intent_classifier evaluate intent_examples.jsonl --model intent_model.json
+
+import argparse
+import hashlib
+import json
+import logging
+import logging.handlers
+import math
+import os
+import queue
+import random
+import re
+import sys
+import unicodedata
+from collections import Counter
+from datetime import datetime, timezone
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from chatbot.config import INTENT_FAST_PATH_INTENTS, INTENT_LOCAL_THRESHOLD, INTENT_MODEL_PATH
+from chatbot.bot_logging import get_logger
+
+logger = get_logger("intent_classifier")
+
+_WORD_RE = re.compile(r"[a-z0-9]+")
+
+# --- Reglas ---
+
+_GREETING = r"(hola+|holi|hey|saludos|buenas|buen dia|buenos dias|buenas tardes|buenas noches|que tal|como estas|como esta|como vas)"
+_FULL_MESSAGE_RULES: List[Tuple[str, "re.Pattern[str]"]] = [
+    ("SALUDO", re.compile(rf"^{_GREETING}( {_GREETING})*( (asistente|bot|cul))?$")),
+    ("DESPEDIDA", re.compile(r"^((ok|listo|vale|perfecto) )?((muchas |mil )?gracias( (por todo|por la ayuda|por la informacion|muy amable))?"
+                             r"|chao|adios|hasta luego|hasta pronto|nos vemos|bye|eso es todo|eso era todo)( gracias)?$")),
+    ("AFIRMACION", re.compile(r"^(si+|claro|claro que si|dale|de acuerdo|ok|okay|vale|listo|perfecto|correcto|exacto|asi es)( por favor)?$")),
+    ("NEGACION", re.compile(r"^(no|nop|nope|no gracias|para nada|todavia no|aun no|no por ahora|no por el momento)$")),
+    ("CANCELAR_ACCION", re.compile(r"^(cancelar|cancela|cancelalo|olvidalo|olvida eso|detente|salir|ya no|mejor no)$")),
+]
+_TICKET_RULES = [
+    re.compile(r"\b(hablar|comunicarme|contactar|conversar)\b.*\b(persona|humano|asesor|asesora|agente|funcionario|alguien)\b"),
+    re.compile(r"\b(crear|generar|abrir|poner|radicar|levantar)\b.*\bticket\b"),
+    re.compile(r"\batencion (humana|personalizada)\b"),
+]
+
+
+def normalize(text: str) -> str:
+    """Minúsculas, sin tildes y sin signos: "¡Hola! ¿Qué tal?" -> "hola que tal"."""
+    decomposed = unicodedata.normalize("NFKD", (text or "").lower())
+    folded = "".join(ch for ch in decomposed if not unicodedata.combining(ch))
+    return " ".join(_WORD_RE.findall(folded))
+
+
+def classify_by_rules(normalized: str) -> Optional[str]:
+    for intent, pattern in _FULL_MESSAGE_RULES:
+        if pattern.match(normalized):
+            return intent
+    if any(pattern.search(normalized) for pattern in _TICKET_RULES):
+        return "GENERAR_TICKET_HUMANO"
+    return None
+
+
+# --- Modelo lineal ---
+
+def _features(normalized: str) -> List[str]:
+    words = normalized.split()
+    features = [f"w:{word}" for word in words]
+    features += [f"b:{first}_{second}" for first, second in zip(words, words[1:])]
+    features.append(f"len:{min(len(words), 8)}") # Los mensajes cortos suelen ser saludos, sí/no...
+    return features
+
+
+class LinearIntentModel:
+    """Regresión logística multinomial (softmax) con pesos dispersos: {rasgo: {intención: peso}}."""
+
+    def __init__(self, classes: List[str], bias: Dict[str, float], weights: Dict[str, Dict[str, float]],
+                 trained_on: int = 0):
+        self.classes = classes
+        self.bias = bias
+        self.weights = weights
+        self.trained_on = trained_on
+
+    def predict(self, normalized: str) -> Tuple[str, float]:
+        """Intención más probable y su probabilidad."""
+        features = _features(normalized)
+        scale = 1.0 / math.sqrt(len(features))
+        scores = dict(self.bias)
+        for feature in features:
+            for intent, weight in self.weights.get(feature, {}).items():
+                scores[intent] += weight * scale
+        top = max(scores.values())
+        exp_scores = {intent: math.exp(score - top) for intent, score in scores.items()}
+        total = sum(exp_scores.values())
+        best = max(exp_scores, key=exp_scores.get)
+        return best, exp_scores[best] / total
+
+    @classmethod
+    def train(cls, examples: List[Tuple[str, str]], epochs: int = 15, learning_rate: float = 0.5,
+              l2: float = 1e-4, seed: int = 13) -> "LinearIntentModel":
+        """SGD sobre (texto normalizado, intención). Pensado para miles de ejemplos, en Python puro."""
+        classes = sorted({intent for _, intent in examples})
+        model = cls(classes, {intent: 0.0 for intent in classes}, {}, trained_on=len(examples))
+        rng = random.Random(seed)
+        samples = [(_features(text), intent) for text, intent in examples]
+        for epoch in range(epochs):
+            rng.shuffle(samples)
+            rate = learning_rate / (1 + epoch * 0.5)
+            for features, label in samples:
+                scale = 1.0 / math.sqrt(len(features))
+                scores = dict(model.bias)
+                for feature in features:
+                    for intent, weight in model.weights.get(feature, {}).items():
+                        scores[intent] += weight * scale
+                top = max(scores.values())
+                exp_scores = {intent: math.exp(score - top) for intent, score in scores.items()}
+                total = sum(exp_scores.values())
+                for intent in classes:
+                    gradient = exp_scores[intent] / total - (intent == label)
+                    if abs(gradient) < 1e-4:
+                        continue
+                    model.bias[intent] -= rate * gradient
+                    for feature in features:
+                        feature_weights = model.weights.setdefault(feature, {})
+                        weight = feature_weights.get(intent, 0.0)
+                        feature_weights[intent] = weight - rate * (gradient * scale + l2 * weight)
+        # Se descartan los pesos despreciables para que el archivo y la predicción sean ligeros.
+        model.weights = {feature: {intent: round(weight, 4) for intent, weight in per_intent.items() if abs(weight) >= 1e-3}
+                         for feature, per_intent in model.weights.items()}
+        model.weights = {feature: per_intent for feature, per_intent in model.weights.items() if per_intent}
+        return model
+
+    def save(self, path: str) -> None:
+        with open(path, "w", encoding="utf-8") as model_file:
+            json.dump({"version": 1, "created_at": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+                       "trained_on": self.trained_on, "classes": self.classes, "bias": self.bias,
+                       "weights": self.weights}, model_file, ensure_ascii=False)
+
+    @classmethod
+    def load(cls, path: str) -> "LinearIntentModel":
+        with open(path, encoding="utf-8") as model_file:
+            data = json.load(model_file)
+        return cls(data["classes"], data["bias"], data["weights"], data.get("trained_on", 0))
+
+
+# --- Clasificador ---
+
+class LocalIntentClassifier:
+    def __init__(self, fast_path_intents: Iterable[str], threshold: float, model: Optional[LinearIntentModel] = None):
+        self.fast_path_intents = frozenset(fast_path_intents)
+        self.threshold = threshold
+        self.model = model
+        self._paths: Counter = Counter()
+        self._intents_by_path: Dict[str, Counter] = {"rules": Counter(), "model": Counter(), "cache": Counter(), "llm": Counter()}
+
+    def classify(self, user_message: str) -> Optional[dict]:
+        """
+        {"intent", "entities", "source", "confidence"} si una etapa local está segura; None si hay
+        que preguntar al LLM (en ese caso llamar después a `record_llm_result`).
+        """
+        normalized = normalize(user_message)
+        if not normalized:
+            return None
+        intent = classify_by_rules(normalized)
+        source, confidence = "rules", 1.0
+        if intent is None and self.model is not None:
+            intent, confidence = self.model.predict(normalized)
+            source = "model"
+            if intent not in self.fast_path_intents or confidence < self.threshold:
+                return None
+        if intent is None or intent not in self.fast_path_intents:
+            return None
+        self._paths[source] += 1
+        self._intents_by_path[source][intent] += 1
+        entities = {"resumen_solicitud_ticket": user_message.strip()} if intent == "GENERAR_TICKET_HUMANO" else {}
+        return {"intent": intent, "entities": entities, "source": source, "confidence": round(confidence, 3)}
+
+    def record_cache_hit(self, intent: str) -> None:
+        """Cuenta una clasificación servida por la caché de intenciones (llm_service.intent_cache)."""
+        self._paths["cache"] += 1
+        self._intents_by_path["cache"][intent] += 1
+
+    def record_llm_result(self, user_message: str, intent: str) -> None:
+        """Cuenta la clasificación hecha por Gemini y la guarda como ejemplo de entrenamiento."""
+        self._paths["llm"] += 1
+        self._intents_by_path["llm"][intent] += 1
+        if _examples_writer is not None:
+            _examples_writer.write(user_message, intent)
+
+    def stats(self) -> Dict[str, object]:
+        total = sum(self._paths.values())
+        return {
+            "total": total,
+            "paths": dict(self._paths),
+            "local_ratio": round((total - self._paths["llm"]) / total, 3) if total else None,
+            "intents_by_path": {path: dict(counts) for path, counts in self._intents_by_path.items() if counts},
+            "model_loaded": self.model is not None,
+        }
+
+
+class _ExamplesWriter:
+    """Añade {"text", "intent"} a un JSONL rotativo desde un hilo aparte (cola acotada, nunca espera)."""
+
+    def __init__(self, path: str):
+        handler = logging.handlers.RotatingFileHandler(path, maxBytes=20 * 1024 * 1024, backupCount=3,
+                                                       encoding="utf-8", delay=True)
+        handler.setFormatter(logging.Formatter("%(message)s"))
+        self._queue: queue.Queue = queue.Queue(maxsize=10000)
+        self._listener = logging.handlers.QueueListener(self._queue, handler)
+        self._handler = handler
+        self._listener.start()
+
+    def write(self, text: str, intent: str) -> None:
+        line = json.dumps({"text": text, "intent": intent}, ensure_ascii=False)
+        try:
+            self._queue.put_nowait(logging.makeLogRecord({"msg": line}))
+        except queue.Full:
+            pass
+
+    def stop(self) -> None:
+        self._listener.stop()
+        self._handler.close()
+
+
+_examples_writer: Optional[_ExamplesWriter] = None
+
+
+def _load_default_classifier() -> LocalIntentClassifier:
+    model = None
+    if INTENT_MODEL_PATH and os.path.exists(INTENT_MODEL_PATH):
+        try:
+            model = LinearIntentModel.load(INTENT_MODEL_PATH)
+            logger.info("INTENT_CUL: Modelo local de intenciones cargado (%s, %d ejemplos, %d rasgos).",
+                        INTENT_MODEL_PATH, model.trained_on, len(model.weights))
+        except (OSError, ValueError, KeyError) as e:
+            logger.warning("INTENT_CUL: No se pudo cargar el modelo de intenciones %s: %s. Sólo se usarán reglas.", INTENT_MODEL_PATH, e)
+    return LocalIntentClassifier(INTENT_FAST_PATH_INTENTS, INTENT_LOCAL_THRESHOLD, model)
+
+
+def start_examples_log(path: str) -> None:
+    """Empieza a guardar las clasificaciones de Gemini en `path` para reentrenar el modelo local."""
+    global _examples_writer
+    stop_examples_log()
+    if path:
+        _examples_writer = _ExamplesWriter(path)
+        logger.info("INTENT_CUL: Guardando clasificaciones de Gemini en %s para entrenar el modelo local.", path)
+
+
+def stop_examples_log() -> None:
+    """Escribe los ejemplos pendientes y registra cuántas clasificaciones resolvió cada camino."""
+    global _examples_writer
+    if _examples_writer is not None:
+        _examples_writer.stop()
+        _examples_writer = None
+    logger.info("INTENT_CUL: Clasificaciones por camino.", extra={"intent_paths": local_classifier.stats()})
+
+
+# --- Entrenamiento y evaluación (CLI) ---
+
+def read_examples(paths: Iterable[str]) -> List[Tuple[str, str]]:
+    """(texto normalizado, intención) de los JSONL de ejemplos; los duplicados se quedan con la última etiqueta."""
+    latest: Dict[str, str] = {}
+    for path in paths:
+        with open(path, encoding="utf-8") as examples_file:
+            for line in examples_file:
+                if line.strip():
+                    example = json.loads(line)
+                    normalized = normalize(example["text"])
+                    if normalized and example.get("intent"):
+                        latest[normalized] = example["intent"]
+    return sorted(latest.items())
+
+
+def _is_holdout(text: str, fraction: float) -> bool:
+    return int(hashlib.md5(text.encode("utf-8")).hexdigest()[:8], 16) / 0xFFFFFFFF < fraction
+
+
+def evaluate(model: LinearIntentModel, examples: List[Tuple[str, str]], fast_path_intents: Iterable[str]) -> List[Dict[str, float]]:
+    """Para varios umbrales: qué fracción resolvería el camino local y con qué precisión."""
+    fast = frozenset(fast_path_intents)
+    predictions = [(model.predict(text), label) for text, label in examples]
+    rows = []
+    for threshold in (0.5, 0.6, 0.7, 0.8, 0.85, 0.9, 0.95):
+        answered = [(intent, label) for (intent, probability), label in predictions
+                    if intent in fast and probability >= threshold]
+        correct = sum(intent == label for intent, label in answered)
+        rows.append({"threshold": threshold, "coverage": round(len(answered) / len(examples), 3) if examples else 0.0,
+                     "precision": round(correct / len(answered), 3) if answered else None})
+    return rows
+
+
+def main(argv: List[str]) -> int:
+    parser = argparse.ArgumentParser(prog="python -m chatbot.intent_classifier",
+                                     description="Entrena o evalúa el modelo local de intenciones.")
+    commands = parser.add_subparsers(dest="command", required=True)
+    train_parser = commands.add_parser("train", help="Entrena con JSONL de ejemplos {\"text\", \"intent\"}")
+    train_parser.add_argument("examples", nargs="+")
+    train_parser.add_argument("--output", default=INTENT_MODEL_PATH or "intent_model.json")
+    train_parser.add_argument("--epochs", type=int, default=15)
+    train_parser.add_argument("--holdout", type=float, default=0.2, help="Fracción reservada para evaluar")
+    eval_parser = commands.add_parser("evaluate", help="Cobertura y precisión por umbral")
+    eval_parser.add_argument("examples", nargs="+")
+    eval_parser.add_argument("--model", default=INTENT_MODEL_PATH or "intent_model.json")
+    args = parser.parse_args(argv)
+
+    examples = read_examples(args.examples)
+    if not examples:
+        print("No hay ejemplos.")
+        return 1
+    if args.command == "train":
+        train_set = [example for example in examples if not _is_holdout(example[0], args.holdout)]
+        holdout = [example for example in examples if _is_holdout(example[0], args.holdout)]
+        model = LinearIntentModel.train(train_set, epochs=args.epochs)
+        model.save(args.output)
+        print(f"Modelo guardado en {args.output}: {len(train_set)} ejemplos de entrenamiento, "
+              f"{len(model.classes)} intenciones, {len(model.weights)} rasgos.")
+        evaluation_set = holdout
+    else:
+        model = LinearIntentModel.load(args.model)
+        evaluation_set = examples
+    if evaluation_set:
+        print(f"Evaluación sobre {len(evaluation_set)} ejemplos (sólo intenciones del camino rápido):")
+        print(f"{'umbral':>8}{'cobertura':>11}{'precisión':>11}")
+        for row in evaluate(model, evaluation_set, INTENT_FAST_PATH_INTENTS):
+            precision = "-" if row["precision"] is None else f"{row['precision']:.3f}"
+            print(f"{row['threshold']:>8.2f}{row['coverage']:>11.3f}{precision:>11}")
+    return 0
+
+
+local_classifier = _load_default_classifier()
+
+
+if __name__ == "__main__":
+    sys.exit(main(sys.argv[1:]))
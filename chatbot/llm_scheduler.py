@@ -0,0 +1,292 @@
+# Archivo: chatbot/llm_scheduler.py
+# Planificador de las llamadas a Gemini: límite de concurrencia, presupuesto por minuto y cola justa.
+#
+# En picos (matrículas, inscripciones) muchos usuarios escriben a la vez y cada mensaje hace una o
+# dos llamadas a Gemini. Sin límite se supera la cuota del proveedor, llegan los 429 y fallan todas
+# las peticiones juntas. Aquí cada llamada pide turno antes de salir:
+# - como mucho LLM_MAX_CONCURRENCY llamadas en curso;
+# - dos token buckets, de peticiones por minuto (LLM_REQUESTS_PER_MINUTE) y de tokens por minuto
+#   (LLM_TOKENS_PER_MINUTE). Los tokens se estiman antes de la llamada y se corrigen con el consumo
+#   real que informa Gemini (`usage_metadata`);
+# - lo que no cabe espera en una cola por usuario atendida en round-robin: un usuario con varios
+#   mensajes en cola no retrasa a los demás más que uno;
+# - si a pesar de todo llega un 429, se pausa el despacho LLM_RATE_LIMIT_COOLDOWN segundos y la
+#   llamada vuelve a la cabeza de su cola (hasta LLM_RATE_LIMIT_RETRIES veces).
+#
+# Profundidad de la cola, llamadas en curso y tiempos de espera: `stats()`, una línea de log
+# periódica (`llm_scheduler` en el JSON) y el span "llm.queue_wait" de cada traza.
+
+import asyncio
+import time
+from collections import OrderedDict, deque
+from typing import Any, Awaitable, Callable, Deque, Dict, Optional, TypeVar
+
+from chatbot.config import (
+    LLM_MAX_CONCURRENCY,
+    LLM_REQUESTS_PER_MINUTE,
+    LLM_TOKENS_PER_MINUTE,
+    LLM_RATE_LIMIT_COOLDOWN,
+    LLM_RATE_LIMIT_RETRIES,
+    LLM_STATS_LOG_INTERVAL,
+)
+from chatbot.bot_logging import get_logger
+from chatbot.tracing import span
+
+logger = get_logger("llm_scheduler")
+
+T = TypeVar("T")
+
+CHARS_PER_TOKEN = 4 # Estimación habitual para texto en español/inglés con los tokenizadores de Gemini
+_RECENT_WAITS = 1000 # Esperas recientes que se guardan para los percentiles de stats()
+
+
+def estimate_tokens(*texts: str) -> int:
+    """Tokens aproximados de un texto (para reservar presupuesto antes de conocer el consumo real)."""
+    return max(1, sum(len(text) for text in texts if text) // CHARS_PER_TOKEN)
+
+
+def is_rate_limit_error(error: BaseException) -> bool:
+    """True si el error es un 429 / cuota agotada (google.api_core.exceptions.ResourceExhausted)."""
+    return (getattr(error, "code", None) == 429 or type(error).__name__ in ("ResourceExhausted", "TooManyRequests")
+            or "429" in str(error)[:200])
+
+
+class TokenBucket:
+    """Cubo de `capacity` unidades que se rellena a `capacity` por minuto. capacity <= 0: sin límite."""
+
+    def __init__(self, capacity: float):
+        self.capacity = float(capacity)
+        self._rate = self.capacity / 60.0
+        self._level = self.capacity
+        self._updated = time.monotonic()
+
+    @property
+    def unlimited(self) -> bool:
+        return self.capacity <= 0
+
+    def _refill(self) -> None:
+        now = time.monotonic()
+        self._level = min(self.capacity, self._level + (now - self._updated) * self._rate)
+        self._updated = now
+
+    def wait_time(self, amount: float) -> float:
+        """Segundos hasta que haya `amount` unidades (0 si ya las hay)."""
+        if self.unlimited:
+            return 0.0
+        self._refill()
+        amount = min(amount, self.capacity) # Una petición mayor que el cubo pasa cuando esté lleno
+        return 0.0 if self._level >= amount else (amount - self._level) / self._rate
+
+    def take(self, amount: float) -> None:
+        if not self.unlimited:
+            self._refill()
+            self._level -= amount
+
+    def give_back(self, amount: float) -> None:
+        """Corrige una estimación: positivo devuelve unidades, negativo deja deuda."""
+        if not self.unlimited:
+            self._refill()
+            self._level = min(self.capacity, self._level + amount)
+
+    def drain(self) -> None:
+        if not self.unlimited:
+            self._level = min(self._level, 0.0)
+            self._updated = time.monotonic()
+
+
+class _Waiter:
+    __slots__ = ("user_key", "tokens", "future", "enqueued_at")
+
+    def __init__(self, user_key: str, tokens: int, future: asyncio.Future):
+        self.user_key = user_key
+        self.tokens = tokens
+        self.future = future
+        self.enqueued_at = time.monotonic()
+
+
+class LLMScheduler:
+    """Concede turnos para llamar a Gemini respetando concurrencia, RPM y TPM, por usuario en round-robin."""
+
+    def __init__(self, max_concurrency: int, requests_per_minute: int, tokens_per_minute: int,
+                 rate_limit_cooldown: float = 10.0, rate_limit_retries: int = 2):
+        self.max_concurrency = max(1, max_concurrency)
+        self.rate_limit_cooldown = rate_limit_cooldown
+        self.rate_limit_retries = rate_limit_retries
+        self._requests = TokenBucket(requests_per_minute)
+        self._tokens = TokenBucket(tokens_per_minute)
+        self._queues: "OrderedDict[str, Deque[_Waiter]]" = OrderedDict() # Orden = turno del round-robin
+        self._in_flight = 0
+        self._paused_until = 0.0
+        self._timer: Optional[asyncio.TimerHandle] = None
+        self._recent_waits: Deque[float] = deque(maxlen=_RECENT_WAITS)
+        self._counters = {"calls": 0, "queued": 0, "rate_limited": 0, "tokens_estimated": 0, "tokens_used": 0,
+                          "wait_seconds": 0.0}
+        self._max_queue_depth = 0
+
+    # --- Turnos ---
+
+    @property
+    def queue_depth(self) -> int:
+        return sum(len(queue) for queue in self._queues.values())
+
+    async def run(self, user_key: str, estimated_tokens: int, call: Callable[[], Awaitable[T]],
+                  span_attrs: Optional[Dict[str, Any]] = None) -> T:
+        """
+        Espera turno, ejecuta `call()` y libera el turno. Si Gemini responde 429, pausa el
+        despacho y reintenta desde la cabeza de la cola del usuario.
+        """
+        attempt = 0
+        while True:
+            with span("llm.queue_wait") as wait_attrs:
+                waited = await self._acquire(user_key, estimated_tokens, front=attempt > 0)
+                if wait_attrs is not None:
+                    wait_attrs.update(queue_depth=self.queue_depth, in_flight=self._in_flight)
+            if span_attrs is not None:
+                span_attrs.update(queue_wait_ms=round(waited * 1000, 1), attempts=attempt + 1)
+            used_tokens: Optional[int] = None
+            try:
+                result = await call()
+                used_tokens = _total_tokens(result)
+                return result
+            except Exception as e:
+                if not is_rate_limit_error(e) or attempt >= self.rate_limit_retries:
+                    raise
+                self._on_rate_limited(e)
+            finally:
+                self._release(estimated_tokens, used_tokens)
+            attempt += 1
+
+    async def _acquire(self, user_key: str, tokens: int, front: bool = False) -> float:
+        """Devuelve los segundos que se esperó en cola."""
+        self._counters["calls"] += 1
+        self._counters["tokens_estimated"] += tokens
+        loop = asyncio.get_running_loop()
+        waiter = _Waiter(user_key, tokens, loop.create_future())
+        queue = self._queues.setdefault(user_key, deque())
+        if front:
+            queue.appendleft(waiter)
+        else:
+            queue.append(waiter)
+        self._max_queue_depth = max(self._max_queue_depth, self.queue_depth)
+        self._dispatch()
+        if not waiter.future.done():
+            self._counters["queued"] += 1
+        try:
+            await waiter.future
+        except asyncio.CancelledError:
+            if waiter.future.done() and not waiter.future.cancelled():
+                self._release(tokens, None) # Se concedió el turno justo cuando se canceló la espera
+            else:
+                self._discard(waiter)
+            raise
+        waited = time.monotonic() - waiter.enqueued_at
+        self._recent_waits.append(waited)
+        self._counters["wait_seconds"] += waited
+        return waited
+
+    def _release(self, estimated_tokens: int, used_tokens: Optional[int]) -> None:
+        self._in_flight -= 1
+        if used_tokens is not None:
+            self._counters["tokens_used"] += used_tokens
+            self._tokens.give_back(estimated_tokens - used_tokens)
+        self._dispatch()
+
+    def _discard(self, waiter: _Waiter) -> None:
+        queue = self._queues.get(waiter.user_key)
+        if queue is not None and waiter in queue:
+            queue.remove(waiter)
+            if not queue:
+                del self._queues[waiter.user_key]
+
+    def _on_rate_limited(self, error: BaseException) -> None:
+        self._counters["rate_limited"] += 1
+        self._paused_until = max(self._paused_until, time.monotonic() + self.rate_limit_cooldown)
+        self._requests.drain()
+        logger.warning("LLM_SCHEDULER_CUL: Gemini respondió 429 (%s). Despacho en pausa %.1f s; %d llamadas en cola.",
+                       type(error).__name__, self.rate_limit_cooldown, self.queue_depth)
+
+    def _dispatch(self) -> None:
+        """Concede turnos mientras haya capacidad; si falta presupuesto, se reprograma."""
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+        while self._queues and self._in_flight < self.max_concurrency:
+            user_key, queue = next(iter(self._queues.items()))
+            waiter = queue[0]
+            if waiter.future.done(): # Espera cancelada
+                self._pop_head(user_key, queue)
+                continue
+            delay = max(self._paused_until - time.monotonic(), self._requests.wait_time(1),
+                        self._tokens.wait_time(waiter.tokens))
+            if delay > 0:
+                self._timer = asyncio.get_running_loop().call_later(delay, self._dispatch)
+                return
+            self._pop_head(user_key, queue)
+            self._requests.take(1)
+            self._tokens.take(waiter.tokens)
+            self._in_flight += 1
+            waiter.future.set_result(None)
+
+    def _pop_head(self, user_key: str, queue: Deque[_Waiter]) -> None:
+        queue.popleft()
+        if queue:
+            self._queues.move_to_end(user_key) # Su siguiente llamada, después de los demás usuarios
+        else:
+            del self._queues[user_key]
+
+    # --- Métricas ---
+
+    def stats(self) -> Dict[str, Any]:
+        waits = sorted(self._recent_waits)
+        pick = lambda pct: round(waits[min(len(waits) - 1, int(len(waits) * pct))] * 1000, 1) if waits else None
+        return {
+            **self._counters,
+            "in_flight": self._in_flight,
+            "queue_depth": self.queue_depth,
+            "max_queue_depth": self._max_queue_depth,
+            "queued_users": len(self._queues),
+            "wait_ms_p50": pick(0.50),
+            "wait_ms_p95": pick(0.95),
+            "wait_ms_max": round(waits[-1] * 1000, 1) if waits else None,
+        }
+
+
+def _total_tokens(response: Any) -> Optional[int]:
+    usage = getattr(response, "usage_metadata", None)
+    total = getattr(usage, "total_token_count", None)
+    return total if isinstance(total, int) else None
+
+
+llm_scheduler = LLMScheduler(LLM_MAX_CONCURRENCY, LLM_REQUESTS_PER_MINUTE, LLM_TOKENS_PER_MINUTE,
+                             rate_limit_cooldown=LLM_RATE_LIMIT_COOLDOWN, rate_limit_retries=LLM_RATE_LIMIT_RETRIES)
+_stats_task: Optional[asyncio.Task] = None
+
+
+async def _stats_loop(interval: float) -> None:
+    last_calls = -1
+    while True:
+        await asyncio.sleep(interval)
+        stats = llm_scheduler.stats()
+        if stats["calls"] != last_calls or stats["queue_depth"]: # Sin actividad no se repite la línea
+            logger.info("LLM_SCHEDULER_CUL: %d en curso, %d en cola, espera p95 %s ms.", stats["in_flight"],
+                        stats["queue_depth"], stats["wait_ms_p95"], extra={"llm_scheduler": stats})
+            last_calls = stats["calls"]
+
+
+def start_scheduler_stats(interval: float = LLM_STATS_LOG_INTERVAL) -> None:
+    """Publica stats() en el log cada `interval` segundos (llamar con el event loop del bot en marcha)."""
+    global _stats_task
+    if interval > 0 and _stats_task is None:
+        _stats_task = asyncio.create_task(_stats_loop(interval), name="llm-scheduler-stats")
+
+
+async def stop_scheduler_stats() -> None:
+    global _stats_task
+    if _stats_task is not None:
+        _stats_task.cancel()
+        try:
+            await _stats_task
+        except asyncio.CancelledError:
+            pass
+        _stats_task = None
+    logger.info("LLM_SCHEDULER_CUL: Estadísticas finales.", extra={"llm_scheduler": llm_scheduler.stats()})
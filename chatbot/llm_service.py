@@ -4,9 +4,19 @@
 
 import google.generativeai as genai
 from chatbot.config import GEMINI_API_KEY # Importa la clave API desde la configuración.
-from chatbot.bot_logging import logger # Usa el logger configurado para la aplicación.
+from chatbot.config import INTENT_CACHE_MAX_ENTRIES, INTENT_CACHE_TTL, RESPONSE_CACHE_MAX_ENTRIES, RESPONSE_CACHE_TTL
+from chatbot.config import LLM_RESPONSE_MODE
+from chatbot.bot_logging import get_logger
+from chatbot.tracing import span
+from chatbot.llm_scheduler import llm_scheduler, estimate_tokens
+from chatbot.intent_classifier import local_classifier, normalize
+from common.cache import TTLCache, approximate_size
+from chatbot.faq_replica import faq_replica
+from chatbot.session_store import session_store
 import json # Necesario para parsear respuestas JSON del LLM y formatear datos.
 
+logger = get_logger("llm")
+
 # --- Constantes y Configuración del Modelo ---
 MODEL_NAME = 'gemini-1.5-flash-latest' # Modelo de Gemini a utilizar.
 USER_ROLE = "user" # Rol del usuario en el historial de chat.
@@ -25,12 +35,31 @@ try:
         model_name=MODEL_NAME,
         generation_config=generation_config,
     )
-    logger.info(f"Modelo Gemini ({MODEL_NAME}) configurado exitosamente para Chatbot CUL.")
+    logger.info("Modelo Gemini (%s) configurado exitosamente para Chatbot CUL.", MODEL_NAME)
 except Exception as e:
-    logger.critical(f"CRÍTICO: Error al configurar el SDK de Gemini: {e}. El servicio LLM no funcionará.", exc_info=True)
+    logger.critical("CRÍTICO: Error al configurar el SDK de Gemini: %s. El servicio LLM no funcionará.", e, exc_info=True)
     llm_model = None
 
-conversation_sessions_store = {}
+# Sesiones de chat por usuario con límite LRU, caducidad, ventana de historial y copia del historial
+# en LLM_HISTORY_BACKEND (chatbot/session_store.py, chatbot/history_store.py).
+# También guarda los tokens de la última llamada de cada sesión (el historial completo viaja en cada
+# mensaje): base para estimar el presupuesto de la siguiente antes de enviarla.
+conversation_sessions_store = session_store
+
+# Clasificaciones de Gemini por mensaje normalizado ("¡Hola!" y "hola" comparten entrada).
+intent_cache = TTLCache("intents", INTENT_CACHE_MAX_ENTRIES, INTENT_CACHE_TTL, sizeof=approximate_size)
+
+# Respuestas generadas con una FAQ: (intención, id de la FAQ, updated_at, pregunta normalizada) -> texto.
+answer_cache = TTLCache("answers", RESPONSE_CACHE_MAX_ENTRIES, RESPONSE_CACHE_TTL, sizeof=approximate_size)
+
+# Palabras (normalizadas) que delatan una pregunta de seguimiento: su respuesta depende del historial.
+FOLLOW_UP_FIRST_WORDS = frozenset({"y", "o", "pero", "entonces", "tambien", "ademas"})
+FOLLOW_UP_WORDS = frozenset({"eso", "esos", "esas", "ese", "esa", "aquello", "ahi", "alli", "alla", "mismo", "misma",
+                             "anterior", "dijiste", "mencionaste"})
+
+# Tokens de salida que se reservan por llamada hasta conocer el consumo real.
+ESTIMATED_REPLY_TOKENS = 400
+ESTIMATED_CLASSIFICATION_TOKENS = 80
 
 # --- Prompt de Sistema Detallado para el Chatbot Universitario CUL ---
 SYSTEM_PROMPT_TEXT = """
@@ -74,60 +103,191 @@ Usuario: "Sí, por favor."
 Tú: "Perfecto. Por favor, dame una breve descripción del problema, incluyendo tu nombre completo y número de identificación estudiantil (si lo tienes a mano) para incluirlo en el ticket."
 """
 
-async def generate_response(user_id: str, user_message: str, api_data_context: dict = None) -> str:
+# Un modelo por prompt de sistema (modo de dos llamadas y modo combinado), con el prompt como
+# `system_instruction`: viaja aparte en cada llamada en lugar de ocupar el primer turno del historial.
+# Con ~1.3k tokens queda muy por debajo del mínimo del caché explícito de contexto de Gemini
+# (CachedContent), así que no se usa; los modelos que cachean prefijos repetidos lo aprovechan solos.
+_chat_models = {}
+
+
+def _chat_model(system_prompt: str):
+    model = _chat_models.get(system_prompt)
+    if model is None:
+        model = _chat_models[system_prompt] = genai.GenerativeModel(
+            model_name=MODEL_NAME, generation_config=generation_config, system_instruction=system_prompt)
+    return model
+
+
+async def _get_chat_session(user_id: str, system_prompt: str):
+    """
+    Sesión de chat del usuario con el prompt de sistema indicado. Si no hay una al día en memoria se
+    crea con el historial guardado (LLM_HISTORY_BACKEND) o vacío; si la que hay usa otro prompt, se
+    vuelve a crear con el mismo historial.
+    """
+    def start_chat(history: list):
+        logger.info("LLM_SERVICE_CUL: Nueva sesión de chat para user_id %s (%d turnos previos).", user_id, len(history) // 2)
+        return _chat_model(system_prompt).start_chat(history=history)
+
+    return await conversation_sessions_store.get_or_create(user_id, start_chat, base_tokens=estimate_tokens(system_prompt),
+                                                          prompt_key=system_prompt)
+
+
+def _faq_context_text(api_data_context: dict) -> str:
+    """Contexto de FAQs compacto (sólo pregunta y respuesta) para el mensaje actual."""
+    faq = api_data_context.get("faq_encontrada")
+    if faq:
+        body = f"Pregunta: {faq.get('question')}\nRespuesta: {faq.get('answer')}"
+    else:
+        body = api_data_context.get("info_consulta") or json.dumps(api_data_context, ensure_ascii=False, separators=(",", ":"))
+    return f"\n\n[Contexto de la base de datos de FAQs para la pregunta actual]\n{body}"
+
+
+def _forget_context(chat_session, history_len_before: int, history_text: str) -> None:
+    """
+    Tras un turno enviado con contexto de FAQs, deja en el historial sólo `history_text` como mensaje
+    del usuario: el contexto vale para esa respuesta y no se reenvía en los turnos siguientes.
+    """
+    history = list(chat_session.history)
+    if len(history) == history_len_before + 2: # El SDK sólo añade el turno si la respuesta fue válida
+        chat_session.history = [*history[:-2], {"role": USER_ROLE, "parts": [{"text": history_text}]}, history[-1]]
+
+
+def _answer_cache_key(intent: str, api_data_context: dict, user_message: str):
+    """Clave de `answer_cache`, o None si la respuesta no sale de una FAQ encontrada."""
+    faq = (api_data_context or {}).get("faq_encontrada") or {}
+    question = normalize(user_message)
+    if not intent or not faq.get("faq_id") or not question:
+        return None
+    return (intent, faq["faq_id"], faq.get("updated_at"), question)
+
+
+def _depends_on_history(chat_session, question: str) -> bool:
+    """
+    True si la conversación ya tiene mensajes del usuario y la pregunta parece de seguimiento
+    ("¿y los sábados?", "¿dónde queda eso?"): la respuesta guardada para otro usuario no serviría.
+    """
+    if not chat_session.history:
+        return False
+    words = question.split()
+    return len(words) < 3 or words[0] in FOLLOW_UP_FIRST_WORDS or not FOLLOW_UP_WORDS.isdisjoint(words)
+
+
+def invalidate_faq_answers(faq_ids) -> None:
+    """Descarta las respuestas de las FAQs modificadas o eliminadas (todas si `faq_ids` es None)."""
+    if faq_ids is None:
+        answer_cache.clear()
+        return
+    discarded = answer_cache.discard_where(lambda key: key[1] in faq_ids)
+    if discarded:
+        logger.info("LLM_SERVICE_CUL: %d respuestas en caché descartadas por cambios en FAQs %s.", discarded, sorted(faq_ids))
+
+
+faq_replica.add_listener(invalidate_faq_answers)
+
+
+async def _append_exchange(user_id: str, chat_session, message_parts: list, answer: str) -> None:
+    """Añade al historial un intercambio respondido sin Gemini, igual que si el modelo hubiera respondido."""
+    chat_session.history = [*chat_session.history, {"role": USER_ROLE, "parts": message_parts},
+                            {"role": MODEL_ROLE, "parts": [{"text": answer}]}]
+    await conversation_sessions_store.record_turn(user_id)
+
+
+async def record_exchange(user_id: str, user_message: str, answer: str) -> None:
+    """
+    Guarda en la sesión de chat una respuesta que el bot dio sin el LLM (p. ej. una FAQ directa).
+    La sesión se crea, si hace falta, con el prompt del modo activo: puede ser el primer turno.
+    """
+    if llm_model:
+        system_prompt = COMBINED_SYSTEM_PROMPT if LLM_RESPONSE_MODE == "combined" else SYSTEM_PROMPT_TEXT
+        await _append_exchange(user_id, await _get_chat_session(user_id, system_prompt), [{"text": user_message}], answer)
+
+
+async def generate_response(user_id: str, user_message: str, api_data_context: dict = None, intent: str = None) -> str:
     """
     Genera una respuesta utilizando el LLM, manteniendo un historial de conversación por usuario.
+    Si se indica la `intent` y el contexto trae una FAQ encontrada, la respuesta se reutiliza
+    (`answer_cache`) para la misma pregunta normalizada, salvo en preguntas de seguimiento.
     """
     if not llm_model:
-        logger.error(f"LLM_SERVICE_CUL: Modelo Gemini no disponible para user_id {user_id}.")
+        logger.error("LLM_SERVICE_CUL: Modelo Gemini no disponible para user_id %s.", user_id)
         return "Lo siento, estoy experimentando dificultades técnicas con mi asistente inteligente en este momento. Por favor, intenta de nuevo más tarde."
 
-    if user_id not in conversation_sessions_store:
-        initial_history = [
-            {"role": USER_ROLE, "parts": [{"text": SYSTEM_PROMPT_TEXT}]},
-            {"role": MODEL_ROLE, "parts": [{"text": "¡Hola! Soy Asistente CUL. Estoy aquí para ayudarte con tus consultas sobre la Corporación Universitaria Latinoamericana. ¿En qué puedo colaborarte hoy? 🎓"}]}
-        ]
-        conversation_sessions_store[user_id] = llm_model.start_chat(history=initial_history)
-        logger.info(f"LLM_SERVICE_CUL: Nueva sesión de chat iniciada para user_id {user_id}.")
-    
-    chat_session = conversation_sessions_store[user_id]
+    chat_session = await _get_chat_session(user_id, SYSTEM_PROMPT_TEXT)
 
     message_parts_for_llm = [{"text": user_message}]
     if api_data_context:
-        context_info_text = (
-            "\n\n--- Contexto de la base de datos de FAQs (para tu información interna al responder la pregunta actual del usuario) ---\n"
-            f"{json.dumps(api_data_context, indent=2, ensure_ascii=False)}\n"
-            "--- Fin del contexto ---"
-        )
+        context_info_text = _faq_context_text(api_data_context)
         message_parts_for_llm.append({"text": context_info_text})
-        logger.debug(f"LLM_SERVICE_CUL: Añadiendo contexto de API/FAQs al mensaje para user_id {user_id}: {context_info_text[:200]}...")
+        logger.debug("LLM_SERVICE_CUL: Añadiendo contexto de API/FAQs al mensaje para user_id %s: %s...", user_id, context_info_text[:200])
+
+    cache_key = _answer_cache_key(intent, api_data_context, user_message)
+    if cache_key and _depends_on_history(chat_session, cache_key[3]):
+        cache_key = None
+    if cache_key:
+        hit, cached_answer = answer_cache.get(cache_key)
+        if hit:
+            await _append_exchange(user_id, chat_session, [{"text": user_message}], cached_answer)
+            logger.debug("LLM_SERVICE_CUL: Respuesta en caché para user_id %s (FAQ %s).", user_id, cache_key[1])
+            return cached_answer
+    # Si una FAQ cambia mientras Gemini responde, invalidate_faq_answers sube la generación y la respuesta no se guarda.
+    cache_generation = answer_cache.generation
 
     try:
-        logger.debug(f"LLM_SERVICE_CUL: Enviando mensaje a Gemini para user_id {user_id}. Mensaje (inicio): {str(message_parts_for_llm)[:300]}...")
+        logger.debug("LLM_SERVICE_CUL: Enviando mensaje a Gemini para user_id %s. Mensaje (inicio): %s...", user_id, str(message_parts_for_llm)[:300])
         
-        llm_api_response = await chat_session.send_message_async(message_parts_for_llm)
+        estimated_tokens = (conversation_sessions_store.token_count(user_id) or estimate_tokens(SYSTEM_PROMPT_TEXT)) \
+            + estimate_tokens(*(part["text"] for part in message_parts_for_llm)) + ESTIMATED_REPLY_TOKENS
+        history_len = len(chat_session.history)
+        with span("gemini.send_message", model=MODEL_NAME) as attrs:
+            llm_api_response = await llm_scheduler.run(
+                user_id, estimated_tokens, lambda: chat_session.send_message_async(message_parts_for_llm), span_attrs=attrs)
+        usage = getattr(llm_api_response, "usage_metadata", None)
+        if api_data_context:
+            _forget_context(chat_session, history_len, user_message)
+        # Si se quitó el contexto, el consumo informado ya no refleja el historial: se estima.
+        await conversation_sessions_store.record_turn(user_id, None if api_data_context else getattr(usage, "total_token_count", None))
         
         if llm_api_response.prompt_feedback and llm_api_response.prompt_feedback.block_reason:
             block_reason = llm_api_response.prompt_feedback.block_reason
             block_message = f"Respuesta bloqueada por política de seguridad: {block_reason}."
-            logger.warning(f"LLM_SERVICE_CUL: Respuesta de Gemini bloqueada para user_id {user_id}. Razón: {block_reason}. Feedback: {llm_api_response.prompt_feedback}")
+            logger.warning("LLM_SERVICE_CUL: Respuesta de Gemini bloqueada para user_id %s. Razón: %s. Feedback: %s", user_id, block_reason, llm_api_response.prompt_feedback)
             return f"No pude generar una respuesta completa debido a una restricción de contenido ({block_reason}). Por favor, reformula tu pregunta."
 
         generated_text = llm_api_response.text
-        logger.info(f"LLM_SERVICE_CUL: Respuesta recibida de Gemini para user_id {user_id}: {generated_text[:300]}...")
+        logger.debug("LLM_SERVICE_CUL: Respuesta recibida de Gemini para user_id %s: %s...", user_id, generated_text[:300])
+        if cache_key and generated_text.strip():
+            answer_cache.set(cache_key, generated_text, cache_generation)
         return generated_text
 
     except Exception as e:
-        logger.error(f"LLM_SERVICE_CUL: Error al generar respuesta con Gemini para user_id {user_id}: {e}", exc_info=True)
+        logger.error("LLM_SERVICE_CUL: Error al generar respuesta con Gemini para user_id %s: %s", user_id, e, exc_info=True)
         if hasattr(e, 'response') and hasattr(e.response, 'prompt_feedback'):
-            logger.error(f"LLM_SERVICE_CUL: Prompt Feedback de Gemini en error: {e.response.prompt_feedback}")
+            logger.error("LLM_SERVICE_CUL: Prompt Feedback de Gemini en error: %s", e.response.prompt_feedback)
         return "Lo siento, tuve un problema técnico al intentar procesar tu solicitud con el asistente inteligente. Por favor, intenta de nuevo en unos momentos."
 
 
-async def classify_intent_and_extract_entities(user_message: str) -> dict:
+async def classify_intent_and_extract_entities(user_message: str, user_id: str = None) -> dict:
     """
     Utiliza el LLM para clasificar la intención y extraer entidades relevantes para el contexto universitario.
+    Antes prueba el clasificador local (chatbot/intent_classifier.py): los saludos, despedidas,
+    sí/no, cancelaciones y peticiones de ticket se resuelven sin llamar a Gemini.
+    `user_id` sólo se usa para el turno en la cola justa del planificador de llamadas.
     """
+    with span("local_intent") as attrs:
+        local_result = local_classifier.classify(user_message)
+        if attrs is not None:
+            attrs["hit"] = local_result is not None
+    if local_result:
+        logger.debug("LLM_SERVICE_CUL: Intención resuelta localmente (%s): %s", local_result["source"], local_result)
+        return local_result
+
+    cache_key = normalize(user_message)
+    hit, cached = intent_cache.get(cache_key) if cache_key else (False, None)
+    if hit:
+        local_classifier.record_cache_hit(cached["intent"])
+        logger.debug("LLM_SERVICE_CUL: Intención en caché para '%s': %s", cache_key, cached)
+        return {"intent": cached["intent"], "entities": dict(cached["entities"]), "source": "cache"}
+
     if not llm_model:
         logger.error("LLM_SERVICE_CUL: Modelo Gemini no disponible para clasificación de intención.")
         return {"error": "Modelo Gemini no disponible."}
@@ -191,17 +351,21 @@ async def classify_intent_and_extract_entities(user_message: str) -> dict:
     }}
     """
     try:
-        logger.debug(f"LLM_SERVICE_CUL: Enviando prompt de clasificación/extracción a Gemini (inicio): {classification_prompt_text[:300]}...")
+        logger.debug("LLM_SERVICE_CUL: Enviando prompt de clasificación/extracción a Gemini (inicio): %s...", classification_prompt_text[:300])
         
-        llm_classification_response = await llm_model.generate_content_async(classification_prompt_text)
+        estimated_tokens = estimate_tokens(classification_prompt_text) + ESTIMATED_CLASSIFICATION_TOKENS
+        with span("gemini.generate_content", model=MODEL_NAME) as attrs:
+            llm_classification_response = await llm_scheduler.run(
+                user_id or "anonimo", estimated_tokens,
+                lambda: llm_model.generate_content_async(classification_prompt_text), span_attrs=attrs)
         
         if llm_classification_response.prompt_feedback and llm_classification_response.prompt_feedback.block_reason:
             block_reason = llm_classification_response.prompt_feedback.block_reason
-            logger.warning(f"LLM_SERVICE_CUL: Respuesta de clasificación de Gemini bloqueada. Razón: {block_reason}.")
+            logger.warning("LLM_SERVICE_CUL: Respuesta de clasificación de Gemini bloqueada. Razón: %s.", block_reason)
             return {"intent": "DESCONOCIDO", "entities": {}, "error": f"Respuesta de clasificación bloqueada ({block_reason})", "raw_response": ""}
 
         raw_json_text = llm_classification_response.text
-        logger.info(f"LLM_SERVICE_CUL: Respuesta de clasificación (raw JSON) de Gemini: {raw_json_text}")
+        logger.debug("LLM_SERVICE_CUL: Respuesta de clasificación (raw JSON) de Gemini: %s", raw_json_text)
 
         clean_json_text = raw_json_text.strip()
         if clean_json_text.startswith("```json"):
@@ -218,26 +382,146 @@ async def classify_intent_and_extract_entities(user_message: str) -> dict:
            not isinstance(parsed_response.get("entities"), dict):
             raise ValueError("El JSON de respuesta del LLM para clasificación no tiene la estructura esperada (intent/entities).")
             
-        logger.info(f"LLM_SERVICE_CUL: Intención y entidades extraídas: {parsed_response}")
+        logger.debug("LLM_SERVICE_CUL: Intención y entidades extraídas: %s", parsed_response)
+        local_classifier.record_llm_result(user_message, parsed_response["intent"])
+        if cache_key:
+            intent_cache.set(cache_key, {"intent": parsed_response["intent"], "entities": dict(parsed_response["entities"])})
         return parsed_response
 
     except json.JSONDecodeError as json_err:
-        logger.error(f"LLM_SERVICE_CUL: Error al parsear JSON de Gemini para clasificación: {json_err}. Respuesta original: {raw_json_text}", exc_info=True)
+        logger.error("LLM_SERVICE_CUL: Error al parsear JSON de Gemini para clasificación: %s. Respuesta original: %s", json_err, raw_json_text, exc_info=True)
         return {"intent": "DESCONOCIDO", "entities": {}, "error": "Error al parsear la estructura de la respuesta del LLM.", "raw_response": raw_json_text}
     except Exception as e:
-        logger.error(f"LLM_SERVICE_CUL: Error en clasificación de intención con Gemini: {e}", exc_info=True)
+        logger.error("LLM_SERVICE_CUL: Error en clasificación de intención con Gemini: %s", e, exc_info=True)
         if hasattr(e, 'response') and hasattr(e.response, 'prompt_feedback'):
-            logger.error(f"LLM_SERVICE_CUL: Prompt Feedback de Gemini (clasificación) en error: {e.response.prompt_feedback}")
+            logger.error("LLM_SERVICE_CUL: Prompt Feedback de Gemini (clasificación) en error: %s", e.response.prompt_feedback)
         return {"intent": "DESCONOCIDO", "entities": {}, "error": f"Error inesperado durante la clasificación: {type(e).__name__}"}
 
 
+# --- Modo combinado (LLM_RESPONSE_MODE=combined) ---
+# Intención, entidades y respuesta al usuario en UNA llamada con salida JSON (response_schema),
+# en lugar de clasificar y después generar. Las instrucciones del formato se suman al prompt de
+# sistema (COMBINED_SYSTEM_PROMPT), que viaja como `system_instruction` del modelo (ver `_chat_model`),
+# no en cada mensaje. Si para responder hacen falta datos de las FAQs, el modelo lo pide
+# (`needs_faq`) y sólo entonces hay una segunda llamada con ese contexto.
+
+INTENTS = (
+    "CONSULTA_TRAMITE_ACADEMICO", "CONSULTA_HORARIO", "CONSULTA_PROGRAMA_ACADEMICO", "SOLICITUD_SOPORTE_TECNICO",
+    "INFORMACION_GENERAL_CUL", "GENERAR_TICKET_HUMANO", "SALUDO", "DESPEDIDA", "AFIRMACION", "NEGACION",
+    "CANCELAR_ACCION", "PREGUNTA_GENERAL_CHATBOT", "DESCONOCIDO",
+)
+ENTITY_NAMES = (
+    "nombre_tramite", "documento_relacionado", "nombre_asignatura", "dia_semana", "lugar", "nombre_programa",
+    "nivel_academico", "descripcion_problema", "plataforma_afectada", "resumen_solicitud_ticket", "tema_consulta_general",
+)
+
+COMBINED_RESPONSE_SCHEMA = {
+    "type": "object",
+    "properties": {
+        "intent": {"type": "string", "enum": list(INTENTS)},
+        "entities": {"type": "object", "properties": {name: {"type": "string"} for name in ENTITY_NAMES}},
+        "needs_faq": {"type": "boolean"},
+        "faq_query": {"type": "string"},
+        "answer": {"type": "string"},
+    },
+    "required": ["intent", "entities", "needs_faq", "answer"],
+}
+COMBINED_GENERATION_CONFIG = {"response_mime_type": "application/json", "response_schema": COMBINED_RESPONSE_SCHEMA}
+
+COMBINED_MODE_INSTRUCTIONS = """
+Formato de tus respuestas: responde SIEMPRE con un objeto JSON con estas claves:
+- "intent": la intención del último mensaje del usuario. CONSULTA_TRAMITE_ACADEMICO (inscripciones, matrículas, certificados), CONSULTA_HORARIO, CONSULTA_PROGRAMA_ACADEMICO, SOLICITUD_SOPORTE_TECNICO, INFORMACION_GENERAL_CUL (ubicaciones, contactos, servicios), GENERAR_TICKET_HUMANO (quiere hablar con una persona o abrir un ticket), SALUDO, DESPEDIDA, AFIRMACION, NEGACION, CANCELAR_ACCION, PREGUNTA_GENERAL_CHATBOT (preguntas sobre ti) o DESCONOCIDO.
+- "entities": sólo las entidades que aparezcan en el mensaje: nombre_tramite, documento_relacionado, nombre_asignatura, dia_semana, lugar, nombre_programa, nivel_academico, descripcion_problema, plataforma_afectada, resumen_solicitud_ticket (breve resumen de por qué necesita el ticket), tema_consulta_general.
+- "needs_faq": true si para responder necesitas datos concretos de la CUL (requisitos, fechas, costos, horarios, ubicaciones, contactos) de la base de FAQs; false si puedes responder ya (saludos, despedidas, preguntas sobre ti, orientación general, tickets).
+- "faq_query": si needs_faq es true, qué buscar en las FAQs (breve, con las palabras clave).
+- "answer": tu respuesta al usuario, siguiendo todas las indicaciones anteriores. Si needs_faq es true déjala vacía: recibirás el contexto de las FAQs en el siguiente mensaje y entonces responderás.
+"""
+
+COMBINED_SYSTEM_PROMPT = SYSTEM_PROMPT_TEXT + COMBINED_MODE_INSTRUCTIONS
+
+FAQ_FOLLOW_UP_TEXT = "Este es el contexto de las FAQs para la pregunta anterior del usuario. Respóndela ahora (needs_faq=false)."
+
+
+def _parse_combined_response(raw_text: str) -> dict:
+    """Normaliza el JSON del modo combinado; si no es JSON válido, el texto se toma como respuesta."""
+    try:
+        parsed = json.loads(raw_text)
+        if not isinstance(parsed, dict):
+            raise ValueError("La respuesta no es un objeto JSON.")
+    except ValueError as e:
+        logger.warning("LLM_SERVICE_CUL: Respuesta combinada no es JSON válido (%s). Se usa como texto.", e)
+        return {"intent": "DESCONOCIDO", "entities": {}, "needs_faq": False, "faq_query": "",
+                "answer": raw_text.strip(), "error": "Respuesta combinada sin formato JSON."}
+    intent = parsed.get("intent")
+    entities = parsed.get("entities")
+    return {
+        "intent": intent if intent in INTENTS else "DESCONOCIDO",
+        "entities": {k: v for k, v in entities.items() if v} if isinstance(entities, dict) else {},
+        "needs_faq": parsed.get("needs_faq") is True,
+        "faq_query": str(parsed.get("faq_query") or ""),
+        "answer": str(parsed.get("answer") or "").strip(),
+    }
+
+
+async def _combined_call(user_id: str, message_parts: list, history_text: str = None) -> dict:
+    """Una llamada del modo combinado. Con `history_text`, es lo único del mensaje que queda en el historial."""
+    if not llm_model:
+        logger.error("LLM_SERVICE_CUL: Modelo Gemini no disponible para user_id %s.", user_id)
+        return {"intent": "DESCONOCIDO", "entities": {}, "needs_faq": False, "faq_query": "", "error": "Modelo Gemini no disponible.",
+                "answer": "Lo siento, estoy experimentando dificultades técnicas con mi asistente inteligente en este momento. Por favor, intenta de nuevo más tarde."}
+
+    chat_session = await _get_chat_session(user_id, COMBINED_SYSTEM_PROMPT)
+    try:
+        estimated_tokens = (conversation_sessions_store.token_count(user_id) or estimate_tokens(COMBINED_SYSTEM_PROMPT)) \
+            + estimate_tokens(*(part["text"] for part in message_parts)) + ESTIMATED_REPLY_TOKENS
+        history_len = len(chat_session.history)
+        with span("gemini.send_message", model=MODEL_NAME, mode="combined") as attrs:
+            llm_api_response = await llm_scheduler.run(
+                user_id, estimated_tokens,
+                lambda: chat_session.send_message_async(message_parts, generation_config=COMBINED_GENERATION_CONFIG),
+                span_attrs=attrs)
+        usage = getattr(llm_api_response, "usage_metadata", None)
+        if history_text is not None:
+            _forget_context(chat_session, history_len, history_text)
+        await conversation_sessions_store.record_turn(user_id, None if history_text is not None else getattr(usage, "total_token_count", None))
+
+        if llm_api_response.prompt_feedback and llm_api_response.prompt_feedback.block_reason:
+            block_reason = llm_api_response.prompt_feedback.block_reason
+            logger.warning("LLM_SERVICE_CUL: Respuesta combinada de Gemini bloqueada para user_id %s. Razón: %s.", user_id, block_reason)
+            return {"intent": "DESCONOCIDO", "entities": {}, "needs_faq": False, "faq_query": "", "error": f"Respuesta bloqueada ({block_reason})",
+                    "answer": f"No pude generar una respuesta completa debido a una restricción de contenido ({block_reason}). Por favor, reformula tu pregunta."}
+
+        logger.debug("LLM_SERVICE_CUL: Respuesta combinada de Gemini para user_id %s: %s", user_id, llm_api_response.text[:300])
+        return _parse_combined_response(llm_api_response.text)
+    except Exception as e:
+        logger.error("LLM_SERVICE_CUL: Error en la llamada combinada a Gemini para user_id %s: %s", user_id, e, exc_info=True)
+        return {"intent": "DESCONOCIDO", "entities": {}, "needs_faq": False, "faq_query": "", "error": f"Error inesperado: {type(e).__name__}",
+                "answer": "Lo siento, tuve un problema técnico al intentar procesar tu solicitud con el asistente inteligente. Por favor, intenta de nuevo en unos momentos."}
+
+
+async def classify_and_respond(user_id: str, user_message: str) -> dict:
+    """
+    Modo combinado: clasifica el mensaje y responde en una sola llamada.
+    Devuelve {"intent", "entities", "needs_faq", "faq_query", "answer"} (y "error" si algo falló;
+    incluso entonces "answer" trae un mensaje para el usuario). Si "needs_faq" es True, "answer"
+    viene vacía: buscar la FAQ y llamar a `answer_with_faq`.
+    """
+    return await _combined_call(user_id, [{"text": user_message}])
+
+
+async def answer_with_faq(user_id: str, api_data_context: dict) -> str:
+    """Segunda llamada del modo combinado, sólo cuando el modelo pidió datos de las FAQs."""
+    result = await _combined_call(user_id, [{"text": FAQ_FOLLOW_UP_TEXT + _faq_context_text(api_data_context)}],
+                                  history_text=FAQ_FOLLOW_UP_TEXT)
+    return result["answer"]
+
+
 async def reset_conversation_history(user_id: str) -> bool:
     """
     Limpia/resetea el historial de conversación para un usuario específico.
     """
-    if user_id in conversation_sessions_store:
-        del conversation_sessions_store[user_id]
-        logger.info(f"LLM_SERVICE_CUL: Historial de conversación reseteado para el usuario {user_id}.")
+    if await conversation_sessions_store.pop(user_id):
+        logger.info("LLM_SERVICE_CUL: Historial de conversación reseteado para el usuario %s.", user_id)
         return True
-    logger.info(f"LLM_SERVICE_CUL: No se encontró historial para resetear para el usuario {user_id}.")
+    logger.info("LLM_SERVICE_CUL: No se encontró historial para resetear para el usuario %s.", user_id)
     return False
@@ -3,9 +3,12 @@
 # MODIFICADO PARA EL CHATBOT UNIVERSITARIO CUL (con ConversationHandler para tickets)
 
 import asyncio
+from typing import Any, Awaitable, Dict, Optional
+
 from telegram import Update
 from telegram.ext import (
     Application,
+    BaseUpdateProcessor,
     CommandHandler,
     ContextTypes,
     MessageHandler,
@@ -13,32 +16,72 @@ from telegram.ext import (
     ConversationHandler # Necesario para el ConversationHandler de tickets
 )
 
-from chatbot.config import TELEGRAM_BOT_TOKEN, LOG_LEVEL
+from chatbot.config import (
+    TELEGRAM_BOT_TOKEN, LOG_LEVEL, TRACE_EXPORT, TRACE_FILE, TRACE_FILE_MAX_BYTES, TRACE_FILE_BACKUPS,
+    TRACE_COLLECTOR, TRACE_SAMPLE_RATE, INTENT_EXAMPLES_FILE, BOT_CONCURRENT_UPDATES
+)
 from chatbot.bot_logging import logger, setup_logging
+from chatbot.faq_replica import start_faq_replica, stop_faq_replica
+from chatbot.http_client import start_http_client, stop_http_client
+from chatbot.llm_scheduler import start_scheduler_stats, stop_scheduler_stats
+from chatbot.session_store import start_session_sweeper, stop_session_sweeper
+from chatbot.intent_classifier import start_examples_log, stop_examples_log
+from chatbot.llm_service import intent_cache, answer_cache
+from chatbot.tracing import start_tracing, stop_tracing
 
 # Importar handlers actualizados/nuevos
 from chatbot.handlers import start_handler
-from chatbot.handlers.general_handler import general_message_handler, reset_chat_command
+from chatbot.handlers.general_handler import general_message_handler, reset_chat_command, faq_answer_stats
 # Importar el ConversationHandler de tickets
 from chatbot.handlers.ticket_handler import ticket_creation_conv_handler
 
 
-def main() -> None:
-    setup_logging(level_name=LOG_LEVEL)
-    logger.info("============================================================")
-    logger.info("🚀 INICIANDO BOT ASISTENTE CUL (UNIVERSITARIO) v2 🚀")
-    logger.info("============================================================")
+class PerChatUpdateProcessor(BaseUpdateProcessor):
+    """
+    Atiende hasta `max_concurrent_updates` updates a la vez, pero los de un mismo chat uno tras otro:
+    el ConversationHandler de tickets y el historial con Gemini dependen del orden de los mensajes.
+    """
 
-    if not TELEGRAM_BOT_TOKEN:
-        logger.critical("CRÍTICO: TELEGRAM_BOT_TOKEN no encontrado. El bot CUL no puede iniciar.")
-        return
+    def __init__(self, max_concurrent_updates: int):
+        super().__init__(max_concurrent_updates)
+        self._chat_locks: Dict[int, asyncio.Lock] = {}
+        self._chat_waiters: Dict[int, int] = {}
 
-    application_builder = Application.builder().token(TELEGRAM_BOT_TOKEN)
-    application_builder.read_timeout(30)
-    application_builder.write_timeout(30)
-    application_builder.connect_timeout(30)
-    application = application_builder.build()
-    
+    async def do_process_update(self, update: object, coroutine: Awaitable[Any]) -> None:
+        chat = update.effective_chat if isinstance(update, Update) else None
+        if chat is None:
+            await coroutine
+            return
+        lock = self._chat_locks.setdefault(chat.id, asyncio.Lock())
+        self._chat_waiters[chat.id] = self._chat_waiters.get(chat.id, 0) + 1
+        try:
+            async with lock:
+                await coroutine
+        finally:
+            self._chat_waiters[chat.id] -= 1
+            if not self._chat_waiters[chat.id]: # Nadie más espera: el lock no se guarda para siempre
+                del self._chat_waiters[chat.id]
+                del self._chat_locks[chat.id]
+
+    async def initialize(self) -> None:
+        pass
+
+    async def shutdown(self) -> None:
+        pass
+
+
+def make_update_processor(max_concurrent_updates: Optional[int] = None) -> PerChatUpdateProcessor:
+    """Procesador de updates del bot (BOT_CONCURRENT_UPDATES; 0 = 256, el valor por defecto de PTB)."""
+    limit = BOT_CONCURRENT_UPDATES if max_concurrent_updates is None else max_concurrent_updates
+    return PerChatUpdateProcessor(limit if limit > 0 else 256)
+
+
+def register_handlers(application: Application) -> None:
+    """
+    Registra todos los handlers del bot (y el de errores) en la aplicación.
+    Separado de main() para que el arnés de replay (chatbot/benchmarks/bench_replay.py)
+    ejecute exactamente la misma configuración sin Telegram.
+    """
     async def global_error_handler(update: object, context: ContextTypes.DEFAULT_TYPE) -> None:
         logger.error(msg="EXCEPCIÓN NO MANEJADA AL PROCESAR UN UPDATE (CUL):", exc_info=context.error)
         if isinstance(update, Update) and update.effective_chat:
@@ -49,7 +92,7 @@ def main() -> None:
                          "El equipo de la CUL ha sido notificado (simulado). Por favor, intenta de nuevo en unos momentos."
                 )
             except Exception as e_notify:
-                logger.error(f"Error al intentar enviar mensaje de error CUL al usuario {update.effective_chat.id}: {e_notify}")
+                logger.error("Error al intentar enviar mensaje de error CUL al usuario %s: %s", update.effective_chat.id, e_notify)
     application.add_error_handler(global_error_handler)
 
     logger.info("Registrando handlers para el Bot CUL...")
@@ -81,7 +124,7 @@ def main() -> None:
             current_handlers = context.application.handlers
             # Esta verificación es superficial, PTB maneja la prioridad de handlers.
             # Si llega aquí, es porque ningún CommandHandler específico lo tomó.
-            logger.warning(f"Comando CUL desconocido: {update.message.text} de user_id {update.effective_user.id if update.effective_user else 'N/A'}")
+            logger.warning("Comando CUL desconocido: %s de user_id %s", update.message.text, update.effective_user.id if update.effective_user else 'N/A')
             await update.message.reply_text(
                 "🤔 Lo siento, no reconozco ese comando.\n"
                 "Puedes usar /ayuda para ver las opciones disponibles o /ticket para crear una solicitud."
@@ -90,6 +133,52 @@ def main() -> None:
     # El grupo 1 asegura que se ejecute después de los handlers del grupo 0 (por defecto).
     application.add_handler(MessageHandler(filters.COMMAND, unknown_command_handler), group=1)
     logger.debug("Handler para comandos desconocidos (CUL) registrado.")
+
+
+def main() -> None:
+    setup_logging(level=LOG_LEVEL)
+    start_tracing(TRACE_EXPORT, file_path=TRACE_FILE, file_max_bytes=TRACE_FILE_MAX_BYTES,
+                  file_backups=TRACE_FILE_BACKUPS, collector=TRACE_COLLECTOR, sample_rate=TRACE_SAMPLE_RATE)
+    logger.info("============================================================")
+    logger.info("🚀 INICIANDO BOT ASISTENTE CUL (UNIVERSITARIO) v2 🚀")
+    logger.info("============================================================")
+
+    if not TELEGRAM_BOT_TOKEN:
+        logger.critical("CRÍTICO: TELEGRAM_BOT_TOKEN no encontrado. El bot CUL no puede iniciar.")
+        return
+
+    application_builder = Application.builder().token(TELEGRAM_BOT_TOKEN)
+    application_builder.read_timeout(30)
+    application_builder.write_timeout(30)
+    application_builder.connect_timeout(30)
+    # Varios usuarios a la vez: sin esto PTB atiende los updates de uno en uno y cada llamada a
+    # Gemini bloquea al resto aunque el planificador admita LLM_MAX_CONCURRENCY en paralelo
+    application_builder.concurrent_updates(make_update_processor())
+
+    # Cliente HTTP compartido con el backend (keep-alive) y réplica local de FAQs: carga inicial
+    # al arrancar y sincronización incremental en segundo plano
+    async def on_startup(app: Application) -> None:
+        await start_http_client()
+        await start_faq_replica()
+        start_scheduler_stats()
+        start_session_sweeper()
+        start_examples_log(INTENT_EXAMPLES_FILE)
+
+    async def on_shutdown(app: Application) -> None:
+        await stop_faq_replica()
+        await stop_http_client()
+        await stop_scheduler_stats()
+        await stop_session_sweeper()
+        stop_examples_log()
+        logger.info("Cachés del LLM al apagar.", extra={"intent_cache": intent_cache.stats(), "answer_cache": answer_cache.stats()})
+        logger.info("Respuestas con FAQ al apagar.", extra={"faq_answers": faq_answer_stats.stats()})
+        stop_tracing()
+
+    application_builder.post_init(on_startup)
+    application_builder.post_shutdown(on_shutdown)
+    application = application_builder.build()
+    
+    register_handlers(application)
     
     logger.info("🤖 Bot CUL configurado y listo. Iniciando polling...")
     try:
@@ -100,7 +189,7 @@ def main() -> None:
     except KeyboardInterrupt:
         logger.info("Polling CUL detenido manualmente (KeyboardInterrupt).")
     except Exception as e:
-        logger.critical(f"El bot CUL se detuvo por error crítico no manejado en polling: {e}", exc_info=True)
+        logger.critical("El bot CUL se detuvo por error crítico no manejado en polling: %s", e, exc_info=True)
     finally:
         logger.info("============================================================")
         logger.info("🛑 BOT CUL DETENIDO 🛑")
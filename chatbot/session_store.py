@@ -0,0 +1,300 @@
+# Archivo: chatbot/session_store.py
+# Sesiones de chat de Gemini por usuario, con memoria acotada.
+#
+# Antes era un dict de módulo que sólo crecía: cada usuario que alguna vez escribió conservaba su
+# ChatSession y el historial crecía con cada turno. Ahora:
+# - como mucho LLM_SESSION_MAX_SESSIONS sesiones; al superarlo se descarta la usada hace más tiempo (LRU);
+# - una sesión sin mensajes durante LLM_SESSION_IDLE_TTL segundos caduca (al volver a usarla o en el
+#   barrido periódico), y el usuario empieza una conversación nueva;
+# - cada historial guarda como mucho LLM_SESSION_MAX_TURNS turnos (mensaje + respuesta) y unos
+#   LLM_SESSION_MAX_TOKENS tokens estimados: al pasarse se eliminan los turnos más antiguos. El prompt
+#   de sistema no forma parte del historial (va como `system_instruction` del modelo).
+#
+# El historial se guarda además, en forma compacta, en el almacén de LLM_HISTORY_BACKEND
+# (chatbot/history_store.py). Las ChatSession en memoria son una caché de ese historial: si la
+# versión guardada cambió (otro worker atendió al usuario, o el bot se reinició), la sesión se
+# reconstruye desde el almacén en el siguiente mensaje. Si al guardar resulta que otro worker guardó
+# antes un turno del mismo usuario, se recarga ese historial y se le añade el turno nuevo. Con
+# "sqlite" varios workers pueden atender a los mismos usuarios y los reinicios no pierden conversaciones. La caducidad por inactividad se
+# mide con la última escritura en el almacén, así que vale para todos los workers.
+#
+# Con un almacén persistente (SQLite) las lecturas y escrituras se hacen en un hilo propio, una tras
+# otra, para que esperar al archivo (otro worker escribiendo, disco lento) no congele el event loop;
+# por eso get_or_create, record_turn, pop y sweep son corrutinas.
+#
+# Número de sesiones, turnos y memoria aproximada del texto de los historiales: `stats()` y una línea
+# de log periódica (`llm_sessions` en el JSON).
+
+import asyncio
+import time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Dict, Hashable, List, Optional, Tuple
+
+from chatbot.config import (
+    LLM_SESSION_MAX_SESSIONS,
+    LLM_SESSION_IDLE_TTL,
+    LLM_SESSION_MAX_TURNS,
+    LLM_SESSION_MAX_TOKENS,
+    LLM_SESSION_SWEEP_INTERVAL,
+    LLM_HISTORY_BACKEND,
+    LLM_HISTORY_SQLITE_PATH,
+)
+from chatbot.bot_logging import get_logger
+from chatbot.history_store import Records, history_records, records_to_history, make_history_store
+from chatbot.llm_scheduler import estimate_tokens
+
+logger = get_logger("llm_sessions")
+
+_MERGE_ATTEMPTS = 5 # Reintentos de recargar-fusionar-guardar si otros workers siguen guardando a la vez
+
+
+def history_texts(history: List[Any]) -> List[str]:
+    """Textos de un historial, sea de dicts ({"role", "parts"}) o de objetos Content del SDK."""
+    return [text for _, text in history_records(history) if text]
+
+
+class _Session:
+    __slots__ = ("chat", "prompt_key", "base_tokens", "version", "last_used", "tokens", "turns", "approx_bytes")
+
+    def __init__(self, chat: Any, prompt_key: Hashable, base_tokens: int, version: Optional[int]):
+        self.chat = chat
+        self.prompt_key = prompt_key # Con qué prompt de sistema se creó `chat`
+        self.base_tokens = base_tokens # Lo que se envía en cada llamada fuera del historial (prompt de sistema)
+        self.version = version # Versión del historial guardado en el almacén (None si aún no se guardó)
+        self.last_used = time.monotonic()
+        self.tokens: Optional[int] = None # Tokens del historial: los de Gemini (usage_metadata) o estimados
+        self.turns = 0
+        self.approx_bytes = 0
+
+
+class SessionStore:
+    """Sesiones de chat por usuario con límite LRU, caducidad por inactividad y ventana de historial (0 = sin límite)."""
+
+    def __init__(self, max_sessions: int, idle_ttl: float, max_turns: int, max_tokens: int, history=None):
+        self.max_sessions = max_sessions
+        self.idle_ttl = idle_ttl
+        self.max_turns = max_turns
+        self.max_tokens = max_tokens
+        self.history = history or make_history_store("memory", "")
+        self._sessions: "OrderedDict[str, _Session]" = OrderedDict() # De la usada hace más tiempo a la más reciente
+        self._evictions = 0
+        self._expirations = 0
+        self._truncated_turns = 0
+        self._rebuilds = 0
+        self._merges = 0
+        # Un solo hilo: las operaciones sobre la conexión SQLite no se solapan. El almacén en memoria no lo necesita.
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="history-store") if self.history.persistent else None
+
+    async def _history_call(self, method: Callable[..., Any], *args: Any) -> Any:
+        """Ejecuta una operación del almacén: en su hilo si es persistente, si no directamente."""
+        if self._executor is None:
+            return method(*args)
+        return await asyncio.get_running_loop().run_in_executor(self._executor, method, *args)
+
+    def __len__(self) -> int:
+        return len(self._sessions)
+
+    def __contains__(self, user_id: str) -> bool:
+        return user_id in self._sessions
+
+    async def get_or_create(self, user_id: str, create: Callable[[List[Dict[str, Any]]], Any], base_tokens: int = 0,
+                            prompt_key: Hashable = None) -> Any:
+        """
+        ChatSession del usuario. Si no hay una en memoria al día con el almacén, se crea con
+        `create(historial)`: el historial guardado (reconstrucción) o vacío si no hay o caducó.
+        `base_tokens` es lo que cada llamada envía fuera del historial (el prompt de sistema) y
+        `prompt_key` identifica ese prompt: si la sesión en memoria se creó con otro, se vuelve a
+        crear con `create` y el mismo historial.
+        """
+        session = self._sessions.get(user_id)
+        saved = await self._history_call(self.history.load, user_id, self.idle_ttl, session.version if session else None)
+        if saved is not None and saved[1] is None: # La sesión en memoria tiene la última versión
+            if self._sessions.get(user_id) is session:
+                session.last_used = time.monotonic()
+                self._sessions.move_to_end(user_id)
+                if session.prompt_key != prompt_key:
+                    session.chat = create(list(session.chat.history))
+                    session.prompt_key, session.base_tokens = prompt_key, base_tokens
+                    session.tokens = self._measure(session)
+                    logger.debug("LLM_SESSIONS_CUL: Sesión de user_id %s recreada con otro prompt de sistema.", user_id)
+                return session.chat
+            # Se descartó (LRU) mientras se consultaba el almacén: se reconstruye
+            saved = await self._history_call(self.history.load, user_id, self.idle_ttl)
+
+        if saved is None:
+            if session is not None and session.turns:
+                self._expirations += 1
+                logger.info("LLM_SESSIONS_CUL: Conversación de user_id %s caducada por inactividad.", user_id)
+            version, history = None, []
+        else:
+            version, history = saved[0], records_to_history(saved[1])
+            self._rebuilds += 1
+            logger.info("LLM_SESSIONS_CUL: Sesión de user_id %s reconstruida desde el historial guardado (%d turnos, versión %d).",
+                        user_id, len(history) // 2, version)
+        chat = create(history)
+        session = self._sessions[user_id] = _Session(chat, prompt_key, base_tokens, version)
+        self._sessions.move_to_end(user_id)
+        session.tokens = self._measure(session)
+        while self.max_sessions > 0 and len(self._sessions) > self.max_sessions:
+            evicted_id, _ = self._sessions.popitem(last=False)
+            self._evictions += 1
+            if not self.history.persistent: # Sin copia fuera del proceso no se puede reconstruir: se descarta también
+                self.history.delete(evicted_id)
+            logger.debug("LLM_SESSIONS_CUL: Sesión de user_id %s descartada (LRU, máximo %d).", evicted_id, self.max_sessions)
+        return chat
+
+    async def pop(self, user_id: str) -> bool:
+        """Olvida la conversación del usuario (en memoria y en el almacén)."""
+        in_memory = self._sessions.pop(user_id, None) is not None
+        return await self._history_call(self.history.delete, user_id) or in_memory
+
+    def token_count(self, user_id: str) -> Optional[int]:
+        """Tokens del historial tras el último turno (None si aún no se conocen)."""
+        session = self._sessions.get(user_id)
+        return session.tokens if session else None
+
+    async def record_turn(self, user_id: str, total_tokens: Optional[int] = None) -> int:
+        """
+        Llamar tras añadir un turno al historial. `total_tokens` es el consumo que informó Gemini
+        (si no, se estima). Recorta los turnos más antiguos que excedan la ventana y guarda el
+        historial en el almacén; devuelve cuántos turnos se recortaron.
+        """
+        session = self._sessions.get(user_id)
+        if session is None:
+            return 0
+        history = list(session.chat.history)
+        records, dropped = self._window(history_records(history))
+        if dropped:
+            session.chat.history = history[2 * dropped:]
+            self._truncated_turns += dropped
+            total_tokens = None # El consumo informado incluía los turnos recortados
+            logger.debug("LLM_SESSIONS_CUL: %d turnos antiguos recortados del historial de user_id %s.", dropped, user_id)
+        version = await self._history_call(self.history.save, user_id, records, session.version)
+        if version is None: # Otro worker guardó antes un turno de este usuario
+            version = await self._merge(user_id, session, records[-2:])
+            total_tokens = None
+        session.version = version
+        session.tokens = total_tokens or self._measure(session)
+        return dropped
+
+    def _window(self, records: Records) -> Tuple[Records, int]:
+        """Quita los turnos más antiguos que excedan la ventana; devuelve (registros, turnos quitados)."""
+        tokens = estimate_tokens(*(text for _, text in records if text))
+        turns = len(records) // 2
+        cut = 0
+        while turns > 1 and ((self.max_turns > 0 and turns > self.max_turns) or
+                             (self.max_tokens > 0 and tokens > self.max_tokens)):
+            tokens -= estimate_tokens(*(text for _, text in records[cut:cut + 2] if text))
+            cut += 2
+            turns -= 1
+        return records[cut:], cut // 2
+
+    async def _merge(self, user_id: str, session: _Session, turn: Records) -> Optional[int]:
+        """
+        Añade `turn` al historial guardado por otro worker y lo guarda (reintentando si vuelve a cambiar);
+        la sesión en memoria pasa a ese historial. Devuelve la versión guardada, o None si no se logró.
+        """
+        for _ in range(_MERGE_ATTEMPTS):
+            saved = await self._history_call(self.history.load, user_id, self.idle_ttl)
+            base_version, base = saved if saved is not None else (None, [])
+            records = self._window(base + turn)[0]
+            version = await self._history_call(self.history.save, user_id, records, base_version)
+            if version is not None:
+                session.chat.history = records_to_history(records)
+                self._merges += 1
+                logger.info("LLM_SESSIONS_CUL: Turno de user_id %s fusionado con el historial guardado por otro worker (versión %d).",
+                            user_id, version)
+                return version
+        logger.warning("LLM_SESSIONS_CUL: No se pudo guardar el turno de user_id %s tras %d intentos: el historial cambia sin parar.",
+                       user_id, _MERGE_ATTEMPTS)
+        return None # La sesión se reconstruirá desde el almacén en el siguiente mensaje
+
+    def _measure(self, session: _Session) -> int:
+        """Actualiza turnos y bytes de la sesión; devuelve los tokens estimados de cada llamada (sin el mensaje nuevo)."""
+        history = list(session.chat.history)
+        texts = history_texts(history)
+        session.turns = len(history) // 2
+        session.approx_bytes = sum(len(text.encode("utf-8")) for text in texts)
+        return session.base_tokens + estimate_tokens(*texts)
+
+    async def sweep(self) -> int:
+        """
+        Libera las sesiones en memoria sin uso en LLM_SESSION_IDLE_TTL segundos (están al principio
+        del orden LRU) y borra del almacén las conversaciones caducadas. Devuelve cuántas de estas.
+        """
+        if self.idle_ttl <= 0:
+            return 0
+        limit = time.monotonic() - self.idle_ttl
+        while self._sessions:
+            user_id, session = next(iter(self._sessions.items()))
+            if session.last_used >= limit:
+                break
+            del self._sessions[user_id]
+        expired = await self._history_call(self.history.purge, self.idle_ttl)
+        self._expirations += expired
+        return expired
+
+    def stats(self, history_stats: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
+        """Contadores de las sesiones; `history_stats` evita volver a consultar el almacén (ver `history_stats()`)."""
+        sessions = self._sessions.values()
+        return {
+            "sessions": len(self._sessions),
+            "max_sessions": self.max_sessions,
+            "turns": sum(session.turns for session in sessions),
+            "max_turns_in_session": max((session.turns for session in sessions), default=0),
+            "approx_bytes": sum(session.approx_bytes for session in sessions),
+            "evictions": self._evictions,
+            "expirations": self._expirations,
+            "truncated_turns": self._truncated_turns,
+            "rebuilds": self._rebuilds,
+            "merges": self._merges,
+            "history": history_stats if history_stats is not None else self.history.stats(),
+        }
+
+    async def history_stats(self) -> Dict[str, Any]:
+        return await self._history_call(self.history.stats)
+
+    async def close(self) -> None:
+        """Cierra el almacén cuando terminan las operaciones pendientes."""
+        await self._history_call(self.history.close)
+        if self._executor is not None:
+            self._executor.shutdown(wait=True)
+
+
+session_store = SessionStore(LLM_SESSION_MAX_SESSIONS, LLM_SESSION_IDLE_TTL, LLM_SESSION_MAX_TURNS, LLM_SESSION_MAX_TOKENS,
+                             history=make_history_store(LLM_HISTORY_BACKEND, LLM_HISTORY_SQLITE_PATH))
+_sweep_task: Optional[asyncio.Task] = None
+
+
+async def _sweep_loop(interval: float) -> None:
+    last_stats = None
+    while True:
+        await asyncio.sleep(interval)
+        await session_store.sweep()
+        stats = session_store.stats(await session_store.history_stats())
+        if stats != last_stats: # Sin cambios no se repite la línea
+            logger.info("LLM_SESSIONS_CUL: %d sesiones, %d turnos, ~%d KB de historial.", stats["sessions"], stats["turns"],
+                        stats["approx_bytes"] // 1024, extra={"llm_sessions": stats})
+            last_stats = stats
+
+
+def start_session_sweeper(interval: float = LLM_SESSION_SWEEP_INTERVAL) -> None:
+    """Barre las sesiones caducadas y publica stats() cada `interval` segundos (con el event loop en marcha)."""
+    global _sweep_task
+    if interval > 0 and _sweep_task is None:
+        _sweep_task = asyncio.create_task(_sweep_loop(interval), name="llm-session-sweeper")
+
+
+async def stop_session_sweeper() -> None:
+    global _sweep_task
+    if _sweep_task is not None:
+        _sweep_task.cancel()
+        try:
+            await _sweep_task
+        except asyncio.CancelledError:
+            pass
+        _sweep_task = None
+    logger.info("LLM_SESSIONS_CUL: Estadísticas finales.",
+                extra={"llm_sessions": session_store.stats(await session_store.history_stats())})
+    await session_store.close()
@@ -0,0 +1,262 @@
+# Archivo: chatbot/tracing.py
+# Trazas por update de Telegram: cuánto tarda cada etapa de una respuesta.
+#
+# Cada update que atiende un handler abre una traza (`trace_update`) y cada etapa dentro de ella
+# un span (`span`): acción "escribiendo...", clasificación con Gemini, búsqueda de la FAQ,
+# generación de la respuesta, envío a Telegram... Los spans se anidan solos (contextvars), así que
+# una llamada a Gemini dentro de `classify_intent` queda como hija de esa etapa.
+#
+# Al terminar el update la traza completa se exporta como UNA línea JSON, correlacionada por
+# update_id / user_id / chat_id, a un archivo rotativo o a un colector local por UDP. La escritura
+# la hace un hilo aparte (cola acotada, sin esperar nunca), como los logs.
+#
+# Informe offline de percentiles por etapa:
+#   python -m chatbot.tracing traces.jsonl [traces.jsonl.1 ...]
+
+import contextvars
+import json
+import logging
+import logging.handlers
+import queue
+import random
+import socket
+import sys
+import time
+import uuid
+from contextlib import contextmanager
+from datetime import datetime, timezone
+from typing import Any, Dict, Iterable, Iterator, List, Optional
+
+from chatbot.bot_logging import get_logger
+
+logger = get_logger("tracing")
+
+_current_trace: contextvars.ContextVar[Optional["Trace"]] = contextvars.ContextVar("cul_trace", default=None)
+_current_span_id: contextvars.ContextVar[Optional[str]] = contextvars.ContextVar("cul_span_id", default=None)
+
+_exporter: Optional["_TraceExporter"] = None
+_sample_rate = 1.0
+
+
+class Trace:
+    """Spans de un update. Se exporta entera al cerrarse."""
+
+    __slots__ = ("trace_id", "name", "attributes", "spans", "started_at", "_start")
+
+    def __init__(self, name: str, attributes: Dict[str, Any]):
+        self.trace_id = uuid.uuid4().hex
+        self.name = name
+        self.attributes = attributes
+        self.spans: List[Dict[str, Any]] = []
+        self.started_at = time.time()
+        self._start = time.perf_counter()
+
+    def offset_ms(self) -> float:
+        return (time.perf_counter() - self._start) * 1000
+
+    def to_record(self, duration_ms: float, status: str) -> Dict[str, Any]:
+        return {
+            "trace_id": self.trace_id,
+            "name": self.name,
+            "ts": datetime.fromtimestamp(self.started_at, tz=timezone.utc).isoformat(timespec="milliseconds"),
+            "duration_ms": round(duration_ms, 3),
+            "status": status,
+            **self.attributes,
+            "spans": self.spans,
+        }
+
+
+@contextmanager
+def trace_update(update: Any, name: str) -> Iterator[Optional[Trace]]:
+    """
+    Abre la traza de un update de Telegram. Si el trazado está apagado o el update no sale
+    en el muestreo, no registra nada y `span()` dentro de ella no cuesta casi nada.
+    """
+    if _exporter is None or (_sample_rate < 1.0 and random.random() >= _sample_rate):
+        yield None
+        return
+
+    user = getattr(update, "effective_user", None)
+    chat = getattr(update, "effective_chat", None)
+    trace = Trace(name, {
+        "update_id": getattr(update, "update_id", None),
+        "user_id": str(user.id) if user else None,
+        "chat_id": str(chat.id) if chat else None,
+    })
+    trace_token = _current_trace.set(trace)
+    span_token = _current_span_id.set(None)
+    status = "ok"
+    try:
+        yield trace
+    except BaseException as e:
+        status = f"error:{type(e).__name__}"
+        raise
+    finally:
+        _current_span_id.reset(span_token)
+        _current_trace.reset(trace_token)
+        _exporter.export(trace.to_record(trace.offset_ms(), status))
+
+
+@contextmanager
+def span(name: str, **attributes: Any) -> Iterator[Optional[Dict[str, Any]]]:
+    """
+    Mide una etapa dentro de la traza en curso. Devuelve los atributos del span (o None si no hay
+    traza) para poder añadir los que sólo se conocen al final, p. ej. `attrs["source"] = "replica"`.
+    """
+    trace = _current_trace.get()
+    if trace is None:
+        yield None
+        return
+
+    span_id = uuid.uuid4().hex[:16]
+    record: Dict[str, Any] = {"span_id": span_id, "parent_id": _current_span_id.get(), "name": name,
+                              "attrs": attributes}
+    token = _current_span_id.set(span_id)
+    start_ms = trace.offset_ms()
+    status = "ok"
+    try:
+        yield attributes
+    except BaseException as e:
+        status = f"error:{type(e).__name__}"
+        raise
+    finally:
+        _current_span_id.reset(token)
+        record["start_ms"] = round(start_ms, 3)
+        record["duration_ms"] = round(trace.offset_ms() - start_ms, 3)
+        record["status"] = status
+        if not record["attrs"]:
+            del record["attrs"]
+        trace.spans.append(record)
+
+
+# --- Exportación ---
+
+class _UDPJsonHandler(logging.Handler):
+    """Envía cada traza como un datagrama UDP (JSON) a un colector local."""
+
+    def __init__(self, host: str, port: int):
+        super().__init__()
+        self._address = (host, port)
+        self._socket = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+
+    def emit(self, record: logging.LogRecord) -> None:
+        try:
+            self._socket.sendto(record.getMessage().encode("utf-8"), self._address)
+        except OSError:
+            self.handleError(record)
+
+    def close(self) -> None:
+        self._socket.close()
+        super().close()
+
+
+class _TraceExporter:
+    """Cola acotada + hilo escritor (QueueListener). Si la cola se llena, la traza se descarta."""
+
+    def __init__(self, handlers: List[logging.Handler], queue_size: int):
+        self._queue: queue.Queue = queue.Queue(maxsize=queue_size)
+        self._listener = logging.handlers.QueueListener(self._queue, *handlers)
+        self._handlers = handlers
+        self.dropped = 0
+        self._listener.start()
+
+    def export(self, record: Dict[str, Any]) -> None:
+        line = json.dumps(record, ensure_ascii=False, default=str)
+        try:
+            self._queue.put_nowait(logging.makeLogRecord({"msg": line}))
+        except queue.Full:
+            self.dropped += 1
+
+    def stop(self) -> None:
+        self._listener.stop()
+        for handler in self._handlers:
+            handler.close()
+
+
+def start_tracing(export: str, file_path: str = "traces.jsonl", file_max_bytes: int = 10 * 1024 * 1024,
+                  file_backups: int = 5, collector: str = "127.0.0.1:4319", sample_rate: float = 1.0,
+                  queue_size: int = 10000) -> None:
+    """
+    Activa el trazado. `export`: "file" (archivo rotativo), "udp" (colector local en `collector`),
+    "file,udp" para ambos, u "off".
+    """
+    global _exporter, _sample_rate
+    stop_tracing()
+    targets = {target.strip().lower() for target in export.split(",") if target.strip()}
+    handlers: List[logging.Handler] = []
+    if "file" in targets:
+        handlers.append(logging.handlers.RotatingFileHandler(
+            file_path, maxBytes=file_max_bytes, backupCount=file_backups, encoding="utf-8", delay=True))
+    if "udp" in targets:
+        host, _, port = collector.rpartition(":")
+        handlers.append(_UDPJsonHandler(host or "127.0.0.1", int(port)))
+    if not handlers:
+        logger.info("TRACING_CUL: Trazado de updates desactivado (TRACE_EXPORT=%s).", export)
+        return
+    for handler in handlers:
+        handler.setFormatter(logging.Formatter("%(message)s"))
+    _sample_rate = max(0.0, min(1.0, sample_rate))
+    _exporter = _TraceExporter(handlers, queue_size)
+    logger.info("TRACING_CUL: Trazado de updates activo (destino=%s, muestreo=%.2f).", ",".join(sorted(targets)), _sample_rate)
+
+
+def stop_tracing() -> None:
+    """Escribe las trazas pendientes y detiene el hilo escritor."""
+    global _exporter
+    if _exporter is not None:
+        if _exporter.dropped:
+            logger.warning("TRACING_CUL: %d trazas descartadas por cola llena.", _exporter.dropped)
+        _exporter.stop()
+        _exporter = None
+
+
+# --- Informe offline ---
+
+def _percentile(sorted_values: List[float], pct: float) -> float:
+    """Percentil por rango más cercano sobre una lista ya ordenada."""
+    index = max(0, min(len(sorted_values) - 1, int(round(pct / 100 * len(sorted_values) + 0.5)) - 1))
+    return sorted_values[index]
+
+
+def read_traces(paths: Iterable[str]) -> Iterator[Dict[str, Any]]:
+    for path in paths:
+        with open(path, encoding="utf-8") as trace_file:
+            for line in trace_file:
+                line = line.strip()
+                if line:
+                    yield json.loads(line)
+
+
+def stage_report(traces: Iterable[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    """Cuenta, p50, p95, p99 y máximo (ms) por traza completa y por nombre de span."""
+    durations: Dict[str, List[float]] = {}
+    for trace in traces:
+        durations.setdefault(f"{trace['name']} (total)", []).append(trace["duration_ms"])
+        for trace_span in trace.get("spans", []):
+            durations.setdefault(trace_span["name"], []).append(trace_span["duration_ms"])
+    report = []
+    for name, values in durations.items():
+        values.sort()
+        report.append({"stage": name, "count": len(values), "p50": _percentile(values, 50),
+                       "p95": _percentile(values, 95), "p99": _percentile(values, 99), "max": values[-1]})
+    return sorted(report, key=lambda row: row["p95"], reverse=True)
+
+
+def main(argv: List[str]) -> int:
+    if not argv:
+        print("Uso: python -m chatbot.tracing traces.jsonl [traces.jsonl.1 ...]")
+        return 2
+    rows = stage_report(read_traces(argv))
+    if not rows:
+        print("No se encontraron trazas.")
+        return 1
+    width = max(len(row["stage"]) for row in rows)
+    print(f"{'etapa':<{width}}{'n':>8}{'p50 ms':>11}{'p95 ms':>11}{'p99 ms':>11}{'máx ms':>11}")
+    for row in rows:
+        print(f"{row['stage']:<{width}}{row['count']:>8}{row['p50']:>11.1f}{row['p95']:>11.1f}"
+              f"{row['p99']:>11.1f}{row['max']:>11.1f}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main(sys.argv[1:]))
@@ -0,0 +1,4 @@
+# common/__init__.py
+# Código compartido por la API (backend/) y el bot (chatbot/): cada proceso lo importa como `common.*`.
+# El bot se ejecuta desde la raíz del repositorio (`python -m chatbot.main_bot`), así que lo encuentra
+# directamente; la API se ejecuta desde backend/ y añade la raíz al path en backend/core/__init__.py.
@@ -0,0 +1,153 @@
+# common/cache.py
+# Caché en memoria con tamaño acotado (LRU) y caducidad (TTL), segura para hilos.
+#
+# La usan la API (FAQs en backend/crud/crud.py, leídas desde los hilos del executor de la BD) y el
+# bot (intenciones y respuestas del LLM en chatbot/llm_service.py, desde el event loop). Cada proceso
+# tiene su propia copia de los datos: las escrituras invalidan la caché del proceso que las hace y
+# el TTL acota cuánto tarda en verse un cambio hecho desde otro.
+
+import sys
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Callable, Dict, Hashable, Optional, Tuple
+
+_MISSING = object()
+
+
+def approximate_size(value: Any) -> int:
+    """Bytes aproximados de un valor JSON (dict, list, str, números) incluyendo su contenido."""
+    size = sys.getsizeof(value)
+    if isinstance(value, dict):
+        size += sum(approximate_size(key) + approximate_size(item) for key, item in value.items())
+    elif isinstance(value, (list, tuple)):
+        size += sum(approximate_size(item) for item in value)
+    return size
+
+
+class TTLCache:
+    """
+    Diccionario LRU con caducidad por entrada y contadores de aciertos/fallos.
+
+    Quien calcula un valor fuera de la caché (una consulta a la BD, una llamada al LLM) debe
+    guardarlo con la `generation` leída antes de empezar: si entre medias hubo una invalidación,
+    `set` descarta el valor para no volver a cachear datos anteriores al cambio.
+
+    Con `sizeof` (p. ej. `approximate_size`) lleva además la cuenta aproximada de la memoria que
+    ocupan claves y valores, y `stats()` la incluye como `approx_bytes`.
+    """
+
+    def __init__(self, name: str, max_entries: int, ttl: float,
+                 sizeof: Optional[Callable[[Any], int]] = None):
+        self.name = name
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self._sizeof = sizeof
+        self._entries: "OrderedDict[Hashable, Tuple[float, Any, int]]" = OrderedDict() # clave -> (caduca, valor, bytes)
+        self._lock = threading.Lock()
+        self._bytes = 0
+        self._generation = 0
+        self._hits = 0
+        self._misses = 0
+        self._evictions = 0
+        self._expirations = 0
+        self._invalidations = 0
+
+    @property
+    def enabled(self) -> bool:
+        return self.max_entries > 0 and self.ttl > 0
+
+    @property
+    def generation(self) -> int:
+        return self._generation
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def get(self, key: Hashable) -> Tuple[bool, Any]:
+        """Devuelve (True, valor) si la clave está en caché y no ha caducado; (False, None) si no."""
+        with self._lock:
+            entry = self._entries.get(key, _MISSING)
+            if entry is _MISSING:
+                self._misses += 1
+                return False, None
+            expires_at, value, _ = entry
+            if expires_at <= time.monotonic():
+                self._pop(key)
+                self._expirations += 1
+                self._misses += 1
+                return False, None
+            self._entries.move_to_end(key)
+            self._hits += 1
+            return True, value
+
+    def set(self, key: Hashable, value: Any, generation: Optional[int] = None) -> bool:
+        """
+        Guarda un valor (el llamador no debe modificarlo después). Devuelve False si la caché está
+        desactivada o hubo una invalidación posterior a `generation`.
+        """
+        if not self.enabled:
+            return False
+        size = self._sizeof(key) + self._sizeof(value) if self._sizeof else 0
+        with self._lock:
+            if generation is not None and generation != self._generation:
+                return False
+            self._pop(key)
+            self._entries[key] = (time.monotonic() + self.ttl, value, size)
+            self._bytes += size
+            while len(self._entries) > self.max_entries:
+                self._pop(next(iter(self._entries)))
+                self._evictions += 1
+            return True
+
+    def _pop(self, key: Hashable) -> bool:
+        """Quita una clave (con el lock tomado). True si estaba."""
+        entry = self._entries.pop(key, _MISSING)
+        if entry is _MISSING:
+            return False
+        self._bytes -= entry[2]
+        return True
+
+    def invalidate(self, key: Hashable) -> None:
+        """Elimina una clave concreta."""
+        with self._lock:
+            self._generation += 1
+            if self._pop(key):
+                self._invalidations += 1
+
+    def discard_where(self, predicate: Callable[[Hashable], bool]) -> int:
+        """Elimina las entradas cuya clave cumple `predicate` (recorre toda la caché). Devuelve cuántas."""
+        with self._lock:
+            self._generation += 1
+            keys = [key for key in self._entries if predicate(key)]
+            for key in keys:
+                self._pop(key)
+            self._invalidations += len(keys)
+            return len(keys)
+
+    def clear(self) -> None:
+        """Elimina todas las entradas."""
+        with self._lock:
+            self._generation += 1
+            self._invalidations += len(self._entries)
+            self._entries.clear()
+            self._bytes = 0
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            lookups = self._hits + self._misses
+            stats = {
+                "name": self.name,
+                "entries": len(self._entries),
+                "max_entries": self.max_entries,
+                "ttl_seconds": self.ttl,
+                "hits": self._hits,
+                "misses": self._misses,
+                "hit_ratio": round(self._hits / lookups, 4) if lookups else 0.0,
+                "evictions": self._evictions,
+                "expirations": self._expirations,
+                "invalidations": self._invalidations,
+            }
+            if self._sizeof:
+                stats["approx_bytes"] = self._bytes
+            return stats
@@ -0,0 +1,162 @@
+# common/logging_setup.py
+# Logging estructurado y no bloqueante, compartido por la API y el bot.
+#
+# Los registros se encolan en memoria (QueueHandler) y un hilo aparte (QueueListener) los convierte
+# a JSON y los escribe en stdout, así una consola lenta nunca bloquea el event loop (uvicorn o
+# python-telegram-bot) ni los hilos del executor de la BD. Si la cola se llena se descartan
+# registros en lugar de esperar.
+#
+# Cada proceso configura su logger raíz (backend/core/logging_config.py: "cul";
+# chatbot/bot_logging.py: "ChatbotVial") con `setup_logging(nombre)`.
+#
+# Configuración (variables de entorno):
+#   LOG_LEVEL         Nivel mínimo (DEBUG, INFO, WARNING...). Por defecto INFO.
+#   LOG_FORMAT        "json" (por defecto, una línea JSON por registro) o "text" para desarrollo.
+#   LOG_QUEUE_SIZE    Registros pendientes como máximo antes de descartar (por defecto 10000).
+#   LOG_SAMPLE_RATES  Fracción de DEBUG/INFO que se conserva por logger, p. ej. "cul.crud=0.1" o
+#                     "ChatbotVial.handlers.general=0.2". WARNING y superiores se registran siempre.
+
+import atexit
+import json
+import logging
+import logging.handlers
+import os
+import queue
+import random
+import sys
+from datetime import datetime, timezone
+from typing import Dict, Optional
+
+# Atributos estándar de LogRecord: todo lo demás viene de `extra=` y se emite como campo JSON.
+_STANDARD_RECORD_ATTRS = frozenset(vars(logging.LogRecord("", 0, "", 0, "", (), None))) | {"message", "asctime"}
+
+_listener: Optional[logging.handlers.QueueListener] = None
+_atexit_registered = False
+
+
+class JsonFormatter(logging.Formatter):
+    """Una línea JSON por registro con marca de tiempo UTC, nivel, logger, mensaje y campos `extra`."""
+
+    def format(self, record: logging.LogRecord) -> str:
+        entry = {
+            "ts": datetime.fromtimestamp(record.created, tz=timezone.utc).isoformat(timespec="milliseconds"),
+            "level": record.levelname,
+            "logger": record.name,
+            "msg": record.getMessage(),
+            "src": f"{record.filename}:{record.lineno}",
+        }
+        for key, value in record.__dict__.items():
+            if key not in _STANDARD_RECORD_ATTRS and not key.startswith("_"):
+                entry[key] = value
+        if record.exc_info:
+            entry["exc_info"] = self.formatException(record.exc_info)
+        elif record.exc_text:
+            entry["exc_info"] = record.exc_text
+        return json.dumps(entry, ensure_ascii=False, default=str)
+
+
+class SamplingFilter(logging.Filter):
+    """Deja pasar sólo una fracción de los DEBUG/INFO de los loggers configurados (prefijo más largo gana)."""
+
+    def __init__(self, rates: Dict[str, float]):
+        super().__init__()
+        self.rates = sorted(rates.items(), key=lambda item: len(item[0]), reverse=True)
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        if record.levelno >= logging.WARNING:
+            return True
+        for prefix, rate in self.rates:
+            if record.name == prefix or record.name.startswith(prefix + "."):
+                return rate >= 1.0 or random.random() < rate
+        return True
+
+
+class NonBlockingQueueHandler(logging.handlers.QueueHandler):
+    """
+    QueueHandler que nunca espera: si la cola está llena descarta el registro y lo cuenta.
+    El mensaje se resuelve aquí (los argumentos podrían cambiar después); el formateo a JSON
+    y la escritura se hacen en el hilo del QueueListener.
+    """
+
+    def __init__(self, log_queue: queue.Queue):
+        super().__init__(log_queue)
+        self.dropped = 0
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        record.msg = record.getMessage()
+        record.args = None
+        if record.exc_info:
+            record.exc_text = logging.Formatter().formatException(record.exc_info)
+            record.exc_info = None
+        return record
+
+    def enqueue(self, record: logging.LogRecord) -> None:
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            self.dropped += 1
+
+
+def parse_sample_rates(spec: str) -> Dict[str, float]:
+    """"cul.crud=0.1,cul.api=0.5" -> {"cul.crud": 0.1, "cul.api": 0.5}."""
+    rates = {}
+    for item in filter(None, (part.strip() for part in spec.split(","))):
+        name, _, rate = item.partition("=")
+        rates[name.strip()] = max(0.0, min(1.0, float(rate or 1)))
+    return rates
+
+
+def setup_logging(root_logger_name: str, level: Optional[str] = None, log_format: Optional[str] = None,
+                  sample_rates: Optional[str] = None) -> None:
+    """
+    Configura el logger `root_logger_name` con la cola no bloqueante. Llamar una vez al arrancar: las
+    llamadas siguientes no hacen nada (para cambiar la configuración, `shutdown_logging()` antes).
+    Los parámetros omitidos se leen del entorno en ese momento (después de cargar el .env).
+    """
+    global _listener, _atexit_registered
+    if _listener is not None:
+        return
+    level = level or os.getenv("LOG_LEVEL", "INFO")
+    log_format = (log_format or os.getenv("LOG_FORMAT", "json")).lower()
+    sample_rates = sample_rates if sample_rates is not None else os.getenv("LOG_SAMPLE_RATES", "")
+
+    numeric_level = logging.getLevelName(level.upper())
+    known_level = isinstance(numeric_level, int)
+    if not known_level:
+        numeric_level = logging.INFO
+
+    stream_handler = logging.StreamHandler(sys.stdout)
+    if log_format == "text":
+        stream_handler.setFormatter(logging.Formatter(
+            "%(asctime)s - %(name)s - %(levelname)s - %(filename)s:%(lineno)d - %(message)s"))
+    else:
+        stream_handler.setFormatter(JsonFormatter())
+
+    queue_handler = NonBlockingQueueHandler(queue.Queue(maxsize=int(os.getenv("LOG_QUEUE_SIZE", 10000))))
+    rates = parse_sample_rates(sample_rates)
+    if rates:
+        queue_handler.addFilter(SamplingFilter(rates))
+
+    root = logging.getLogger(root_logger_name)
+    root.handlers.clear()
+    root.addHandler(queue_handler)
+    root.setLevel(numeric_level)
+    root.propagate = False
+
+    _listener = logging.handlers.QueueListener(queue_handler.queue, stream_handler, respect_handler_level=True)
+    _listener.start()
+    if not _atexit_registered: # Una sola vez aunque se reconfigure tras shutdown_logging()
+        atexit.register(shutdown_logging)
+        _atexit_registered = True
+    root.info("Logging configurado", extra={"log_level": logging.getLevelName(numeric_level), "log_format": log_format,
+                                            "sample_rates": rates})
+    if not known_level:
+        root.warning("Nivel de logging '%s' no reconocido; se usa INFO.", level)
+
+
+def shutdown_logging() -> None:
+    """Vacía la cola y detiene el hilo de escritura."""
+    global _listener
+    if _listener is not None:
+        _listener.stop()
+        _listener = None